@@ -1,22 +1,73 @@
+import aiohttp
 import discord
+from discord import app_commands
 from discord.ext import commands, tasks
 import json
 import os
 from datetime import datetime, timedelta
 import random
 import asyncio
-from typing import Dict, List, Optional, Tuple
+import time
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Literal, Optional, Set, Tuple
 from dataclasses import dataclass
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
+from bisect import bisect_left, bisect_right
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+import io
+import heapq
+import csv
+import gzip
+import tempfile
+import queue
+import sqlite3
+import sys
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from datetime import date
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:
+    Image = None
 
 TOKEN = ""
 PREFIX = "!"
 LEVEL_UP_CHANNEL_ID = None
+ROLE_SYNC_INTERVAL = 1.0
+VOICE_TICK_SECONDS = 60
+ANNOUNCE_COALESCE_SECONDS = 3.0
+ANNOUNCE_CHANNEL_INTERVAL = 5.0
+ANNOUNCE_MAX_LINES = 15
+LEADERBOARD_PAGE_SIZE = 10
+LEADERBOARD_MAX_ENTRIES = 10000
+NAME_CACHE_SIZE = 5000
+STORAGE_BACKEND = "json"
+JSON_FILENAME = "leveling_data.json"
+SQLITE_FILENAME = "leveling_data.db"
+RANK_CARD_FONT = "DejaVuSans-Bold.ttf"
+RANK_CARD_FORMAT = "png"
+RANK_CARD_WORKERS = 2
+RANK_CARD_AVATAR_CACHE = 256
+BULK_FIELDS = ["xp", "total_xp", "messages", "voice_minutes", "level", "last_active", "created_at"]
+BULK_INT_FIELDS = {"xp", "total_xp", "messages", "voice_minutes", "level"}
+BULK_CHUNK_SIZE = 5000
+SEASONS_DIR = "seasons"
+SEASON_INDEX_CACHE = 8
+XP_RULES_FILE = "xp_rules.json"
+XP_RULES_RELOAD_SECONDS = 30
+MEMBER_MASK_CACHE_SIZE = 10000
+ACTIVITY_RETENTION_DAYS = 35
+ACTIVITY_PERIODS = {"week": 7, "month": 30}
+PERIOD_TITLES = {"week": "TYGODNIA", "month": "MIESIĄCA"}
+PERIOD_ALIASES = {"week": "week", "tydzien": "week", "tydzień": "week", "month": "month", "miesiac": "month", "miesiąc": "month"}
 
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 intents.guilds = True
+intents.voice_states = True
 
 bot = commands.Bot(command_prefix=PREFIX, intents=intents)
 
@@ -25,6 +76,9 @@ class LevelingConfig:
     xp_per_message_min: int = 15
     xp_per_message_max: int = 25
     cooldown_seconds: int = 60
+    voice_xp_per_minute_min: int = 5
+    voice_xp_per_minute_max: int = 10
+    voice_min_members: int = 2
     level_base: int = 100
     level_multiplier: float = 1.5
     level_roles: Dict[int, int] = None
@@ -58,33 +112,144 @@ class LevelingConfig:
 
 config = LevelingConfig()
 
-class LevelingDatabase:
-    _instance = None
+class LeaderboardIndex:
+    def __init__(self):
+        self._entries: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+        self._scores: Dict[int, Dict[int, int]] = defaultdict(dict)
+        self.listeners: List[Callable[[int, int, Optional[int]], None]] = []
     
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance._initialized = False
-        return cls._instance
+    def rebuild(self, users: Dict[str, Dict]):
+        self._entries.clear()
+        self._scores.clear()
+        
+        for key, user_data in users.items():
+            try:
+                guild_id, user_id = map(int, key.split(':'))
+            except ValueError:
+                continue
+            xp = user_data.get("xp", 0)
+            self._scores[guild_id][user_id] = xp
+            self._entries[guild_id].append((-xp, user_id))
+        
+        for entries in self._entries.values():
+            entries.sort()
+    
+    def update(self, guild_id: int, user_id: int, xp: int) -> Optional[int]:
+        scores = self._scores[guild_id]
+        entries = self._entries[guild_id]
+        old_xp = scores.get(user_id)
+        
+        if old_xp == xp:
+            pos = bisect_left(entries, (-xp, user_id))
+            self._notify(guild_id, pos, pos)
+            return None
+        
+        old_pos = None
+        if old_xp is not None:
+            pos = bisect_left(entries, (-old_xp, user_id))
+            if pos < len(entries) and entries[pos] == (-old_xp, user_id):
+                del entries[pos]
+                old_pos = pos
+        
+        scores[user_id] = xp
+        new_pos = bisect_left(entries, (-xp, user_id))
+        entries.insert(new_pos, (-xp, user_id))
+        
+        if old_pos is None:
+            self._notify(guild_id, new_pos, None)
+        else:
+            self._notify(guild_id, min(old_pos, new_pos), max(old_pos, new_pos))
+        return old_xp
+    
+    def set_scores(self, guild_id: int, changes: Dict[int, int]):
+        scores = self._scores[guild_id]
+        scores.update(changes)
+        self._entries[guild_id] = sorted((-xp, user_id) for user_id, xp in scores.items())
+        self._notify(guild_id, 0, None)
+    
+    def members(self, guild_id: int) -> List[int]:
+        return list(self._scores.get(guild_id, {}))
+    
+    def _notify(self, guild_id: int, start: int, end: Optional[int]):
+        for listener in self.listeners:
+            listener(guild_id, start, end)
+    
+    def rank(self, guild_id: int, user_id: int) -> Optional[int]:
+        xp = self._scores.get(guild_id, {}).get(user_id)
+        if xp is None:
+            return None
+        return bisect_left(self._entries[guild_id], (-xp, user_id)) + 1
+    
+    def top(self, guild_id: int, start: int = 0, stop: int = 10) -> List[int]:
+        return [user_id for _, user_id in self._entries.get(guild_id, [])[start:stop]]
+    
+    def size(self, guild_id: int) -> int:
+        return len(self._entries.get(guild_id, []))
+
+class StorageBackend(ABC):
+    incremental = False
     
     def __init__(self):
-        if not self._initialized:
-            self.filename = "leveling_data.json"
-            self.data = self._load_data()
-            self.cooldowns = defaultdict(dict)
-            self._save_lock = asyncio.Lock()
-            self._initialized = True
+        self._queue: "queue.Queue[Optional[Tuple[Dict[str, Optional[Dict]], Dict[str, Dict], Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+    
+    @abstractmethod
+    def load(self) -> Dict:
+        ...
     
-    def _load_data(self) -> Dict:
+    @abstractmethod
+    def write(self, users: Dict[str, Optional[Dict]], sections: Dict[str, Dict]):
+        ...
+    
+    def submit(self, users: Dict[str, Optional[Dict]], sections: Dict[str, Dict]) -> Future:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._writer, name=f"{type(self).__name__}-writer", daemon=True)
+            self._thread.start()
+        
+        future: Future = Future()
+        self._queue.put((users, sections, future))
+        return future
+    
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._release()
+                break
+            
+            users, sections, future = item
+            try:
+                self.write(users, sections)
+                future.set_result(True)
+            except Exception as e:
+                print(f"Błąd zapisu danych: {e}")
+                future.set_exception(e)
+    
+    def _release(self):
+        pass
+    
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+class JsonStorage(StorageBackend):
+    def __init__(self, filename: str = JSON_FILENAME):
+        super().__init__()
+        self.filename = filename
+    
+    def load(self) -> Dict:
         try:
             if os.path.exists(self.filename):
                 with open(self.filename, 'r', encoding='utf-8') as f:
                     return json.load(f)
         except (json.JSONDecodeError, IOError) as e:
             print(f"Błąd ładowania danych: {e}")
-            backup_files = [f for f in os.listdir('.') if f.startswith('leveling_data.json.backup')]
+            directory = os.path.dirname(self.filename) or '.'
+            prefix = f"{os.path.basename(self.filename)}.backup"
+            backup_files = [os.path.join(directory, f) for f in os.listdir(directory) if f.startswith(prefix)]
             if backup_files:
-                latest_backup = max(backup_files)
+                latest_backup = max(backup_files, key=os.path.getmtime)
                 try:
                     with open(latest_backup, 'r', encoding='utf-8') as f:
                         print(f"Ładowanie kopii zapasowej: {latest_backup}")
@@ -93,24 +258,170 @@ class LevelingDatabase:
                     pass
         return {"users": {}, "last_save": datetime.now().isoformat()}
     
-    def _save_data(self):
-        self.data["last_save"] = datetime.now().isoformat()
+    def write(self, users: Dict[str, Optional[Dict]], sections: Dict[str, Dict]):
+        document = {"users": {key: data for key, data in users.items() if data is not None}}
+        document.update(sections)
+        document["last_save"] = datetime.now().isoformat()
+        
+        temp_filename = f"{self.filename}.tmp"
+        with open(temp_filename, 'w', encoding='utf-8') as f:
+            json.dump(document, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        
+        if os.path.exists(self.filename):
+            os.replace(self.filename, f"{self.filename}.backup")
+        
+        os.replace(temp_filename, self.filename)
+
+class SQLiteStorage(StorageBackend):
+    incremental = True
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            guild_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            xp INTEGER NOT NULL DEFAULT 0,
+            total_xp INTEGER NOT NULL DEFAULT 0,
+            data TEXT NOT NULL,
+            PRIMARY KEY (guild_id, user_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS users_guild_xp ON users (guild_id, xp DESC);
+        CREATE TABLE IF NOT EXISTS sections (
+            name TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+    """
+    UPSERT_USER = """
+        INSERT INTO users (guild_id, user_id, xp, total_xp, data) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (guild_id, user_id) DO UPDATE SET
+            xp = excluded.xp, total_xp = excluded.total_xp, data = excluded.data
+    """
+    DELETE_USER = "DELETE FROM users WHERE guild_id = ? AND user_id = ?"
+    UPSERT_SECTION = """
+        INSERT INTO sections (name, data) VALUES (?, ?)
+        ON CONFLICT (name) DO UPDATE SET data = excluded.data
+    """
+    
+    def __init__(self, filename: str = SQLITE_FILENAME):
+        super().__init__()
+        self.filename = filename
+        self._connection: Optional[sqlite3.Connection] = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.filename, isolation_level=None, cached_statements=16)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(self.SCHEMA)
+        return connection
+    
+    def load(self) -> Dict:
+        connection = self._connect()
         try:
-            temp_filename = f"{self.filename}.tmp"
-            with open(temp_filename, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, indent=2, ensure_ascii=False)
-            
-            if os.path.exists(self.filename):
-                backup_name = f"{self.filename}.backup"
-                os.replace(self.filename, backup_name)
-            
-            os.replace(temp_filename, self.filename)
-        except Exception as e:
-            print(f"Błąd zapisu danych: {e}")
+            data = {"users": {}}
+            for guild_id, user_id, raw in connection.execute("SELECT guild_id, user_id, data FROM users"):
+                data["users"][f"{guild_id}:{user_id}"] = json.loads(raw)
+            for name, raw in connection.execute("SELECT name, data FROM sections"):
+                data[name] = json.loads(raw)
+            return data
+        finally:
+            connection.close()
+    
+    def write(self, users: Dict[str, Optional[Dict]], sections: Dict[str, Dict]):
+        if self._connection is None:
+            self._connection = self._connect()
+        
+        upserts = []
+        deletes = []
+        for key, user_data in users.items():
+            guild_id, user_id = map(int, key.split(':'))
+            if user_data is None:
+                deletes.append((guild_id, user_id))
+            else:
+                upserts.append((
+                    guild_id, user_id, user_data.get("xp", 0), user_data.get("total_xp", 0),
+                    json.dumps(user_data, ensure_ascii=False)
+                ))
+        
+        connection = self._connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if upserts:
+                connection.executemany(self.UPSERT_USER, upserts)
+            if deletes:
+                connection.executemany(self.DELETE_USER, deletes)
+            connection.executemany(
+                self.UPSERT_SECTION,
+                [(name, json.dumps(section, ensure_ascii=False)) for name, section in sections.items()]
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+    
+    def _release(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+    
+    def close(self):
+        super().close()
+        self._release()
+
+def create_storage(backend: str = STORAGE_BACKEND) -> StorageBackend:
+    if backend == "sqlite":
+        return SQLiteStorage()
+    return JsonStorage()
+
+def migrate_json_to_sqlite(json_filename: str = JSON_FILENAME, sqlite_filename: str = SQLITE_FILENAME) -> int:
+    data = JsonStorage(json_filename).load()
+    users = data.pop("users", {})
+    data.pop("last_save", None)
+    
+    storage = SQLiteStorage(sqlite_filename)
+    try:
+        storage.write(users, data)
+    finally:
+        storage.close()
+    return len(users)
+
+class LevelingDatabase:
+    _instance = None
+    
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+    
+    def __init__(self):
+        if not self._initialized:
+            self.storage = create_storage()
+            self.data = self.storage.load()
+            self.index = LeaderboardIndex()
+            self.index.rebuild(self.data.get("users", {}))
+            self.cooldowns = defaultdict(dict)
+            self.sections: Dict[str, Callable[[], Dict]] = {}
+            self.dirty: Set[str] = set()
+            self._save_lock = asyncio.Lock()
+            self._initialized = True
+    
+    def _snapshot(self) -> Dict[str, Optional[Dict]]:
+        users = self.data.get("users", {})
+        keys = self.dirty if self.storage.incremental else users.keys()
+        snapshot = {key: dict(users[key]) if key in users else None for key in keys}
+        self.dirty = set()
+        return snapshot
     
     async def save_all_async(self):
         async with self._save_lock:
-            await asyncio.get_event_loop().run_in_executor(None, self._save_data)
+            sections = {name: export() for name, export in self.sections.items()}
+            users = self._snapshot()
+            try:
+                await asyncio.wrap_future(self.storage.submit(users, sections))
+            except Exception:
+                if self.storage.incremental:
+                    self.dirty.update(users)
     
     def get_user_key(self, user_id: int, guild_id: int) -> str:
         return f"{guild_id}:{user_id}"
@@ -127,46 +438,34 @@ class LevelingDatabase:
                 "last_active": None,
                 "created_at": datetime.now().isoformat()
             }
+            self.index.update(guild_id, user_id, 0)
+            self.dirty.add(key)
         
         return self.data["users"][key]
     
     def update_user(self, user_id: int, guild_id: int, data: Dict):
         key = self.get_user_key(user_id, guild_id)
         self.data.setdefault("users", {})[key] = data
+        self.dirty.add(key)
+        self.index.update(guild_id, user_id, data.get("xp", 0))
+    
+    def bulk_update(self, guild_id: int, updates: Dict[int, Dict]):
+        users = self.data.setdefault("users", {})
+        for user_id, user_data in updates.items():
+            key = self.get_user_key(user_id, guild_id)
+            users[key] = user_data
+            self.dirty.add(key)
+        self.index.set_scores(guild_id, {user_id: data.get("xp", 0) for user_id, data in updates.items()})
     
     def get_guild_leaderboard(self, guild_id: int, limit: int = 10) -> List[Tuple[int, Dict]]:
-        guild_users = []
-        
-        for key, user_data in self.data.get("users", {}).items():
-            try:
-                stored_guild_id = int(key.split(':')[0])
-                if stored_guild_id == guild_id:
-                    user_id = int(key.split(':')[1])
-                    guild_users.append((user_id, user_data))
-            except (ValueError, IndexError):
-                continue
-        
-        guild_users.sort(key=lambda x: x[1].get("xp", 0), reverse=True)
-        return guild_users[:limit]
+        users = self.data.get("users", {})
+        return [
+            (user_id, users.get(self.get_user_key(user_id, guild_id), {}))
+            for user_id in self.index.top(guild_id, 0, limit)
+        ]
     
     def get_user_rank(self, user_id: int, guild_id: int) -> Optional[int]:
-        all_users = []
-        
-        for key, user_data in self.data.get("users", {}).items():
-            try:
-                stored_guild_id = int(key.split(':')[0])
-                if stored_guild_id == guild_id:
-                    stored_user_id = int(key.split(':')[1])
-                    all_users.append((stored_user_id, user_data))
-            except (ValueError, IndexError):
-                continue
-        
-        all_users.sort(key=lambda x: x[1].get("xp", 0), reverse=True)
-        
-        for i, (uid, _) in enumerate(all_users):
-            if uid == user_id:
-                return i + 1
-        return None
+        return self.index.rank(guild_id, user_id)
     
     def add_cooldown(self, user_id: int, guild_id: int):
         self.cooldowns[guild_id][user_id] = datetime.now()
@@ -180,131 +479,986 @@ class LevelingDatabase:
                 del self.cooldowns[guild_id][user_id]
         return False
 
-db = LevelingDatabase()
+db = LevelingDatabase()
+
+class GuildActivity:
+    def __init__(self, day: int, retention: int = ACTIVITY_RETENTION_DAYS):
+        self.day = day
+        self.retention = retention
+        self.rows: Dict[int, int] = {}
+        self.user_ids = array('q')
+        self.free: List[int] = []
+        self.buckets = array('i')
+        self.totals = {period: array('q') for period in ACTIVITY_PERIODS}
+    
+    def _row(self, user_id: int) -> int:
+        row = self.rows.get(user_id)
+        if row is not None:
+            return row
+        
+        if self.free:
+            row = self.free.pop()
+            self.user_ids[row] = user_id
+        else:
+            row = len(self.user_ids)
+            self.user_ids.append(user_id)
+            self.buckets.extend([0] * self.retention)
+            for totals in self.totals.values():
+                totals.append(0)
+        
+        self.rows[user_id] = row
+        return row
+    
+    def add(self, user_id: int, xp: int):
+        row = self._row(user_id)
+        self.buckets[row * self.retention + self.day % self.retention] += xp
+        for totals in self.totals.values():
+            totals[row] += xp
+    
+    def advance(self, day: int):
+        if day <= self.day:
+            return
+        
+        if day - self.day >= self.retention:
+            self.rows.clear()
+            self.user_ids = array('q')
+            self.free.clear()
+            self.buckets = array('i')
+            self.totals = {period: array('q') for period in ACTIVITY_PERIODS}
+            self.day = day
+            return
+        
+        for current in range(self.day + 1, day + 1):
+            for row in self.rows.values():
+                base = row * self.retention
+                for period, days in ACTIVITY_PERIODS.items():
+                    self.totals[period][row] -= self.buckets[base + (current - days) % self.retention]
+                self.buckets[base + current % self.retention] = 0
+        self.day = day
+        
+        longest = max(ACTIVITY_PERIODS, key=ACTIVITY_PERIODS.get)
+        for user_id, row in list(self.rows.items()):
+            if self.totals[longest][row] == 0:
+                base = row * self.retention
+                self.buckets[base:base + self.retention] = array('i', [0] * self.retention)
+                del self.rows[user_id]
+                self.free.append(row)
+    
+    def top(self, period: str, start: int, stop: int) -> List[Tuple[int, int]]:
+        totals = self.totals[period]
+        best = heapq.nlargest(stop, ((totals[row], user_id) for user_id, row in self.rows.items() if totals[row] > 0))
+        return [(user_id, xp) for xp, user_id in best[start:stop]]
+    
+    def count(self, period: str) -> int:
+        totals = self.totals[period]
+        return sum(1 for row in self.rows.values() if totals[row] > 0)
+    
+    def to_dict(self) -> Dict:
+        return {
+            "day": self.day,
+            "users": {
+                str(user_id): self.buckets[row * self.retention:(row + 1) * self.retention].tolist()
+                for user_id, row in self.rows.items()
+            }
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "GuildActivity":
+        activity = cls(data.get("day", date.today().toordinal()))
+        for user_id, buckets in data.get("users", {}).items():
+            if len(buckets) != activity.retention:
+                continue
+            row = activity._row(int(user_id))
+            base = row * activity.retention
+            activity.buckets[base:base + activity.retention] = array('i', buckets)
+            for period, days in ACTIVITY_PERIODS.items():
+                activity.totals[period][row] = sum(
+                    buckets[(activity.day - offset) % activity.retention] for offset in range(days)
+                )
+        return activity
+
+class ActivityTracker:
+    def __init__(self, data: Optional[Dict] = None):
+        self.guilds: Dict[int, GuildActivity] = {
+            int(guild_id): GuildActivity.from_dict(guild_data)
+            for guild_id, guild_data in (data or {}).items()
+        }
+    
+    def guild(self, guild_id: int) -> GuildActivity:
+        today = date.today().toordinal()
+        activity = self.guilds.get(guild_id)
+        if activity is None:
+            activity = self.guilds[guild_id] = GuildActivity(today)
+        else:
+            activity.advance(today)
+        return activity
+    
+    def record(self, guild_id: int, user_id: int, xp: int):
+        self.guild(guild_id).add(user_id, xp)
+    
+    def to_dict(self) -> Dict:
+        return {str(guild_id): activity.to_dict() for guild_id, activity in self.guilds.items()}
+
+activity_tracker = ActivityTracker(db.data.get("activity"))
+db.sections["activity"] = activity_tracker.to_dict
+
+class XPCalculator:
+    @staticmethod
+    def xp_for_level(level: int) -> int:
+        return int(config.level_base * (config.level_multiplier ** (level - 1)))
+    
+    @staticmethod
+    def level_from_xp(xp: int) -> Tuple[int, int, int]:
+        level = 1
+        xp_needed = XPCalculator.xp_for_level(level)
+        
+        while xp >= xp_needed:
+            xp -= xp_needed
+            level += 1
+            xp_needed = XPCalculator.xp_for_level(level)
+            
+            if level > 1000:
+                break
+        
+        return level, xp, XPCalculator.xp_for_level(level)
+    
+    @staticmethod
+    def calculate_progress_bar(current: int, needed: int, length: int = 20) -> str:
+        if needed <= 0:
+            return "█" * length
+        percentage = min(current / needed, 1.0)
+        filled = int(length * percentage)
+        return "█" * filled + "░" * (length - filled)
+
+class BulkTransfer:
+    @staticmethod
+    async def export_guild(guild_id: int, fmt: str) -> IO[bytes]:
+        output = tempfile.NamedTemporaryFile(mode="w+b", suffix=f".{fmt}")
+        text = io.TextIOWrapper(output, encoding="utf-8", newline="")
+        writer = csv.writer(text) if fmt == "csv" else None
+        
+        if writer:
+            writer.writerow(["user_id"] + BULK_FIELDS)
+        
+        users = db.data.get("users", {})
+        user_ids = db.index.top(guild_id, 0, db.index.size(guild_id))
+        for start in range(0, len(user_ids), BULK_CHUNK_SIZE):
+            for user_id in user_ids[start:start + BULK_CHUNK_SIZE]:
+                user_data = users.get(db.get_user_key(user_id, guild_id))
+                if user_data is None:
+                    continue
+                if writer:
+                    writer.writerow([user_id] + [user_data.get(name, "") for name in BULK_FIELDS])
+                else:
+                    row = {"user_id": user_id}
+                    row.update({name: user_data[name] for name in BULK_FIELDS if name in user_data})
+                    text.write(json.dumps(row, ensure_ascii=False) + "\n")
+            await asyncio.sleep(0)
+        
+        text.flush()
+        text.detach()
+        output.seek(0)
+        return output
+    
+    @staticmethod
+    def _rows(source: io.TextIOBase, fmt: str) -> Iterator[Dict]:
+        if fmt == "csv":
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+    
+    @staticmethod
+    def _parse_row(row: Dict, line_number: int) -> Tuple[int, Dict]:
+        try:
+            user_id = int(row["user_id"])
+            fields = {}
+            for name in BULK_FIELDS:
+                value = row.get(name)
+                if value in (None, ""):
+                    continue
+                if name in BULK_INT_FIELDS:
+                    value = int(value)
+                    if value < 0:
+                        raise ValueError(f"{name} < 0")
+                fields[name] = value
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Wiersz {line_number}: {e}") from e
+        return user_id, fields
+    
+    @staticmethod
+    def stage(path: str, fmt: str) -> Dict[int, Dict]:
+        rows: Dict[int, Dict] = {}
+        with open(path, "r", encoding="utf-8-sig", newline="") as source:
+            for line_number, row in enumerate(BulkTransfer._rows(source, fmt), 1):
+                user_id, fields = BulkTransfer._parse_row(row, line_number)
+                rows[user_id] = fields
+        return rows
+    
+    @staticmethod
+    async def download(attachment: discord.Attachment, target: io.BufferedIOBase):
+        async with aiohttp.ClientSession() as session:
+            async with session.get(attachment.url) as response:
+                response.raise_for_status()
+                async for chunk in response.content.iter_chunked(64 * 1024):
+                    target.write(chunk)
+    
+    @staticmethod
+    def apply(guild_id: int, rows: Dict[int, Dict], mode: str) -> int:
+        users = db.data.get("users", {})
+        updates = {}
+        
+        for user_id, fields in rows.items():
+            current = users.get(db.get_user_key(user_id, guild_id))
+            user_data = dict(current) if current else {
+                "xp": 0, "level": 1, "messages": 0, "total_xp": 0,
+                "last_active": None, "created_at": datetime.now().isoformat()
+            }
+            
+            for name, value in fields.items():
+                if mode == "add" and name in BULK_INT_FIELDS and name != "level":
+                    user_data[name] = user_data.get(name, 0) + value
+                else:
+                    user_data[name] = value
+            
+            user_data["level"] = XPCalculator.level_from_xp(user_data.get("xp", 0))[0]
+            updates[user_id] = user_data
+        
+        db.bulk_update(guild_id, updates)
+        return len(updates)
+    
+    @staticmethod
+    def add_xp(guild_id: int, user_ids: Iterable[int], amount: int) -> int:
+        users = db.data.get("users", {})
+        updates = {}
+        
+        for user_id in user_ids:
+            current = users.get(db.get_user_key(user_id, guild_id))
+            user_data = dict(current) if current else {
+                "xp": 0, "level": 1, "messages": 0, "total_xp": 0,
+                "last_active": None, "created_at": datetime.now().isoformat()
+            }
+            user_data["xp"] = max(0, user_data.get("xp", 0) + amount)
+            if amount > 0:
+                user_data["total_xp"] = user_data.get("total_xp", 0) + amount
+            user_data["level"] = XPCalculator.level_from_xp(user_data["xp"])[0]
+            updates[user_id] = user_data
+        
+        db.bulk_update(guild_id, updates)
+        return len(updates)
+    
+    @staticmethod
+    def reset_season(guild_id: int) -> int:
+        users = db.data.get("users", {})
+        updates = {}
+        
+        for user_id in db.index.members(guild_id):
+            current = users.get(db.get_user_key(user_id, guild_id))
+            if current is None:
+                continue
+            user_data = dict(current)
+            user_data.update({"xp": 0, "level": 1, "messages": 0, "voice_minutes": 0})
+            updates[user_id] = user_data
+        
+        db.bulk_update(guild_id, updates)
+        return len(updates)
+
+class SeasonArchive:
+    ROW_FIELDS = ["xp", "level", "messages", "voice_minutes", "total_xp"]
+    
+    def __init__(self, directory: str = SEASONS_DIR, index_cache_size: int = SEASON_INDEX_CACHE):
+        self.directory = directory
+        self.index_cache_size = index_cache_size
+        self._manifests: Dict[int, Dict] = {}
+        self._indexes: "OrderedDict[Tuple[int, int], Tuple[array, array, array]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _path(self, guild_id: int, name: str) -> str:
+        return os.path.join(self.directory, str(guild_id), name)
+    
+    def manifest(self, guild_id: int) -> Dict:
+        manifest = self._manifests.get(guild_id)
+        if manifest is None:
+            try:
+                with open(self._path(guild_id, "seasons.json"), 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                manifest = {"seasons": {}}
+            self._manifests[guild_id] = manifest
+        return manifest
+    
+    def current_season(self, guild_id: int) -> int:
+        return len(self.manifest(guild_id)["seasons"]) + 1
+    
+    def snapshot(self, guild_id: int) -> List[Tuple[int, ...]]:
+        users = db.data.get("users", {})
+        rows = []
+        for user_id in db.index.top(guild_id, 0, db.index.size(guild_id)):
+            user_data = users.get(db.get_user_key(user_id, guild_id), {})
+            xp = user_data.get("xp", 0)
+            if xp > 0:
+                rows.append((
+                    user_id, xp, XPCalculator.level_from_xp(xp)[0], user_data.get("messages", 0),
+                    user_data.get("voice_minutes", 0), user_data.get("total_xp", 0)
+                ))
+        return rows
+    
+    def write(self, guild_id: int, season: int, rows: List[Tuple[int, ...]]):
+        os.makedirs(os.path.join(self.directory, str(guild_id)), exist_ok=True)
+        
+        archive_name = f"season-{season}.jsonl.gz"
+        temp_path = self._path(guild_id, archive_name + ".tmp")
+        with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+            for rank, row in enumerate(rows, 1):
+                record = {"rank": rank, "user_id": row[0]}
+                record.update(zip(self.ROW_FIELDS, row[1:]))
+                f.write(json.dumps(record) + "\n")
+        os.replace(temp_path, self._path(guild_id, archive_name))
+        
+        by_user = sorted((row[0], rank, row[1]) for rank, row in enumerate(rows, 1))
+        index_name = f"season-{season}.idx"
+        temp_path = self._path(guild_id, index_name + ".tmp")
+        with open(temp_path, 'wb') as f:
+            array('q', [len(by_user)]).tofile(f)
+            for column in range(3):
+                array('q', (entry[column] for entry in by_user)).tofile(f)
+        os.replace(temp_path, self._path(guild_id, index_name))
+        
+        manifest = self.manifest(guild_id)
+        manifest["seasons"][str(season)] = {
+            "ended_at": datetime.now().isoformat(),
+            "players": len(rows),
+            "archive": archive_name,
+            "index": index_name
+        }
+        temp_path = self._path(guild_id, "seasons.json.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temp_path, self._path(guild_id, "seasons.json"))
+    
+    def read_page(self, guild_id: int, season: int, start: int, stop: int) -> List[Dict]:
+        info = self.manifest(guild_id)["seasons"].get(str(season))
+        if not info:
+            return []
+        
+        rows = []
+        with gzip.open(self._path(guild_id, info["archive"]), 'rt', encoding='utf-8') as f:
+            for position, line in enumerate(f):
+                if position >= stop:
+                    break
+                if position >= start:
+                    rows.append(json.loads(line))
+        return rows
+    
+    def _index(self, guild_id: int, season: int) -> Optional[Tuple[array, array, array]]:
+        key = (guild_id, season)
+        with self._lock:
+            cached = self._indexes.get(key)
+            if cached is not None:
+                self._indexes.move_to_end(key)
+                return cached
+        
+        info = self.manifest(guild_id)["seasons"].get(str(season))
+        if not info:
+            return None
+        
+        with open(self._path(guild_id, info["index"]), 'rb') as f:
+            header = array('q')
+            header.fromfile(f, 1)
+            columns = []
+            for _ in range(3):
+                column = array('q')
+                column.fromfile(f, header[0])
+                columns.append(column)
+        
+        index = tuple(columns)
+        with self._lock:
+            self._indexes[key] = index
+            if len(self._indexes) > self.index_cache_size:
+                self._indexes.popitem(last=False)
+        return index
+    
+    def rank_of(self, guild_id: int, season: int, user_id: int) -> Optional[Tuple[int, int]]:
+        index = self._index(guild_id, season)
+        if index is None:
+            return None
+        
+        user_ids, ranks, xps = index
+        pos = bisect_left(user_ids, user_id)
+        if pos < len(user_ids) and user_ids[pos] == user_id:
+            return ranks[pos], xps[pos]
+        return None
+    
+    def history(self, guild_id: int, user_id: int) -> List[Tuple[int, Optional[Tuple[int, int]]]]:
+        seasons = sorted(int(number) for number in self.manifest(guild_id)["seasons"])
+        return [(season, self.rank_of(guild_id, season, user_id)) for season in seasons]
+
+season_archive = SeasonArchive()
+
+class RoleManager:
+    _levels: List[int] = []
+    _role_ids: List[int] = []
+    _all_role_ids: Set[int] = set()
+    
+    @classmethod
+    def compile_level_roles(cls):
+        items = sorted(config.level_roles.items())
+        cls._levels = [level for level, _ in items]
+        cls._role_ids = [role_id for _, role_id in items]
+        cls._all_role_ids = set(cls._role_ids)
+    
+    @classmethod
+    def earned_role_ids(cls, level: int) -> Set[int]:
+        return set(cls._role_ids[:bisect_right(cls._levels, level)])
+    
+    @classmethod
+    def target_roles(cls, member: discord.Member, level: int) -> Optional[List[discord.abc.Snowflake]]:
+        earned = cls.earned_role_ids(level)
+        current_ids = {role.id for role in member.roles}
+        
+        to_add = [
+            role for role in (member.guild.get_role(role_id) for role_id in earned - current_ids)
+            if role is not None
+        ]
+        to_remove = (current_ids & cls._all_role_ids) - earned
+        
+        if not to_add and not to_remove:
+            return None
+        
+        return [role for role in member.roles if role.id not in to_remove] + to_add
+    
+    @classmethod
+    async def sync_level_roles(cls, member: discord.Member, level: int, reason: str) -> bool:
+        roles = cls.target_roles(member, level)
+        if roles is None:
+            return False
+        
+        try:
+            await member.edit(roles=roles, reason=reason)
+            return True
+        except discord.Forbidden:
+            print(f"Brak uprawnień do zmiany ról dla {member}")
+        except Exception as e:
+            print(f"Błąd zmiany ról: {e}")
+        return False
+    
+    @classmethod
+    async def assign_level_roles(cls, member: discord.Member, new_level: int, old_level: int):
+        await cls.sync_level_roles(member, new_level, f"Awans na poziom {new_level}")
+    
+    @classmethod
+    async def remove_all_level_roles(cls, member: discord.Member):
+        await cls.sync_level_roles(member, 0, "Reset statystyk")
+
+RoleManager.compile_level_roles()
+
+class RoleSyncQueue:
+    def __init__(self, interval: float = ROLE_SYNC_INTERVAL):
+        self.interval = interval
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._pending: Set[Tuple[int, int]] = set()
+        self._worker: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+    
+    @staticmethod
+    def current_level(member_id: int, guild_id: int) -> int:
+        user_data = db.data.get("users", {}).get(db.get_user_key(member_id, guild_id))
+        if not user_data:
+            return 0
+        return XPCalculator.level_from_xp(user_data.get("xp", 0))[0]
+    
+    def enqueue(self, member: discord.Member, reason: str) -> bool:
+        key = (member.guild.id, member.id)
+        if key in self._pending:
+            return False
+        self._pending.add(key)
+        self.queue.put_nowait((member.guild.id, member.id, reason))
+        self.start()
+        return True
+    
+    def enqueue_guild(self, guild: discord.Guild, reason: str) -> int:
+        queued = 0
+        
+        for member in guild.members:
+            if member.bot:
+                continue
+            
+            level = self.current_level(member.id, guild.id)
+            if RoleManager.target_roles(member, level) is not None and self.enqueue(member, reason):
+                queued += 1
+        
+        return queued
+    
+    async def _run(self):
+        while True:
+            guild_id, member_id, reason = await self.queue.get()
+            self._pending.discard((guild_id, member_id))
+            
+            try:
+                guild = bot.get_guild(guild_id)
+                member = guild.get_member(member_id) if guild else None
+                if member:
+                    level = self.current_level(member_id, guild_id)
+                    if await RoleManager.sync_level_roles(member, level, reason):
+                        await asyncio.sleep(self.interval)
+            except Exception as e:
+                print(f"Błąd synchronizacji ról: {e}")
+            finally:
+                self.queue.task_done()
+
+role_sync_queue = RoleSyncQueue()
+
+@dataclass
+class TimeBoost:
+    name: str
+    multiplier: float
+    weekdays: Optional[Set[int]] = None
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    
+    def is_active(self, now: datetime) -> bool:
+        if self.weekdays is not None and now.weekday() not in self.weekdays:
+            return False
+        if self.start and now < self.start:
+            return False
+        if self.end and now >= self.end:
+            return False
+        return True
+    
+    @staticmethod
+    def _parse(value: Optional[str]) -> Optional[datetime]:
+        if not value:
+            return None
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone().replace(tzinfo=None)
+        return parsed
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "TimeBoost":
+        return cls(
+            name=data.get("name", "Boost"),
+            multiplier=float(data.get("multiplier", 1.0)),
+            weekdays=set(data["weekdays"]) if "weekdays" in data else None,
+            start=cls._parse(data.get("start")),
+            end=cls._parse(data.get("end"))
+        )
+
+class CompiledXPRules:
+    def __init__(self, raw: Optional[Dict] = None):
+        raw = raw or {}
+        
+        self.channels: Dict[int, float] = {int(cid): float(m) for cid, m in raw.get("channels", {}).items()}
+        for channel_id in raw.get("no_xp_channels", []):
+            self.channels[int(channel_id)] = 0.0
+        
+        role_items = sorted((int(rid), float(m)) for rid, m in raw.get("roles", {}).items())
+        self.role_bits: Dict[int, int] = {role_id: 1 << bit for bit, (role_id, _) in enumerate(role_items)}
+        self.role_multipliers: List[float] = [multiplier for _, multiplier in role_items]
+        self.boosts: List[TimeBoost] = [TimeBoost.from_dict(boost) for boost in raw.get("boosts", [])]
+        
+        self._member_masks: "OrderedDict[int, int]" = OrderedDict()
+        self._mask_multipliers: Dict[int, float] = {0: 1.0}
+        self._time_multiplier = 1.0
+        self._time_expires = 0.0
+    
+    def member_mask(self, member: discord.Member) -> int:
+        if not self.role_bits:
+            return 0
+        
+        mask = self._member_masks.get(member.id)
+        if mask is None:
+            mask = 0
+            for role in member.roles:
+                mask |= self.role_bits.get(role.id, 0)
+            self._member_masks[member.id] = mask
+            if len(self._member_masks) > MEMBER_MASK_CACHE_SIZE:
+                self._member_masks.popitem(last=False)
+        else:
+            self._member_masks.move_to_end(member.id)
+        return mask
+    
+    def forget_member(self, user_id: int):
+        self._member_masks.pop(user_id, None)
+    
+    def role_multiplier(self, mask: int) -> float:
+        multiplier = self._mask_multipliers.get(mask)
+        if multiplier is None:
+            multiplier = max(
+                (m for bit, m in enumerate(self.role_multipliers) if mask >> bit & 1),
+                default=1.0
+            )
+            self._mask_multipliers[mask] = multiplier
+        return multiplier
+    
+    def time_multiplier(self) -> float:
+        now = time.monotonic()
+        if now >= self._time_expires:
+            current = datetime.now()
+            self._time_multiplier = 1.0
+            for boost in self.boosts:
+                if boost.is_active(current):
+                    self._time_multiplier *= boost.multiplier
+            self._time_expires = now + 60 - current.second
+        return self._time_multiplier
+    
+    def channel_multiplier(self, channel: Optional[discord.abc.GuildChannel]) -> float:
+        if channel is None:
+            return 1.0
+        multiplier = self.channels.get(channel.id)
+        if multiplier is None:
+            multiplier = self.channels.get(getattr(channel, "parent_id", None), 1.0)
+        return multiplier
+    
+    def multiplier(self, member: discord.Member, channel: Optional[discord.abc.GuildChannel]) -> float:
+        channel_multiplier = self.channel_multiplier(channel)
+        if channel_multiplier == 0:
+            return 0.0
+        return channel_multiplier * self.role_multiplier(self.member_mask(member)) * self.time_multiplier()
+
+class XPRules:
+    def __init__(self, filename: str = XP_RULES_FILE):
+        self.filename = filename
+        self.guilds: Dict[int, CompiledXPRules] = {}
+        self._default = CompiledXPRules()
+        self._mtime: Optional[float] = None
+        self.reload_if_changed()
+    
+    def reload_if_changed(self) -> bool:
+        try:
+            mtime = os.path.getmtime(self.filename)
+        except OSError:
+            mtime = None
+        
+        if mtime == self._mtime:
+            return False
+        
+        raw = {}
+        if mtime is not None:
+            try:
+                with open(self.filename, 'r', encoding='utf-8') as f:
+                    raw = json.load(f)
+            except (json.JSONDecodeError, IOError) as e:
+                print(f"Błąd ładowania reguł XP: {e}")
+                return False
+        
+        try:
+            self.guilds = {int(guild_id): CompiledXPRules(rules) for guild_id, rules in raw.items()}
+        except (TypeError, ValueError) as e:
+            print(f"Błąd kompilacji reguł XP: {e}")
+            return False
+        
+        self._mtime = mtime
+        return True
+    
+    def for_guild(self, guild_id: int) -> CompiledXPRules:
+        return self.guilds.get(guild_id, self._default)
+    
+    def multiplier(self, member: discord.Member, channel: Optional[discord.abc.GuildChannel]) -> float:
+        return self.for_guild(member.guild.id).multiplier(member, channel)
+
+xp_rules = XPRules()
+
+def build_level_up_embed(member: discord.Member, new_level: int) -> discord.Embed:
+    embed = discord.Embed(
+        title="🎉 AWANS POZIOMU! 🎉",
+        description=f"{member.mention} awansował na **poziom {new_level}!**",
+        color=discord.Color.gold(),
+        timestamp=datetime.now()
+    )
+    
+    user_data = db.get_user_data(member.id, member.guild.id)
+    level, current_xp, xp_needed = XPCalculator.level_from_xp(user_data.get("xp", 0))
+    progress_bar = XPCalculator.calculate_progress_bar(current_xp, xp_needed)
+    
+    embed.add_field(
+        name="📊 Postęp",
+        value=f"```{progress_bar}```\n{current_xp}/{xp_needed} XP ({current_xp/xp_needed*100:.1f}%)",
+        inline=False
+    )
+    
+    if new_level in config.level_roles:
+        role_id = config.level_roles[new_level]
+        role = member.guild.get_role(role_id)
+        if role:
+            embed.add_field(
+                name="🎖️ Nowa rola",
+                value=f"Otrzymałeś rolę {role.mention}!",
+                inline=False
+            )
+    
+    rank_pos = db.get_user_rank(member.id, member.guild.id)
+    if rank_pos:
+        embed.add_field(
+            name="🏆 Ranking",
+            value=f"#{rank_pos} w rankingu serwera",
+            inline=True
+        )
+    
+    embed.add_field(
+        name="💬 Wiadomości",
+        value=f"**{user_data.get('messages', 0)}**",
+        inline=True
+    )
+    
+    embed.add_field(
+        name="⭐ Całkowite XP",
+        value=f"**{user_data.get('total_xp', 0)}**",
+        inline=True
+    )
+    
+    if member.avatar:
+        embed.set_thumbnail(url=member.avatar.url)
+    
+    embed.set_footer(text=f"ID: {member.id}")
+    
+    return embed
+
+def build_coalesced_level_up_embed(guild: discord.Guild, level_ups: Dict[int, int]) -> discord.Embed:
+    embed = discord.Embed(
+        title="🎉 AWANSE POZIOMÓW! 🎉",
+        color=discord.Color.gold(),
+        timestamp=datetime.now()
+    )
+    
+    lines = []
+    for user_id, new_level in sorted(level_ups.items(), key=lambda item: -item[1])[:ANNOUNCE_MAX_LINES]:
+        member = guild.get_member(user_id)
+        mention = member.mention if member else f"`{user_id}`"
+        rank_pos = db.get_user_rank(user_id, guild.id)
+        rank_text = f" (#{rank_pos})" if rank_pos else ""
+        lines.append(f"{mention} → **poziom {new_level}**{rank_text}")
+    
+    if len(level_ups) > ANNOUNCE_MAX_LINES:
+        lines.append(f"...i **{len(level_ups) - ANNOUNCE_MAX_LINES}** innych")
+    
+    embed.description = "\n".join(lines)
+    embed.set_footer(text=f"Awansów: {len(level_ups)}")
+    return embed
+
+@dataclass
+class PendingAnnouncements:
+    first_at: float
+    level_ups: Dict[Tuple[int, int], int]
+
+class LevelUpAnnouncer:
+    def __init__(self, window: float = ANNOUNCE_COALESCE_SECONDS, min_interval: float = ANNOUNCE_CHANNEL_INTERVAL):
+        self.window = window
+        self.min_interval = min_interval
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._pending: Dict[int, PendingAnnouncements] = {}
+        self._last_sent: Dict[int, float] = {}
+        self._worker: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+    
+    def enqueue(self, member: discord.Member, new_level: int):
+        if not config.level_up_channel_id:
+            return
+        self.queue.put_nowait((config.level_up_channel_id, member.guild.id, member.id, new_level))
+        self.start()
+    
+    def _add(self, item: Tuple[int, int, int, int]):
+        channel_id, guild_id, user_id, new_level = item
+        pending = self._pending.get(channel_id)
+        if pending is None:
+            pending = self._pending[channel_id] = PendingAnnouncements(time.monotonic(), {})
+        
+        key = (guild_id, user_id)
+        pending.level_ups[key] = max(new_level, pending.level_ups.get(key, 0))
+    
+    def _ready_at(self, channel_id: int) -> float:
+        return max(
+            self._pending[channel_id].first_at + self.window,
+            self._last_sent.get(channel_id, 0.0) + self.min_interval
+        )
+    
+    def _next_ready_in(self) -> Optional[float]:
+        if not self._pending:
+            return None
+        return max(0.0, min(self._ready_at(c) for c in self._pending) - time.monotonic())
+    
+    async def _run(self):
+        while True:
+            timeout = self._next_ready_in()
+            if timeout is None:
+                self._add(await self.queue.get())
+            elif timeout > 0:
+                try:
+                    self._add(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    pass
+            
+            while not self.queue.empty():
+                self._add(self.queue.get_nowait())
+            
+            now = time.monotonic()
+            for channel_id in [c for c in self._pending if self._ready_at(c) <= now]:
+                pending = self._pending.pop(channel_id)
+                self._last_sent[channel_id] = now
+                try:
+                    await self._send(channel_id, pending.level_ups)
+                except Exception as e:
+                    print(f"Błąd wysyłania wiadomości o awansie: {e}")
+    
+    async def _send(self, channel_id: int, level_ups: Dict[Tuple[int, int], int]):
+        channel = bot.get_channel(channel_id)
+        if not channel:
+            return
+        
+        by_guild: Dict[int, Dict[int, int]] = defaultdict(dict)
+        for (guild_id, user_id), new_level in level_ups.items():
+            by_guild[guild_id][user_id] = new_level
+        
+        for guild_id, guild_level_ups in by_guild.items():
+            guild = bot.get_guild(guild_id)
+            if not guild:
+                continue
+            
+            if len(guild_level_ups) == 1:
+                user_id, new_level = next(iter(guild_level_ups.items()))
+                member = guild.get_member(user_id)
+                if not member:
+                    continue
+                embed = build_level_up_embed(member, new_level)
+            else:
+                embed = build_coalesced_level_up_embed(guild, guild_level_ups)
+            
+            await channel.send(embed=embed)
+
+level_up_announcer = LevelUpAnnouncer()
+
+async def grant_xp(member: discord.Member, xp_gained: int, counter: str, count: int = 1):
+    user_data = db.get_user_data(member.id, member.guild.id)
+    old_xp = user_data.get("xp", 0)
+    
+    user_data["xp"] = user_data.get("xp", 0) + xp_gained
+    user_data["total_xp"] = user_data.get("total_xp", 0) + xp_gained
+    user_data[counter] = user_data.get(counter, 0) + count
+    activity_tracker.record(member.guild.id, member.id, xp_gained)
+    user_data["last_active"] = datetime.now().isoformat()
+    user_data.setdefault("created_at", datetime.now().isoformat())
+    
+    old_level, _, _ = XPCalculator.level_from_xp(old_xp)
+    new_level, _, _ = XPCalculator.level_from_xp(user_data["xp"])
+    
+    if new_level > old_level:
+        user_data["level"] = new_level
+        await RoleManager.assign_level_roles(member, new_level, old_level)
+        level_up_announcer.enqueue(member, new_level)
+    
+    db.update_user(member.id, member.guild.id, user_data)
+
+@dataclass
+class VoiceSession:
+    channel_id: int
+    joined_at: float
+    last_update: float
+    eligible: bool = False
+    pending_seconds: float = 0.0
+    earning_channel_id: Optional[int] = None
 
-class XPCalculator:
-    @staticmethod
-    def xp_for_level(level: int) -> int:
-        return int(config.level_base * (config.level_multiplier ** (level - 1)))
+class VoiceTracker:
+    def __init__(self):
+        self.sessions: Dict[Tuple[int, int], VoiceSession] = {}
     
     @staticmethod
-    def level_from_xp(xp: int) -> Tuple[int, int, int]:
-        level = 1
-        xp_needed = XPCalculator.xp_for_level(level)
-        
-        while xp >= xp_needed:
-            xp -= xp_needed
-            level += 1
-            xp_needed = XPCalculator.xp_for_level(level)
-            
-            if level > 1000:
-                break
+    def is_eligible(member: discord.Member) -> bool:
+        voice = member.voice
+        if member.bot or not voice or not voice.channel:
+            return False
+        if voice.afk or voice.channel == member.guild.afk_channel:
+            return False
+        if voice.self_mute or voice.mute or voice.self_deaf or voice.deaf:
+            return False
+        if xp_rules.for_guild(member.guild.id).channel_multiplier(voice.channel) <= 0:
+            return False
         
-        return level, xp, XPCalculator.xp_for_level(level)
+        listeners = sum(1 for m in voice.channel.members if not m.bot)
+        return listeners >= config.voice_min_members
     
-    @staticmethod
-    def calculate_progress_bar(current: int, needed: int, length: int = 20) -> str:
-        if needed <= 0:
-            return "█" * length
-        percentage = min(current / needed, 1.0)
-        filled = int(length * percentage)
-        return "█" * filled + "░" * (length - filled)
-
-class RoleManager:
-    @staticmethod
-    async def assign_level_roles(member: discord.Member, new_level: int, old_level: int):
-        roles_to_add = []
+    def _settle(self, session: VoiceSession, member: Optional[discord.Member], now: float):
+        if session.eligible:
+            session.pending_seconds += now - session.last_update
+            session.earning_channel_id = session.channel_id
+        session.last_update = now
+        session.eligible = member is not None and self.is_eligible(member)
+    
+    def _settle_channel(self, channel: Optional[discord.abc.GuildChannel], now: float):
+        if channel is None:
+            return
+        for member in channel.members:
+            session = self.sessions.get((channel.guild.id, member.id))
+            if session:
+                self._settle(session, member, now)
+    
+    def join(self, member: discord.Member, channel: discord.abc.GuildChannel, now: float):
+        self.sessions[(member.guild.id, member.id)] = VoiceSession(
+            channel_id=channel.id,
+            joined_at=now,
+            last_update=now
+        )
+    
+    def on_state_change(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
+        if member.bot:
+            return
         
-        for required_level, role_id in config.level_roles.items():
-            if old_level < required_level <= new_level:
-                role = member.guild.get_role(role_id)
-                if role and role not in member.roles:
-                    roles_to_add.append(role)
+        now = time.monotonic()
+        key = (member.guild.id, member.id)
+        session = self.sessions.get(key)
         
-        if roles_to_add:
-            try:
-                await member.add_roles(*roles_to_add, reason=f"Awans na poziom {new_level}")
-            except discord.Forbidden:
-                print(f"Brak uprawnień do dodania ról dla {member}")
-            except Exception as e:
-                print(f"Błąd dodawania ról: {e}")
+        if session:
+            self._settle(session, member if after.channel else None, now)
+        
+        if after.channel is None:
+            if session and session.pending_seconds < 60:
+                self.sessions.pop(key, None)
+        elif session is None:
+            self.join(member, after.channel, now)
+        else:
+            session.channel_id = after.channel.id
+        
+        if before.channel != after.channel:
+            self._settle_channel(before.channel, now)
+        self._settle_channel(after.channel, now)
     
-    @staticmethod
-    async def remove_all_level_roles(member: discord.Member):
-        roles_to_remove = []
+    def bootstrap(self, guilds: List[discord.Guild]):
+        now = time.monotonic()
+        for guild in guilds:
+            for channel in guild.voice_channels + guild.stage_channels:
+                for member in channel.members:
+                    if not member.bot and (guild.id, member.id) not in self.sessions:
+                        self.join(member, channel, now)
+                self._settle_channel(channel, now)
+    
+    def collect(self) -> List[Tuple[int, int, int, int]]:
+        now = time.monotonic()
+        earned = []
         
-        for role_id in config.level_roles.values():
-            role = member.guild.get_role(role_id)
-            if role and role in member.roles:
-                roles_to_remove.append(role)
+        for (guild_id, user_id), session in list(self.sessions.items()):
+            guild = bot.get_guild(guild_id)
+            member = guild.get_member(user_id) if guild else None
+            in_voice = member is not None and member.voice is not None and member.voice.channel is not None
+            
+            self._settle(session, member if in_voice else None, now)
+            
+            minutes = int(session.pending_seconds // 60)
+            if minutes:
+                session.pending_seconds -= minutes * 60
+                earned.append((guild_id, user_id, session.earning_channel_id or session.channel_id, minutes))
+            
+            if not in_voice:
+                del self.sessions[(guild_id, user_id)]
         
-        if roles_to_remove:
-            try:
-                await member.remove_roles(*roles_to_remove, reason="Reset statystyk")
-            except discord.Forbidden:
-                print(f"Brak uprawnień do usunięcia ról dla {member}")
-            except Exception as e:
-                print(f"Błąd usuwania ról: {e}")
-
-async def send_level_up_message(message: discord.Message, new_level: int):
-    try:
-        level_up_channel = bot.get_channel(config.level_up_channel_id)
-        if level_up_channel:
-            embed = discord.Embed(
-                title="🎉 AWANS POZIOMU! 🎉",
-                description=f"{message.author.mention} awansował na **poziom {new_level}!**",
-                color=discord.Color.gold(),
-                timestamp=datetime.now()
-            )
-
-            user_data = db.get_user_data(message.author.id, message.guild.id)
-            level, current_xp, xp_needed = XPCalculator.level_from_xp(user_data.get("xp", 0))
-            progress_bar = XPCalculator.calculate_progress_bar(current_xp, xp_needed)
-                
-            embed.add_field(
-                name="📊 Postęp",
-                value=f"```{progress_bar}```\n{current_xp}/{xp_needed} XP ({current_xp/xp_needed*100:.1f}%)",
-                inline=False
-            )
-
-            if new_level in config.level_roles:
-                role_id = config.level_roles[new_level]
-                role = message.guild.get_role(role_id)
-                if role:
-                    embed.add_field(
-                        name="🎖️ Nowa rola",
-                        value=f"Otrzymałeś rolę {role.mention}!",
-                        inline=False
-                    )
-
-            rank_pos = db.get_user_rank(message.author.id, message.guild.id)
-            if rank_pos:
-                embed.add_field(
-                    name="🏆 Ranking",
-                    value=f"#{rank_pos} w rankingu serwera",
-                    inline=True
-                )
-                
-            embed.add_field(
-                name="💬 Wiadomości",
-                value=f"**{user_data.get('messages', 0)}**",
-                inline=True
-            )
-                
-            embed.add_field(
-                name="⭐ Całkowite XP",
-                value=f"**{user_data.get('total_xp', 0)}**",
-                inline=True
-            )
-                
-            if message.author.avatar:
-                embed.set_thumbnail(url=message.author.avatar.url)
-                
-            embed.set_footer(text=f"ID: {message.author.id}")
+        return earned
 
-            await level_up_channel.send(embed=embed)
-    except Exception as e:
-        print(f"Błąd wysyłania wiadomości o awansie: {e}")
+voice_tracker = VoiceTracker()
 
 @bot.event
 async def on_ready():
@@ -312,6 +1466,11 @@ async def on_ready():
     print(f"📊 Serwery: {len(bot.guilds)}")
 
     auto_save.start()
+    voice_tracker.bootstrap(bot.guilds)
+    if not voice_xp_tick.is_running():
+        voice_xp_tick.start()
+    if not reload_xp_rules.is_running():
+        reload_xp_rules.start()
     
     try:
         await bot.tree.sync()
@@ -329,28 +1488,30 @@ async def on_message(message: discord.Message):
         await bot.process_commands(message)
         return
     
-    xp_gained = random.randint(config.xp_per_message_min, config.xp_per_message_max)
-    user_data = db.get_user_data(message.author.id, message.guild.id)
-    old_xp = user_data.get("xp", 0)
-    
-    user_data["xp"] = user_data.get("xp", 0) + xp_gained
-    user_data["total_xp"] = user_data.get("total_xp", 0) + xp_gained
-    user_data["messages"] = user_data.get("messages", 0) + 1
-    user_data["last_active"] = datetime.now().isoformat()
-    user_data.setdefault("created_at", datetime.now().isoformat())
-    
-    old_level, _, _ = XPCalculator.level_from_xp(old_xp)
-    new_level, current_xp, xp_needed = XPCalculator.level_from_xp(user_data["xp"])
+    multiplier = xp_rules.multiplier(message.author, message.channel)
+    if multiplier <= 0:
+        await bot.process_commands(message)
+        return
     
-    if new_level > old_level:
-        user_data["level"] = new_level
-        await RoleManager.assign_level_roles(message.author, new_level, old_level)
-        await send_level_up_message(message, new_level)
+    xp_gained = round(random.randint(config.xp_per_message_min, config.xp_per_message_max) * multiplier)
+    await grant_xp(message.author, xp_gained, "messages")
     
-    db.update_user(message.author.id, message.guild.id, user_data)
     db.add_cooldown(message.author.id, message.guild.id)
     await bot.process_commands(message)
 
+@bot.event
+async def on_voice_state_update(member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
+    voice_tracker.on_state_change(member, before, after)
+
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    if before.roles != after.roles:
+        xp_rules.for_guild(after.guild.id).forget_member(after.id)
+
+@bot.event
+async def on_member_remove(member: discord.Member):
+    xp_rules.for_guild(member.guild.id).forget_member(member.id)
+
 @bot.command(name="rank")
 async def rank_command(ctx, member: discord.Member = None):
     """Sprawdź swój poziom i statystyki"""
@@ -398,48 +1559,414 @@ async def rank_command(ctx, member: discord.Member = None):
     embed.set_footer(text=f"ID: {target.id}")
     await ctx.send(embed=embed)
 
-@bot.command(name="leaderboard")
-async def leaderboard_command(ctx):
-    """Top 10 najaktywniejszych użytkowników"""
-    top_users = db.get_guild_leaderboard(ctx.guild.id, 10)
+class RankCardRenderer:
+    WIDTH = 640
+    HEIGHT = 200
+    AVATAR_SIZE = 136
+    RING_WIDTH = 10
     
-    if not top_users:
-        await ctx.send("📭 Brak danych w rankingu!")
-        return
+    def __init__(self, workers: int = RANK_CARD_WORKERS, avatar_cache_size: int = RANK_CARD_AVATAR_CACHE):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rankcard")
+        self.avatar_cache_size = avatar_cache_size
+        self._avatars: "OrderedDict[str, bytes]" = OrderedDict()
     
-    embed = discord.Embed(
-        title="🏆 TOP 10 RANKING",
-        description=f"Ranking aktywności w {ctx.guild.name}",
-        color=discord.Color.gold()
-    )
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def font(size: int) -> "ImageFont.ImageFont":
+        try:
+            return ImageFont.truetype(RANK_CARD_FONT, size)
+        except OSError:
+            try:
+                return ImageFont.load_default(size)
+            except TypeError:
+                return ImageFont.load_default()
+    
+    @classmethod
+    @lru_cache(maxsize=1)
+    def background(cls) -> "Image.Image":
+        image = Image.new("RGBA", (cls.WIDTH, cls.HEIGHT), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
+        draw.rounded_rectangle((0, 0, cls.WIDTH - 1, cls.HEIGHT - 1), radius=24, fill=(35, 39, 42, 255))
+        draw.rounded_rectangle((8, 8, cls.WIDTH - 9, cls.HEIGHT - 9), radius=20, outline=(241, 196, 15, 255), width=2)
+        return image
+    
+    @classmethod
+    @lru_cache(maxsize=1)
+    def avatar_mask(cls) -> "Image.Image":
+        mask = Image.new("L", (cls.AVATAR_SIZE, cls.AVATAR_SIZE), 0)
+        ImageDraw.Draw(mask).ellipse((0, 0, cls.AVATAR_SIZE - 1, cls.AVATAR_SIZE - 1), fill=255)
+        return mask
+    
+    async def avatar_bytes(self, member: discord.abc.User) -> bytes:
+        asset = member.display_avatar
+        key = asset.key
+        
+        cached = self._avatars.get(key)
+        if cached is not None:
+            self._avatars.move_to_end(key)
+            return cached
+        
+        data = await asset.replace(size=256, format="png").read()
+        self._avatars[key] = data
+        if len(self._avatars) > self.avatar_cache_size:
+            self._avatars.popitem(last=False)
+        return data
+    
+    def render(self, name: str, avatar: Optional[bytes], level: int, rank_pos: Optional[int],
+               current_xp: int, xp_needed: int, fmt: str = RANK_CARD_FORMAT) -> io.BytesIO:
+        card = self.background().copy()
+        draw = ImageDraw.Draw(card)
+        
+        margin = (self.HEIGHT - self.AVATAR_SIZE) // 2
+        if avatar:
+            picture = Image.open(io.BytesIO(avatar)).convert("RGBA").resize((self.AVATAR_SIZE, self.AVATAR_SIZE))
+            card.paste(picture, (margin, margin), self.avatar_mask())
+        
+        ring = (margin - 8, margin - 8, margin + self.AVATAR_SIZE + 7, margin + self.AVATAR_SIZE + 7)
+        progress = min(current_xp / xp_needed, 1.0) if xp_needed > 0 else 1.0
+        draw.arc(ring, 0, 360, fill=(72, 75, 78, 255), width=self.RING_WIDTH)
+        if progress > 0:
+            draw.arc(ring, -90, -90 + 360 * progress, fill=(241, 196, 15, 255), width=self.RING_WIDTH)
+        
+        text_x = margin * 2 + self.AVATAR_SIZE + 8
+        draw.text((text_x, 36), name[:24], font=self.font(32), fill=(255, 255, 255, 255))
+        draw.text((text_x, 88), f"Poziom {level}", font=self.font(26), fill=(241, 196, 15, 255))
+        if rank_pos:
+            draw.text((self.WIDTH - 40, 88), f"#{rank_pos}", font=self.font(26), fill=(185, 187, 190, 255), anchor="ra")
+        draw.text((text_x, 136), f"{current_xp}/{xp_needed} XP ({progress * 100:.1f}%)",
+                  font=self.font(20), fill=(185, 187, 190, 255))
+        
+        buffer = io.BytesIO()
+        if fmt == "webp":
+            card.save(buffer, format="WEBP", quality=90, method=4)
+        else:
+            card.save(buffer, format="PNG", optimize=False)
+        buffer.seek(0)
+        return buffer
     
-    medals = ["🥇", "🥈", "🥉", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
-    leaderboard_text = ""
+    async def render_async(self, *args) -> io.BytesIO:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.render, *args)
     
-    for i, (user_id, user_data) in enumerate(top_users):
+    async def render_member(self, member: discord.Member, fmt: str = RANK_CARD_FORMAT) -> io.BytesIO:
+        user_data = db.get_user_data(member.id, member.guild.id)
+        level, current_xp, xp_needed = XPCalculator.level_from_xp(user_data.get("xp", 0))
+        rank_pos = db.get_user_rank(member.id, member.guild.id)
+        
         try:
-            member = ctx.guild.get_member(user_id)
+            avatar = await self.avatar_bytes(member)
+        except Exception as e:
+            print(f"Błąd pobierania awatara: {e}")
+            avatar = None
+        
+        return await self.render_async(member.display_name, avatar, level, rank_pos, current_xp, xp_needed, fmt)
+
+rank_card_renderer = RankCardRenderer()
+
+@bot.command(name="rankcard")
+async def rank_card_command(ctx, member: discord.Member = None):
+    """Karta rangi jako obrazek"""
+    if Image is None:
+        await ctx.send("❌ Karty rangi wymagają biblioteki Pillow (`pip install Pillow`).")
+        return
+    
+    target = member or ctx.author
+    async with ctx.typing():
+        buffer = await rank_card_renderer.render_member(target)
+    
+    await ctx.send(file=discord.File(buffer, filename=f"rank-{target.id}.{RANK_CARD_FORMAT}"))
+
+@bot.command(name="rankcardbench")
+@commands.has_permissions(administrator=True)
+async def rank_card_bench(ctx, count: int = 100):
+    """Test wydajności renderowania kart rangi (karty/s)"""
+    if Image is None:
+        await ctx.send("❌ Karty rangi wymagają biblioteki Pillow (`pip install Pillow`).")
+        return
+    
+    count = max(1, min(count, 1000))
+    try:
+        avatar = await rank_card_renderer.avatar_bytes(ctx.author)
+    except Exception:
+        avatar = None
+    
+    results = {}
+    for fmt in ("png", "webp"):
+        started = time.perf_counter()
+        buffers = await asyncio.gather(*(
+            rank_card_renderer.render_async(ctx.author.display_name, avatar, i % 100 + 1, i + 1, i * 7 % 500, 500, fmt)
+            for i in range(count)
+        ))
+        elapsed = time.perf_counter() - started
+        results[fmt] = (count / elapsed, sum(b.getbuffer().nbytes for b in buffers) / count / 1024)
+    
+    embed = discord.Embed(title="⏱️ Wydajność kart rangi", color=discord.Color.blue())
+    for fmt, (per_second, size_kb) in results.items():
+        embed.add_field(name=fmt.upper(), value=f"**{per_second:.1f}** kart/s\nŚr. rozmiar: **{size_kb:.1f}** KB", inline=True)
+    embed.set_footer(text=f"Kart: {count} | Wątki: {rank_card_renderer.workers}")
+    
+    await ctx.send(embed=embed)
+
+class LeaderboardPages:
+    MEDALS = ["🥇", "🥈", "🥉", "4️⃣", "5️⃣", "6️⃣", "7️⃣", "8️⃣", "9️⃣", "🔟"]
+    
+    def __init__(self, page_size: int = LEADERBOARD_PAGE_SIZE, max_entries: int = LEADERBOARD_MAX_ENTRIES):
+        self.page_size = page_size
+        self.max_entries = max_entries
+        self._pages: Dict[int, Dict[int, str]] = defaultdict(dict)
+        self._names: "OrderedDict[int, str]" = OrderedDict()
+    
+    def invalidate(self, guild_id: int, start: int, end: Optional[int]):
+        pages = self._pages.get(guild_id)
+        if not pages:
+            return
+        
+        first = start // self.page_size
+        last = None if end is None else end // self.page_size
+        for page in [p for p in pages if p >= first and (last is None or p <= last)]:
+            del pages[page]
+    
+    def page_count(self, guild_id: int, period: Optional[str] = None) -> int:
+        size = activity_tracker.guild(guild_id).count(period) if period else db.index.size(guild_id)
+        entries = min(size, self.max_entries)
+        return max(1, -(-entries // self.page_size))
+    
+    def _remember_name(self, user_id: int, name: str):
+        self._names[user_id] = name
+        self._names.move_to_end(user_id)
+        if len(self._names) > NAME_CACHE_SIZE:
+            self._names.popitem(last=False)
+    
+    async def resolve_names(self, guild: discord.Guild, user_ids: List[int]) -> Dict[int, Tuple[str, str]]:
+        resolved = {}
+        missing = []
+        
+        for user_id in user_ids:
+            member = guild.get_member(user_id)
             if member:
-                name = member.display_name
-                mention = member.mention
+                resolved[user_id] = (member.mention, member.display_name)
+            elif user_id in self._names:
+                self._names.move_to_end(user_id)
+                resolved[user_id] = (f"`{user_id}`", self._names[user_id])
             else:
-                name = f"Użytkownik {user_id}"
-                mention = f"`{user_id}`"
-        except:
-            name = f"Użytkownik {user_id}"
-            mention = f"`{user_id}`"
+                user = bot.get_user(user_id)
+                if user:
+                    self._remember_name(user_id, user.name)
+                    resolved[user_id] = (f"`{user_id}`", user.name)
+                else:
+                    missing.append(user_id)
+        
+        if missing:
+            try:
+                for member in await guild.query_members(user_ids=missing, limit=len(missing)):
+                    resolved[member.id] = (member.mention, member.display_name)
+            except Exception:
+                pass
+            
+            left = [user_id for user_id in missing if user_id not in resolved]
+            users = await asyncio.gather(*(bot.fetch_user(user_id) for user_id in left), return_exceptions=True)
+            for user_id, user in zip(left, users):
+                name = user.name if isinstance(user, discord.User) else f"Użytkownik {user_id}"
+                self._remember_name(user_id, name)
+                resolved[user_id] = (f"`{user_id}`", name)
+        
+        return resolved
+    
+    async def render(self, guild: discord.Guild, page: int) -> str:
+        cached = self._pages[guild.id].get(page)
+        if cached is not None:
+            return cached
+        
+        start = page * self.page_size
+        user_ids = db.index.top(guild.id, start, min(start + self.page_size, self.max_entries))
+        names = await self.resolve_names(guild, user_ids)
+        users = db.data.get("users", {})
+        
+        lines = []
+        for pos, user_id in enumerate(user_ids, start):
+            user_data = users.get(db.get_user_key(user_id, guild.id), {})
+            mention, name = names[user_id]
+            level, _, _ = XPCalculator.level_from_xp(user_data.get("xp", 0))
+            medal = self.MEDALS[pos] if pos < len(self.MEDALS) else f"**{pos + 1}.**"
+            
+            lines.append(f"{medal} {mention} **{name}**")
+            lines.append(f"   └ Poziom **{level}** | **{user_data.get('xp', 0)}** XP | **{user_data.get('messages', 0)}** wiadomości\n")
+        
+        text = "\n".join(lines)
+        self._pages[guild.id][page] = text
+        return text
+    
+    async def render_period(self, guild: discord.Guild, period: str, page: int) -> str:
+        start = page * self.page_size
+        top = activity_tracker.guild(guild.id).top(period, start, min(start + self.page_size, self.max_entries))
+        names = await self.resolve_names(guild, [user_id for user_id, _ in top])
+        
+        lines = []
+        for pos, (user_id, xp) in enumerate(top, start):
+            mention, name = names[user_id]
+            medal = self.MEDALS[pos] if pos < len(self.MEDALS) else f"**{pos + 1}.**"
+            lines.append(f"{medal} {mention} **{name}** — **{xp}** XP")
+        
+        return "\n".join(lines)
+    
+    async def build_embed(self, guild: discord.Guild, page: int, period: Optional[str] = None) -> discord.Embed:
+        total_pages = self.page_count(guild.id, period)
+        page = max(0, min(page, total_pages - 1))
+        
+        if period:
+            title = f"🏆 RANKING {PERIOD_TITLES[period]}"
+            description = await self.render_period(guild, period, page)
+            total = activity_tracker.guild(guild.id).count(period)
+        else:
+            title = "🏆 RANKING SERWERA"
+            description = await self.render(guild, page)
+            total = db.index.size(guild.id)
         
-        level, _, _ = XPCalculator.level_from_xp(user_data.get("xp", 0))
-        medal = medals[i] if i < len(medals) else f"{i+1}."
+        embed = discord.Embed(
+            title=title,
+            description=description or "📭 Brak danych na tej stronie!",
+            color=discord.Color.gold()
+        )
+        embed.set_footer(text=f"Strona {page + 1}/{total_pages} | Użytkowników w rankingu: {total}")
+        return embed
+
+leaderboard_pages = LeaderboardPages()
+db.index.listeners.append(leaderboard_pages.invalidate)
+
+class LeaderboardView(discord.ui.View):
+    def __init__(self, author_id: int, guild: discord.Guild, page: int, period: Optional[str] = None):
+        super().__init__(timeout=180)
+        self.author_id = author_id
+        self.guild = guild
+        self.page = page
+        self.period = period
+        self._update_buttons()
+    
+    def _update_buttons(self):
+        last_page = leaderboard_pages.page_count(self.guild.id, self.period) - 1
+        self.first_button.disabled = self.prev_button.disabled = self.page <= 0
+        self.next_button.disabled = self.last_button.disabled = self.page >= last_page
+    
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("❌ To nie jest Twój ranking! Użyj `!leaderboard`.", ephemeral=True)
+            return False
+        return True
+    
+    async def _show(self, interaction: discord.Interaction, page: int):
+        self.page = max(0, min(page, leaderboard_pages.page_count(self.guild.id, self.period) - 1))
+        self._update_buttons()
+        embed = await leaderboard_pages.build_embed(self.guild, self.page, self.period)
+        await interaction.response.edit_message(embed=embed, view=self)
+    
+    @discord.ui.button(emoji="⏮️", style=discord.ButtonStyle.secondary)
+    async def first_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, 0)
+    
+    @discord.ui.button(emoji="◀️", style=discord.ButtonStyle.primary)
+    async def prev_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page - 1)
+    
+    @discord.ui.button(emoji="▶️", style=discord.ButtonStyle.primary)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1)
+    
+    @discord.ui.button(emoji="⏭️", style=discord.ButtonStyle.secondary)
+    async def last_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, leaderboard_pages.page_count(self.guild.id, self.period) - 1)
+
+@bot.command(name="leaderboard")
+async def leaderboard_command(ctx, period: str = None, page: int = 1):
+    """Ranking najaktywniejszych użytkowników: !leaderboard [week|month] [strona]"""
+    if period and period.isdigit():
+        period, page = None, int(period)
+    elif period:
+        period = PERIOD_ALIASES.get(period.lower())
+        if period is None:
+            await ctx.send("❌ Dostępne widoki: `week`, `month` lub numer strony.")
+            return
+    
+    if not db.index.size(ctx.guild.id):
+        await ctx.send("📭 Brak danych w rankingu!")
+        return
+    
+    page = max(0, min(page - 1, leaderboard_pages.page_count(ctx.guild.id, period) - 1))
+    embed = await leaderboard_pages.build_embed(ctx.guild, page, period)
+    view = LeaderboardView(ctx.author.id, ctx.guild, page, period)
+    
+    await ctx.send(embed=embed, view=view)
+
+@bot.command(name="season")
+async def season_command(ctx, season: int = None, page: int = 1):
+    """Archiwalny ranking sezonu: !season <numer> [strona]"""
+    manifest = await asyncio.get_running_loop().run_in_executor(None, season_archive.manifest, ctx.guild.id)
+    seasons = manifest["seasons"]
+    
+    if season is None:
+        if not seasons:
+            await ctx.send("📭 Brak zakończonych sezonów!")
+            return
         
-        leaderboard_text += f"{medal} {mention} **{name}**\n"
-        leaderboard_text += f"   └ Poziom **{level}** | **{user_data.get('xp', 0)}** XP | **{user_data.get('messages', 0)}** wiadomości\n\n"
+        embed = discord.Embed(title="📚 Archiwum sezonów", color=discord.Color.gold())
+        embed.description = "\n".join(
+            f"**Sezon {number}** — {info['players']} graczy, zakończony <t:{int(datetime.fromisoformat(info['ended_at']).timestamp())}:d>"
+            for number, info in sorted(seasons.items(), key=lambda item: int(item[0]))
+        )
+        embed.set_footer(text=f"Użyj {PREFIX}season <numer> [strona]")
+        await ctx.send(embed=embed)
+        return
+    
+    info = seasons.get(str(season))
+    if not info:
+        await ctx.send(f"❌ Sezon {season} nie istnieje!")
+        return
+    
+    total_pages = max(1, -(-info["players"] // LEADERBOARD_PAGE_SIZE))
+    page = max(1, min(page, total_pages))
+    start = (page - 1) * LEADERBOARD_PAGE_SIZE
+    rows = await asyncio.get_running_loop().run_in_executor(
+        None, season_archive.read_page, ctx.guild.id, season, start, start + LEADERBOARD_PAGE_SIZE
+    )
+    names = await leaderboard_pages.resolve_names(ctx.guild, [row["user_id"] for row in rows])
+    
+    lines = []
+    for row in rows:
+        mention, name = names[row["user_id"]]
+        rank = row["rank"]
+        medal = LeaderboardPages.MEDALS[rank - 1] if rank <= len(LeaderboardPages.MEDALS) else f"**{rank}.**"
+        lines.append(f"{medal} {mention} **{name}** — Poziom **{row['level']}** | **{row['xp']}** XP")
+    
+    embed = discord.Embed(
+        title=f"🏆 RANKING SEZONU {season}",
+        description="\n".join(lines) or "📭 Brak danych na tej stronie!",
+        color=discord.Color.gold()
+    )
+    embed.set_footer(text=f"Strona {page}/{total_pages} | Graczy: {info['players']}")
+    await ctx.send(embed=embed)
+
+@bot.command(name="seasonrank")
+async def season_rank_command(ctx, member: discord.Member = None):
+    """Miejsca w poprzednich sezonach"""
+    target = member or ctx.author
+    history = await asyncio.get_running_loop().run_in_executor(
+        None, season_archive.history, ctx.guild.id, target.id
+    )
     
-    embed.description = leaderboard_text
+    if not history:
+        await ctx.send("📭 Brak zakończonych sezonów!")
+        return
     
-    total_messages = sum(data.get("messages", 0) for _, data in top_users)
-    embed.set_footer(text=f"Łącznie wiadomości w TOP10: {total_messages}")
+    embed = discord.Embed(title=f"📚 Historia sezonów {target.display_name}", color=discord.Color.blue())
+    lines = []
+    for season, result in history:
+        if result:
+            rank, xp = result
+            lines.append(f"**Sezon {season}:** #{rank} — {xp} XP")
+        else:
+            lines.append(f"**Sezon {season}:** brak udziału")
     
+    embed.description = "\n".join(lines[-20:])
+    embed.set_footer(text=f"ID: {target.id}")
     await ctx.send(embed=embed)
 
 @bot.tree.command(name="xpadd", description="Dodaj XP użytkownikowi (tylko admin)")
@@ -494,9 +2021,7 @@ async def xp_remove(interaction: discord.Interaction, member: discord.Member, am
     db.update_user(member.id, interaction.guild.id, user_data)
     
     if new_level < old_level:
-        await RoleManager.remove_all_level_roles(member)
-        if new_level > 0:
-            await RoleManager.assign_level_roles(member, new_level, 0)
+        await RoleManager.sync_level_roles(member, new_level, f"Spadek na poziom {new_level}")
     
     embed = discord.Embed(
         title="✅ XP odjęte pomyślnie",
@@ -537,6 +2062,115 @@ async def xp_reset(interaction: discord.Interaction, member: discord.Member):
     
     await interaction.followup.send(embed=embed)
 
+@bot.tree.command(name="xpexport", description="Eksportuj dane poziomów serwera do pliku (admin)")
+@app_commands.default_permissions(administrator=True)
+@app_commands.checks.has_permissions(administrator=True)
+async def xp_export(interaction: discord.Interaction, format: Literal["csv", "jsonl"] = "csv"):
+    await interaction.response.defer()
+    
+    output = await BulkTransfer.export_guild(interaction.guild.id, format)
+    try:
+        await interaction.followup.send(
+            f"📦 Eksport danych: **{db.index.size(interaction.guild.id)}** użytkowników",
+            file=discord.File(output, filename=f"leveling-{interaction.guild.id}.{format}")
+        )
+    finally:
+        output.close()
+
+@bot.tree.command(name="xpimport", description="Importuj dane poziomów z pliku CSV/JSONL (admin)")
+@app_commands.default_permissions(administrator=True)
+@app_commands.checks.has_permissions(administrator=True)
+async def xp_import(interaction: discord.Interaction, file: discord.Attachment, mode: Literal["set", "add"] = "set"):
+    await interaction.response.defer()
+    
+    fmt = "jsonl" if file.filename.lower().endswith((".jsonl", ".json")) else "csv"
+    source = tempfile.NamedTemporaryFile(mode="w+b", suffix=f".{fmt}", delete=False)
+    try:
+        await BulkTransfer.download(file, source)
+        source.close()
+        rows = await asyncio.get_running_loop().run_in_executor(None, BulkTransfer.stage, source.name, fmt)
+    except aiohttp.ClientError as e:
+        await interaction.followup.send(f"❌ Nie udało się pobrać pliku: {e}")
+        return
+    except ValueError as e:
+        await interaction.followup.send(f"❌ Import przerwany, żadne dane nie zostały zmienione.\n{e}")
+        return
+    finally:
+        source.close()
+        os.remove(source.name)
+    
+    imported = BulkTransfer.apply(interaction.guild.id, rows, mode)
+    await db.save_all_async()
+    queued = role_sync_queue.enqueue_guild(interaction.guild, "Import danych poziomów")
+    
+    embed = discord.Embed(title="✅ Import zakończony", color=discord.Color.green())
+    embed.add_field(name="Wiersze", value=f"**{imported}**", inline=True)
+    embed.add_field(name="Tryb", value=f"**{mode}**", inline=True)
+    embed.add_field(name="Role w kolejce", value=f"**{queued}**", inline=True)
+    
+    await interaction.followup.send(embed=embed)
+
+@bot.tree.command(name="xprole", description="Dodaj lub odejmij XP wszystkim członkom roli (admin)")
+@app_commands.default_permissions(administrator=True)
+@app_commands.checks.has_permissions(administrator=True)
+async def xp_role(interaction: discord.Interaction, role: discord.Role, amount: int):
+    await interaction.response.defer()
+    
+    if amount == 0:
+        await interaction.followup.send("❌ Ilość XP nie może być równa 0!")
+        return
+    
+    members = [member for member in role.members if not member.bot]
+    updated = BulkTransfer.add_xp(interaction.guild.id, (member.id for member in members), amount)
+    
+    reason = f"Zbiorcza zmiana XP dla roli {role.name}"
+    queued = sum(
+        1 for member in members
+        if RoleManager.target_roles(member, role_sync_queue.current_level(member.id, interaction.guild.id)) is not None
+        and role_sync_queue.enqueue(member, reason)
+    )
+    
+    embed = discord.Embed(title="✅ XP zmienione zbiorczo", color=discord.Color.green())
+    embed.add_field(name="Rola", value=role.mention, inline=True)
+    embed.add_field(name="Zmiana XP", value=f"**{amount:+}**", inline=True)
+    embed.add_field(name="Członkowie", value=f"**{updated}**", inline=True)
+    embed.add_field(name="Role w kolejce", value=f"**{queued}**", inline=True)
+    
+    await interaction.followup.send(embed=embed)
+
+@bot.tree.command(name="xpresetseason", description="Zarchiwizuj ranking i rozpocznij nowy sezon (admin)")
+@app_commands.default_permissions(administrator=True)
+@app_commands.checks.has_permissions(administrator=True)
+async def xp_reset_season(interaction: discord.Interaction):
+    await interaction.response.defer()
+    
+    guild_id = interaction.guild.id
+    season = season_archive.current_season(guild_id)
+    rows = season_archive.snapshot(guild_id)
+    
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, season_archive.write, guild_id, season, rows)
+    except Exception as e:
+        await interaction.followup.send(f"❌ Nie udało się zarchiwizować sezonu, statystyki nie zostały zresetowane: {e}")
+        return
+    
+    reset = BulkTransfer.reset_season(guild_id)
+    await db.save_all_async()
+    queued = role_sync_queue.enqueue_guild(interaction.guild, "Reset sezonu")
+    
+    embed = discord.Embed(
+        title=f"🔄 Sezon {season} zakończony",
+        description="Ranking został zarchiwizowany, a XP, poziomy i liczniki aktywności wyzerowane. "
+                    "Całkowite XP pozostaje bez zmian.",
+        color=discord.Color.red()
+    )
+    embed.add_field(name="Zarchiwizowano", value=f"**{len(rows)}** graczy", inline=True)
+    embed.add_field(name="Użytkownicy", value=f"**{reset}**", inline=True)
+    embed.add_field(name="Role w kolejce", value=f"**{queued}**", inline=True)
+    embed.set_footer(text=f"Sprawdź archiwum: {PREFIX}season {season}")
+    
+    await interaction.followup.send(embed=embed)
+
 @bot.tree.command(name="setlevelchannel", description="Ustaw kanał do wiadomości o awansach (admin)")
 @commands.has_permissions(administrator=True)
 async def set_level_channel(interaction: discord.Interaction, channel: discord.TextChannel):
@@ -604,10 +2238,112 @@ async def test_level_up(interaction: discord.Interaction, level: int = 5):
     except Exception as e:
         await interaction.followup.send(f"❌ Błąd: {e}")
 
+@bot.tree.command(name="syncroles", description="Zsynchronizuj role poziomów wszystkich członków (admin)")
+@app_commands.default_permissions(administrator=True)
+@app_commands.checks.has_permissions(administrator=True)
+async def sync_roles(interaction: discord.Interaction):
+    await interaction.response.defer()
+    
+    queued = role_sync_queue.enqueue_guild(interaction.guild, "Synchronizacja ról poziomów")
+    
+    embed = discord.Embed(
+        title="🔄 Synchronizacja ról",
+        description=f"Dodano do kolejki **{queued}** członków z nieaktualnymi rolami.",
+        color=discord.Color.blue()
+    )
+    embed.add_field(name="W kolejce", value=f"**{role_sync_queue.queue.qsize()}**", inline=True)
+    embed.add_field(name="Odstęp", value=f"**{role_sync_queue.interval}s** / zmiana", inline=True)
+    
+    await interaction.followup.send(embed=embed)
+
+@bot.tree.error
+async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    if isinstance(error, app_commands.MissingPermissions):
+        message = "❌ Nie masz uprawnień do użycia tej komendy!"
+    else:
+        print(f"Błąd komendy /{interaction.command.name if interaction.command else '?'}: {error}")
+        message = f"❌ Błąd: {error}"
+    
+    if interaction.response.is_done():
+        await interaction.followup.send(message, ephemeral=True)
+    else:
+        await interaction.response.send_message(message, ephemeral=True)
+
+@bot.tree.command(name="xprules", description="Pokaż efektywny mnożnik XP dla członka")
+async def xp_rules_command(interaction: discord.Interaction, member: Optional[discord.Member] = None,
+                           channel: Optional[discord.TextChannel] = None):
+    target = member or interaction.user
+    channel = channel or interaction.channel
+    rules = xp_rules.for_guild(interaction.guild.id)
+    
+    channel_multiplier = rules.channel_multiplier(channel)
+    mask = rules.member_mask(target)
+    role_multiplier = rules.role_multiplier(mask)
+    time_multiplier = rules.time_multiplier()
+    
+    embed = discord.Embed(
+        title=f"⚙️ Mnożnik XP: {target.display_name}",
+        description=f"Efektywny mnożnik: **x{rules.multiplier(target, channel):.2f}**",
+        color=discord.Color.blue()
+    )
+    embed.add_field(
+        name="💬 Kanał",
+        value=f"{channel.mention}: " + ("**brak XP**" if channel_multiplier == 0 else f"**x{channel_multiplier:.2f}**"),
+        inline=False
+    )
+    
+    boosted_roles = [f"<@&{role_id}> x{rules.role_multipliers[bit.bit_length() - 1]:.2f}"
+                     for role_id, bit in rules.role_bits.items() if mask & bit]
+    embed.add_field(
+        name="🎖️ Role",
+        value=f"**x{role_multiplier:.2f}**" + (f"\n{', '.join(boosted_roles)}" if boosted_roles else ""),
+        inline=False
+    )
+    
+    now = datetime.now()
+    active_boosts = [f"{boost.name} x{boost.multiplier:.2f}" for boost in rules.boosts if boost.is_active(now)]
+    embed.add_field(
+        name="⏰ Bonusy czasowe",
+        value=f"**x{time_multiplier:.2f}**" + (f"\n{', '.join(active_boosts)}" if active_boosts else ""),
+        inline=False
+    )
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@tasks.loop(seconds=XP_RULES_RELOAD_SECONDS)
+async def reload_xp_rules():
+    if xp_rules.reload_if_changed():
+        print("🔄 Przeładowano reguły XP")
+
 @tasks.loop(minutes=5)
 async def auto_save():
     await db.save_all_async()
 
+@tasks.loop(seconds=VOICE_TICK_SECONDS)
+async def voice_xp_tick():
+    for guild_id, user_id, channel_id, minutes in voice_tracker.collect():
+        guild = bot.get_guild(guild_id)
+        member = guild.get_member(user_id) if guild else None
+        if not member:
+            continue
+        
+        multiplier = xp_rules.multiplier(member, guild.get_channel(channel_id))
+        if multiplier <= 0:
+            continue
+        
+        xp_gained = round(multiplier * sum(
+            random.randint(config.voice_xp_per_minute_min, config.voice_xp_per_minute_max)
+            for _ in range(minutes)
+        ))
+        try:
+            await grant_xp(member, xp_gained, "voice_minutes", minutes)
+        except Exception as e:
+            print(f"Błąd przyznawania XP za głos: {e}")
+
+@voice_xp_tick.before_loop
+async def before_voice_xp_tick():
+    await bot.wait_until_ready()
+
 @bot.event
 async def on_disconnect():
     await db.save_all_async()
@@ -617,9 +2353,17 @@ async def before_auto_save():
     await bot.wait_until_ready()
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--import-json":
+        source = sys.argv[2] if len(sys.argv) > 2 else JSON_FILENAME
+        imported = migrate_json_to_sqlite(source, SQLITE_FILENAME)
+        print(f"✅ Zaimportowano {imported} użytkowników z {source} do {SQLITE_FILENAME}")
+        sys.exit(0)
+    
     try:
         bot.run(TOKEN)
     except KeyboardInterrupt:
         print("Zamykanie bota...")
     except Exception as e:
-        print(f"Błąd uruchamiania bota: {e}")
\ No newline at end of file
+        print(f"Błąd uruchamiania bota: {e}")
+    finally:
+        db.storage.close()
\ No newline at end of file
@@ -1,15 +1,28 @@
 import discord
+from discord import app_commands
 from discord.ext import commands, tasks
 import asyncio
+import gzip
 import json
 import uuid
 import datetime
+import functools
 from enum import Enum
-from typing import Dict, List, Optional, Any, Union
+from typing import Callable, Dict, Iterator, List, Optional, Any, Set, Union
 from dataclasses import dataclass, field
+from collections import Counter, deque
 from datetime import timedelta
+import heapq
+import html
 import io
 import os
+import queue
+import sqlite3
+import string
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
 
 CONFIG = {
     "token": "",
@@ -24,9 +37,32 @@ CONFIG = {
     "auto_close_days": 7,
     "sla_warning_hours": 1,
     "max_tickets_per_user": 5,
-    "panel_channel_name": "pomoc"
+    "panel_channel_name": "pomoc",
+    "ticket_db_file": "tickets.db",
+    "store_batch_size": 500,
+    "panel_refresh_delay": 3,
+    "transcript_format": "txt",
+    "presence_aware_assignment": False,
+    "stats_recent_size": 5,
+    "stats_retention_days": 30,
+    "archive_dir": "ticket_archive",
+    "archive_after_hours": 24,
+    "archive_interval_minutes": 30,
+    "archive_batch_size": 10,
+    "archive_channel_delay": 2,
+    "channel_soft_limit": 450,
+    "recycle_channels": False,
+    "recycle_pool_size": 10,
+    "recycle_purge_limit": 200,
+    "ticket_thread_parents": {},
+    "log_batch_delay": 2,
+    "creation_metrics_size": 500,
+    "ticket_history_page_size": 10
 }
 
+async def run_blocking(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args, **kwargs))
+
 class TicketStatus(str, Enum):
     NEW = "NEW"
     OPEN = "OPEN"
@@ -85,6 +121,16 @@ class Template:
     emoji: str = "🎫"
     sla: SLA = field(default_factory=SLA)
     welcome_message: str = "Dziękujemy za utworzenie ticketu!"
+    thread_parent_id: Optional[int] = None
+
+@dataclass
+class Macro:
+    guild_id: int
+    template_id: str
+    name: str
+    body: str
+    status: Optional[TicketStatus] = None
+    parts: List[tuple] = field(default_factory=list, repr=False)
 
 class Ticket:
     def __init__(
@@ -108,7 +154,12 @@ class Ticket:
         self.status_history: List[StatusChange] = []
         self.current_status = TicketStatus.NEW
         
-        self.messages: List[Message] = []
+        self.store: Optional["TicketStore"] = None
+        self.sla_stages: Set[str] = set()
+        self.first_response_at: Optional[datetime.datetime] = None
+        self.first_responder_id: Optional[int] = None
+        self._pending_messages: List[Message] = []
+        self.message_count = 0
         self.assigned_to: Optional[int] = None
         self.assignments_history: List[Dict] = []
         
@@ -125,6 +176,15 @@ class Ticket:
     def _calculate_sla_deadline(self) -> datetime.datetime:
         return self.created_at + timedelta(hours=self.template.sla.response_time_hours)
     
+    def iter_messages(self) -> Iterator[Message]:
+        if self.store is None:
+            return iter(self._pending_messages)
+        return self.store.iter_messages(self.id)
+    
+    def _persist(self):
+        if self.store:
+            self.store.save_header(self)
+    
     def change_status(self, new_status: TicketStatus, user_id: int, reason: Optional[str] = None):
         change = StatusChange(
             timestamp=datetime.datetime.now(),
@@ -137,8 +197,15 @@ class Ticket:
         self.current_status = new_status
         self.updated_at = datetime.datetime.now()
         
-        if new_status in [TicketStatus.CLOSED, TicketStatus.ARCHIVED]:
+        closed_statuses = [TicketStatus.CLOSED, TicketStatus.ARCHIVED]
+        if new_status not in closed_statuses:
+            self.closed_at = None
+        elif change.from_status not in closed_statuses:
             self.closed_at = datetime.datetime.now()
+        
+        if self.store:
+            self.store.add_status_change(self.id, change)
+        self._persist()
     
     def add_message(self, message_id: int, user_id: int, content: str, attachments: List[str]):
         message = Message(
@@ -148,24 +215,1567 @@ class Ticket:
             content=content,
             attachments=attachments
         )
-        self.messages.append(message)
+        self.message_count += 1
         self.updated_at = message.timestamp
+        
+        if self.store:
+            self.store.add_message(self.id, message)
+            self._persist()
+        else:
+            self._pending_messages.append(message)
+    
+    def assign(self, staff_id: int, assigned_by: int, reason: Optional[str] = None, record: bool = True):
+        self.assigned_to = staff_id
+        
+        if record:
+            assignment = {
+                "timestamp": datetime.datetime.now(),
+                "staff_id": staff_id,
+                "assigned_by": assigned_by,
+                "reason": reason
+            }
+            self.assignments_history.append(assignment)
+            if self.store:
+                self.store.add_assignment(self.id, assignment)
+        self._persist()
+    
+    @classmethod
+    def from_row(cls, row: sqlite3.Row, template: Template) -> "Ticket":
+        ticket = cls.__new__(cls)
+        ticket.id = row["id"]
+        ticket.user_id = row["user_id"]
+        ticket.template = template
+        ticket.title = row["title"]
+        ticket.priority = Priority(row["priority"])
+        ticket.channel_id = row["channel_id"]
+        ticket.panel_message_id = row["panel_message_id"]
+        ticket.status_history = []
+        ticket.current_status = TicketStatus(row["status"])
+        ticket.store = None
+        ticket.sla_stages = set()
+        ticket.first_response_at = datetime.datetime.fromisoformat(row["first_response_at"]) if row["first_response_at"] else None
+        ticket.first_responder_id = row["first_responder_id"]
+        ticket._pending_messages = []
+        ticket.message_count = row["message_count"]
+        ticket.assigned_to = row["assigned_to"]
+        ticket.assignments_history = []
+        ticket.created_at = datetime.datetime.fromisoformat(row["created_at"])
+        ticket.updated_at = datetime.datetime.fromisoformat(row["updated_at"])
+        ticket.closed_at = datetime.datetime.fromisoformat(row["closed_at"]) if row["closed_at"] else None
+        ticket.sla_deadline = datetime.datetime.fromisoformat(row["sla_deadline"])
+        ticket.answers = json.loads(row["answers"])
+        return ticket
+
+class TicketStore:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tickets (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            template_id TEXT NOT NULL,
+            title TEXT NOT NULL,
+            priority TEXT NOT NULL,
+            status TEXT NOT NULL,
+            channel_id INTEGER,
+            panel_message_id INTEGER,
+            assigned_to INTEGER,
+            answers TEXT NOT NULL,
+            message_count INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            closed_at TEXT,
+            sla_deadline TEXT NOT NULL,
+            first_response_at TEXT,
+            first_responder_id INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS tickets_status ON tickets (status);
+        CREATE INDEX IF NOT EXISTS tickets_channel ON tickets (channel_id);
+        CREATE INDEX IF NOT EXISTS tickets_user ON tickets (user_id, created_at);
+        CREATE INDEX IF NOT EXISTS tickets_user_closed ON tickets (user_id, closed_at, id);
+        CREATE TABLE IF NOT EXISTS status_changes (
+            ticket_id TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            from_status TEXT NOT NULL,
+            to_status TEXT NOT NULL,
+            reason TEXT
+        );
+        CREATE INDEX IF NOT EXISTS status_changes_ticket ON status_changes (ticket_id);
+        CREATE TABLE IF NOT EXISTS assignments (
+            ticket_id TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            staff_id INTEGER NOT NULL,
+            assigned_by INTEGER NOT NULL,
+            reason TEXT
+        );
+        CREATE INDEX IF NOT EXISTS assignments_ticket ON assignments (ticket_id);
+        CREATE TABLE IF NOT EXISTS messages (
+            ticket_id TEXT NOT NULL,
+            message_id INTEGER NOT NULL,
+            timestamp TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            attachments TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS messages_ticket ON messages (ticket_id);
+        CREATE TABLE IF NOT EXISTS sla_events (
+            ticket_id TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            sent_at TEXT NOT NULL,
+            PRIMARY KEY (ticket_id, stage)
+        );
+        CREATE TABLE IF NOT EXISTS archives (
+            ticket_id TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            archived_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS panels (
+            guild_id INTEGER PRIMARY KEY,
+            channel_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS macros (
+            guild_id INTEGER NOT NULL,
+            template_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT,
+            created_by INTEGER NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (guild_id, template_id, name)
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+            body, ticket_id UNINDEXED, message_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        );
+    """
+    CLOSED_STATUSES = (TicketStatus.CLOSED.value, TicketStatus.ARCHIVED.value)
+    SEARCH_WINDOW = 50
+    
+    def __init__(self, filename: str, batch_size: int = 500):
+        self.filename = filename
+        self.batch_size = batch_size
+        self._local = threading.local()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._condition = threading.Condition()
+        self._queued = 0
+        self._committed = 0
+        self._last_write: Dict[str, int] = {}
+        self.on_error: Optional[Callable[[str], None]] = None
+        
+        connection = self._connect()
+        connection.executescript(self.SCHEMA)
+        self._migrate(connection)
+        if connection.execute("SELECT NOT EXISTS (SELECT 1 FROM search_index)").fetchone()[0]:
+            self._rebuild_search_index(connection)
+        connection.close()
+        
+        self._writer_thread = threading.Thread(target=self._writer, name="TicketStore-writer", daemon=True)
+        self._writer_thread.start()
+    
+    @staticmethod
+    def _migrate(connection: sqlite3.Connection):
+        columns = {row["name"] for row in connection.execute("PRAGMA table_info(tickets)")}
+        for column, definition in [("first_response_at", "TEXT"), ("first_responder_id", "INTEGER")]:
+            if column not in columns:
+                connection.execute(f"ALTER TABLE tickets ADD COLUMN {column} {definition}")
+    
+    @staticmethod
+    def _ticket_document(title: str, answers: Dict[str, Any]) -> str:
+        return "\n".join([title] + [str(value) for value in answers.values()])
+    
+    def _rebuild_search_index(self, connection: sqlite3.Connection):
+        connection.execute("BEGIN")
+        connection.executemany(
+            "INSERT INTO search_index (body, ticket_id, message_id) VALUES (?, ?, NULL)",
+            ((self._ticket_document(title, json.loads(answers)), ticket_id)
+             for ticket_id, title, answers in connection.execute("SELECT id, title, answers FROM tickets"))
+        )
+        connection.execute(
+            "INSERT INTO search_index (body, ticket_id, message_id) SELECT content, ticket_id, message_id FROM messages WHERE content != ''"
+        )
+        connection.execute("COMMIT")
+    
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.filename, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+    
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+    
+    def _wait(self, key: Optional[str] = None):
+        with self._condition:
+            target = self._queued if key is None else self._last_write.get(key, 0)
+            self._condition.wait_for(lambda: self._committed >= target)
+    
+    def _query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        return self._reader().execute(sql, params).fetchall()
+    
+    def _read(self, sql: str, params: tuple = (), key: Optional[str] = None) -> List[sqlite3.Row]:
+        self._wait(key)
+        return self._query(sql, params)
+    
+    def _write(self, sql: str, params: tuple = (), key: Optional[str] = None):
+        with self._condition:
+            self._queued += 1
+            if key is not None:
+                self._last_write[key] = self._queued
+            self._queue.put((self._queued, key, sql, params))
+    
+    def _report(self, message: str):
+        if self.on_error:
+            self.on_error(message)
+        else:
+            print(message)
+    
+    def _writer(self):
+        connection = self._connect()
+        
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            errors = []
+            committed = self._committed
+            connection.execute("BEGIN")
+            for item in batch:
+                if isinstance(item, tuple):
+                    committed, _, sql, params = item
+                    connection.execute("SAVEPOINT statement")
+                    try:
+                        connection.execute(sql, params)
+                    except sqlite3.Error as e:
+                        connection.execute("ROLLBACK TO statement")
+                        errors.append(f"{e} - {' '.join(sql.split())[:80]}")
+                    connection.execute("RELEASE statement")
+            try:
+                connection.execute("COMMIT")
+            except sqlite3.Error as e:
+                connection.execute("ROLLBACK")
+                errors.append(f"{e} - utracono {sum(isinstance(item, tuple) for item in batch)} zapisów")
+            
+            with self._condition:
+                self._committed = committed
+                for item in batch:
+                    if isinstance(item, tuple) and item[1] is not None and self._last_write.get(item[1]) == item[0]:
+                        del self._last_write[item[1]]
+                self._condition.notify_all()
+            
+            for error in errors:
+                self._report(f"❌ Błąd zapisu ticketów: {error}")
+            
+            for item in batch:
+                if isinstance(item, Future):
+                    item.set_result(True)
+                self._queue.task_done()
+            
+            if any(item is None for item in batch):
+                connection.close()
+                return
+    
+    def flush(self) -> Future:
+        future: Future = Future()
+        self._queue.put(future)
+        return future
+    
+    def close(self):
+        self._queue.put(None)
+        self._writer_thread.join()
+    
+    @staticmethod
+    def _time(value: Optional[datetime.datetime]) -> Optional[str]:
+        return value.isoformat() if value else None
+    
+    def insert_ticket(self, ticket: Ticket):
+        self.save_header(ticket)
+        self._write(
+            "INSERT INTO search_index (body, ticket_id, message_id) VALUES (?, ?, NULL)",
+            (self._ticket_document(ticket.title, ticket.answers), ticket.id),
+            key=ticket.id
+        )
+        for change in ticket.status_history:
+            self.add_status_change(ticket.id, change)
+        for message in ticket._pending_messages:
+            self.add_message(ticket.id, message)
+        for assignment in ticket.assignments_history:
+            self.add_assignment(ticket.id, assignment)
+        
+        ticket._pending_messages = []
+        ticket.store = self
+    
+    def save_header(self, ticket: Ticket):
+        self._write(
+            """
+            INSERT INTO tickets (id, user_id, template_id, title, priority, status, channel_id, panel_message_id,
+                                 assigned_to, answers, message_count, created_at, updated_at, closed_at, sla_deadline,
+                                 first_response_at, first_responder_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                status = excluded.status, priority = excluded.priority, channel_id = excluded.channel_id,
+                panel_message_id = excluded.panel_message_id, assigned_to = excluded.assigned_to,
+                message_count = excluded.message_count, updated_at = excluded.updated_at,
+                closed_at = excluded.closed_at, sla_deadline = excluded.sla_deadline,
+                first_response_at = excluded.first_response_at, first_responder_id = excluded.first_responder_id
+            """,
+            (
+                ticket.id, ticket.user_id, ticket.template.id, ticket.title, ticket.priority.value,
+                ticket.current_status.value, ticket.channel_id, ticket.panel_message_id, ticket.assigned_to,
+                json.dumps(ticket.answers, ensure_ascii=False), ticket.message_count,
+                self._time(ticket.created_at), self._time(ticket.updated_at), self._time(ticket.closed_at),
+                self._time(ticket.sla_deadline), self._time(ticket.first_response_at), ticket.first_responder_id
+            ),
+            key=ticket.id
+        )
+    
+    def add_status_change(self, ticket_id: str, change: StatusChange):
+        self._write(
+            "INSERT INTO status_changes (ticket_id, timestamp, user_id, from_status, to_status, reason) VALUES (?, ?, ?, ?, ?, ?)",
+            (ticket_id, self._time(change.timestamp), change.user_id, change.from_status.value, change.to_status.value, change.reason),
+            key=ticket_id
+        )
+    
+    def add_message(self, ticket_id: str, message: Message):
+        self._write(
+            "INSERT INTO messages (ticket_id, message_id, timestamp, user_id, content, attachments) VALUES (?, ?, ?, ?, ?, ?)",
+            (ticket_id, message.message_id, self._time(message.timestamp), message.user_id, message.content,
+             json.dumps(message.attachments)),
+            key=ticket_id
+        )
+        if message.content:
+            self._write(
+                "INSERT INTO search_index (body, ticket_id, message_id) VALUES (?, ?, ?)",
+                (message.content, ticket_id, message.message_id),
+                key=ticket_id
+            )
+    
+    def add_assignment(self, ticket_id: str, assignment: Dict):
+        self._write(
+            "INSERT INTO assignments (ticket_id, timestamp, staff_id, assigned_by, reason) VALUES (?, ?, ?, ?, ?)",
+            (ticket_id, self._time(assignment["timestamp"]), assignment["staff_id"], assignment["assigned_by"], assignment["reason"]),
+            key=ticket_id
+        )
+    
+    def add_sla_event(self, ticket_id: str, stage: str):
+        self._write(
+            "INSERT OR IGNORE INTO sla_events (ticket_id, stage, sent_at) VALUES (?, ?, ?)",
+            (ticket_id, stage, self._time(datetime.datetime.now())),
+            key=ticket_id
+        )
+    
+    def _hydrate(self, rows: List[sqlite3.Row], templates: Dict[str, Template]) -> List[Ticket]:
+        tickets = {}
+        for row in rows:
+            template = templates.get(row["template_id"])
+            if template is None:
+                print(f"⚠️ Pominięto ticket {row['id']} - nieznany szablon {row['template_id']}")
+                continue
+            tickets[row["id"]] = Ticket.from_row(row, template)
+        
+        if not tickets:
+            return []
+        
+        ids = list(tickets)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for row in self._query(f"SELECT * FROM status_changes WHERE ticket_id IN ({placeholders}) ORDER BY rowid", tuple(chunk)):
+                tickets[row["ticket_id"]].status_history.append(StatusChange(
+                    timestamp=datetime.datetime.fromisoformat(row["timestamp"]),
+                    user_id=row["user_id"],
+                    from_status=TicketStatus(row["from_status"]),
+                    to_status=TicketStatus(row["to_status"]),
+                    reason=row["reason"]
+                ))
+            for row in self._query(f"SELECT * FROM assignments WHERE ticket_id IN ({placeholders}) ORDER BY rowid", tuple(chunk)):
+                tickets[row["ticket_id"]].assignments_history.append({
+                    "timestamp": datetime.datetime.fromisoformat(row["timestamp"]),
+                    "staff_id": row["staff_id"],
+                    "assigned_by": row["assigned_by"],
+                    "reason": row["reason"]
+                })
+            for row in self._query(f"SELECT ticket_id, stage FROM sla_events WHERE ticket_id IN ({placeholders})", tuple(chunk)):
+                tickets[row["ticket_id"]].sla_stages.add(row["stage"])
+        
+        for ticket in tickets.values():
+            ticket.store = self
+        return list(tickets.values())
+    
+    def load_open_tickets(self, templates: Dict[str, Template]) -> List[Ticket]:
+        rows = self._read("SELECT * FROM tickets WHERE status NOT IN (?, ?)", self.CLOSED_STATUSES)
+        return self._hydrate(rows, templates)
+    
+    def load_ticket(self, ticket_id: str, templates: Dict[str, Template]) -> Optional[Ticket]:
+        tickets = self._hydrate(self._read("SELECT * FROM tickets WHERE id = ?", (ticket_id,), key=ticket_id), templates)
+        return tickets[0] if tickets else None
+    
+    def ticket_id_for_channel(self, channel_id: int) -> Optional[str]:
+        rows = self._read("SELECT id FROM tickets WHERE channel_id = ? ORDER BY created_at DESC LIMIT 1", (channel_id,))
+        return rows[0]["id"] if rows else None
+    
+    def iter_messages(self, ticket_id: str, chunk_size: int = 500) -> Iterator[Message]:
+        self._wait(ticket_id)
+        cursor = self._reader().execute("SELECT * FROM messages WHERE ticket_id = ? ORDER BY rowid", (ticket_id,))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            for row in rows:
+                yield Message(
+                    message_id=row["message_id"],
+                    timestamp=datetime.datetime.fromisoformat(row["timestamp"]),
+                    user_id=row["user_id"],
+                    content=row["content"],
+                    attachments=json.loads(row["attachments"])
+                )
+    
+    def closed_tickets_page(self, user_id: int, limit: int,
+                            before: Optional[tuple] = None) -> List[sqlite3.Row]:
+        sql = (
+            "SELECT id, template_id, title, status, closed_at FROM tickets "
+            "WHERE user_id = ? AND status IN (?, ?) AND closed_at IS NOT NULL"
+        )
+        params: List[Any] = [user_id, TicketStatus.CLOSED.value, TicketStatus.ARCHIVED.value]
+        if before:
+            sql += " AND (closed_at, id) < (?, ?)"
+            params.extend(before)
+        sql += " ORDER BY closed_at DESC, id DESC LIMIT ?"
+        params.append(limit)
+        return self._read(sql, tuple(params))
+    
+    def count_by(self, column: str) -> Dict[str, int]:
+        return {row[0]: row[1] for row in self._read(f"SELECT {column}, COUNT(*) FROM tickets GROUP BY {column}")}
+    
+    def archivable_ticket_ids(self, closed_before: datetime.datetime, limit: int) -> List[str]:
+        rows = self._read(
+            "SELECT id FROM tickets WHERE status = ? AND closed_at <= ? ORDER BY closed_at LIMIT ?",
+            (TicketStatus.CLOSED.value, self._time(closed_before), limit)
+        )
+        return [row["id"] for row in rows]
+    
+    def add_archive(self, ticket_id: str, path: str, offset: int, length: int):
+        self._write(
+            "INSERT OR REPLACE INTO archives (ticket_id, path, offset, length, archived_at) VALUES (?, ?, ?, ?, ?)",
+            (ticket_id, path, offset, length, self._time(datetime.datetime.now())),
+            key=ticket_id
+        )
+        self._write("DELETE FROM messages WHERE ticket_id = ?", (ticket_id,), key=ticket_id)
+    
+    def panel_location(self, guild_id: int) -> Optional[sqlite3.Row]:
+        rows = self._read("SELECT channel_id, message_id FROM panels WHERE guild_id = ?", (guild_id,))
+        return rows[0] if rows else None
+    
+    def save_panel_location(self, guild_id: int, channel_id: int, message_id: int):
+        self._write(
+            "INSERT OR REPLACE INTO panels (guild_id, channel_id, message_id) VALUES (?, ?, ?)",
+            (guild_id, channel_id, message_id)
+        )
+    
+    def load_macros(self) -> List[sqlite3.Row]:
+        return self._read("SELECT guild_id, template_id, name, body, status FROM macros")
+    
+    def save_macro(self, macro: Macro, created_by: int):
+        self._write(
+            "INSERT OR REPLACE INTO macros (guild_id, template_id, name, body, status, created_by, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (macro.guild_id, macro.template_id, macro.name, macro.body,
+             macro.status.value if macro.status else None, created_by, self._time(datetime.datetime.now()))
+        )
+    
+    def delete_macro(self, guild_id: int, template_id: str, name: str):
+        self._write("DELETE FROM macros WHERE guild_id = ? AND template_id = ? AND name = ?", (guild_id, template_id, name))
+    
+    def archive_location(self, ticket_id: str) -> Optional[sqlite3.Row]:
+        rows = self._read("SELECT path, offset, length FROM archives WHERE ticket_id = ?", (ticket_id,), key=ticket_id)
+        return rows[0] if rows else None
+    
+    @staticmethod
+    def _match_expression(query: str) -> str:
+        terms = []
+        for term in query.split():
+            prefix = term.endswith("*") and len(term) > 1
+            term = '"' + term.rstrip("*").replace('"', '""') + '"'
+            terms.append(term + "*" if prefix else term)
+        return " ".join(terms)
+    
+    def search(self, query: str, template_id: Optional[str] = None, status: Optional[str] = None,
+               user_id: Optional[int] = None, since: Optional[datetime.datetime] = None,
+               until: Optional[datetime.datetime] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        expression = self._match_expression(query)
+        if not expression:
+            return []
+        
+        filters = ["1"]
+        params: List[Any] = []
+        for clause, value in [
+            ("t.template_id = ?", template_id), ("t.status = ?", status), ("t.user_id = ?", user_id),
+            ("t.created_at >= ?", self._time(since)), ("t.created_at < ?", self._time(until))
+        ]:
+            if value is not None:
+                filters.append(clause)
+                params.append(value)
+        
+        window = limit * self.SEARCH_WINDOW
+        rows = self._read(
+            f"""
+            WITH hits AS MATERIALIZED (
+                SELECT rowid AS doc, ticket_id, rank AS score
+                FROM search_index WHERE search_index MATCH ? ORDER BY rank LIMIT ?
+            )
+            SELECT t.id, t.title, t.status, t.template_id, t.user_id, t.created_at, hits.doc, MIN(hits.score) AS score,
+                   (SELECT COUNT(*) FROM hits) AS candidates
+            FROM hits JOIN tickets t ON t.id = hits.ticket_id
+            WHERE {" AND ".join(filters)}
+            GROUP BY hits.ticket_id ORDER BY score LIMIT ?
+            """,
+            (expression, window, *params, limit)
+        )
+        
+        if len(rows) < limit and (not rows or rows[0]["candidates"] >= window):
+            rows = self._read(
+                f"""
+                SELECT t.id, t.title, t.status, t.template_id, t.user_id, t.created_at, s.rowid AS doc, MIN(s.rank) AS score
+                FROM search_index s JOIN tickets t ON t.id = s.ticket_id
+                WHERE search_index MATCH ? AND {" AND ".join(filters)}
+                GROUP BY s.ticket_id ORDER BY score LIMIT ?
+                """,
+                (expression, *params, limit)
+            )
+        if not rows:
+            return []
+        
+        excerpts = dict(self._read(
+            f"SELECT rowid, snippet(search_index, 0, '**', '**', '…', 12) FROM search_index "
+            f"WHERE search_index MATCH ? AND rowid IN ({','.join('?' * len(rows))})",
+            (expression, *[row["doc"] for row in rows])
+        ))
+        return [dict(row, excerpt=excerpts.get(row["doc"], "")) for row in rows]
+    
+    def recent_headers(self, limit: int) -> List[sqlite3.Row]:
+        return self._read("SELECT id, user_id, template_id, created_at FROM tickets ORDER BY created_at DESC LIMIT ?", (limit,))
+    
+    def duration_histogram(self, end_column: str, owner_column: str, bounds: List[int]) -> List[sqlite3.Row]:
+        hours = f"(julianday({end_column}) - julianday(created_at)) * 24"
+        bucket = "CASE " + " ".join(f"WHEN {hours} < {bound} THEN {i}" for i, bound in enumerate(bounds)) + f" ELSE {len(bounds)} END"
+        return self._read(
+            f"SELECT template_id, {owner_column} AS owner_id, {bucket} AS bucket, COUNT(*) AS count FROM tickets "
+            f"WHERE {end_column} IS NOT NULL GROUP BY template_id, owner_id, bucket"
+        )
+    
+    def daily_counts(self, column: str, since: str) -> Dict[str, int]:
+        rows = self._read(
+            f"SELECT substr({column}, 1, 10) AS day, COUNT(*) FROM tickets WHERE {column} >= ? GROUP BY day", (since,)
+        )
+        return {row[0]: row[1] for row in rows}
 
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 intents.guilds = True
+intents.presences = CONFIG["presence_aware_assignment"]
+
+class TicketBot(commands.Bot):
+    async def close(self):
+        await ticket_system.logs.drain()
+        await super().close()
+
+bot = TicketBot(command_prefix=CONFIG["prefix"], intents=intents, help_command=None)
+
+class TicketIndex:
+    def __init__(self):
+        self.by_channel: Dict[int, str] = {}
+        self.open_tickets: Dict[str, int] = {}
+        self.open_by_user: Dict[int, Set[str]] = {}
+    
+    def rebuild(self, tickets: List[Ticket]):
+        self.by_channel = {ticket.channel_id: ticket.id for ticket in tickets if ticket.channel_id}
+        self.open_tickets = {}
+        self.open_by_user = {}
+        for ticket in tickets:
+            if ticket.current_status not in [TicketStatus.CLOSED, TicketStatus.ARCHIVED]:
+                self.add_open(ticket.id, ticket.user_id)
+    
+    def ticket_for_channel(self, channel_id: int) -> Optional[str]:
+        return self.by_channel.get(channel_id)
+    
+    def add_open(self, ticket_id: str, user_id: int):
+        self.open_tickets[ticket_id] = user_id
+        self.open_by_user.setdefault(user_id, set()).add(ticket_id)
+    
+    def open_count(self, user_id: int) -> int:
+        return len(self.open_by_user.get(user_id, ()))
+    
+    def open_for_user(self, user_id: int) -> Set[str]:
+        return self.open_by_user.get(user_id, set())
+    
+    def set_channel(self, ticket_id: str, channel_id: int):
+        self.by_channel[channel_id] = ticket_id
+    
+    def mark_closed(self, ticket_id: str):
+        user_id = self.open_tickets.pop(ticket_id, None)
+        owned = self.open_by_user.get(user_id)
+        if owned is not None:
+            owned.discard(ticket_id)
+            if not owned:
+                del self.open_by_user[user_id]
+    
+    def remove_channel(self, channel_id: int):
+        self.by_channel.pop(channel_id, None)
+
+class TranscriptWriter:
+    TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+    SPOOL_SIZE = 1024 * 1024
+    HTML_STYLE = (
+        "body{font-family:sans-serif;background:#313338;color:#dbdee1;margin:24px}"
+        "h1,h2{color:#fff}table{border-collapse:collapse}td{padding:2px 12px 2px 0;vertical-align:top}"
+        ".time{color:#949ba4;white-space:nowrap}.author{font-weight:bold;color:#fff}"
+        ".system{color:#f0b232}.content{white-space:pre-wrap}a{color:#00a8fc}"
+    )
+    
+    def __init__(self, bot: commands.Bot, ticket: Ticket):
+        self.bot = bot
+        self.ticket = ticket
+        self._names: Dict[int, str] = {}
+    
+    def _name(self, user_id: int) -> str:
+        name = self._names.get(user_id)
+        if name is None:
+            user = self.bot.get_user(user_id)
+            name = self._names[user_id] = user.name if user else f"User_{user_id}"
+        return name
+    
+    def iter_text(self) -> Iterator[str]:
+        ticket = self.ticket
+        time_format = self.TIME_FORMAT
+        
+        yield f"=== TRANSKRYPT TICKETU ===\n"
+        yield f"ID: {ticket.id}\n"
+        yield f"Tytuł: {ticket.title}\n"
+        yield f"Twórca: {ticket.user_id}\n"
+        yield f"Typ: {ticket.template.name}\n"
+        yield f"Priorytet: {ticket.priority.value}\n"
+        yield f"Status końcowy: {ticket.current_status.value}\n"
+        yield f"Utworzony: {ticket.created_at.strftime(time_format)}\n"
+        yield f"Ostatnia aktywność: {ticket.updated_at.strftime(time_format)}\n"
+        
+        if ticket.assigned_to:
+            yield f"Przypisany do: {ticket.assigned_to}\n"
+        
+        if ticket.answers:
+            yield f"\n=== ODPOWIEDZI ===\n"
+            for key, value in ticket.answers.items():
+                yield f"{key}: {value}\n"
+        
+        yield f"\n=== HISTORIA STATUSÓW ===\n"
+        for change in ticket.status_history:
+            line = f"[{change.timestamp.strftime(time_format)}] {change.from_status} → {change.to_status} przez {self._name(change.user_id)}"
+            if change.reason:
+                line += f" - {change.reason}"
+            yield line + "\n"
+        
+        yield f"\n=== WIADOMOŚCI ({ticket.message_count}) ===\n"
+        for msg in ticket.iter_messages():
+            if msg.message_id == 0:
+                yield f"[{msg.timestamp.strftime(time_format)}] SYSTEM: Ticket utworzony z wiadomością: {msg.content}\n"
+                continue
+            
+            yield f"[{msg.timestamp.strftime(time_format)}] {self._name(msg.user_id)}: {msg.content}\n"
+            if msg.attachments:
+                yield f"  Załączniki: {', '.join(msg.attachments)}\n"
+        
+        yield f"\n=== PRZYPISANIA ({len(ticket.assignments_history)}) ===\n"
+        for assignment in ticket.assignments_history:
+            line = (f"[{assignment['timestamp'].strftime(time_format)}] Przypisany do {self._name(assignment['staff_id'])} "
+                    f"przez {self._name(assignment['assigned_by'])}")
+            if assignment['reason']:
+                line += f" - {assignment['reason']}"
+            yield line + "\n"
+        
+        yield f"\n=== KONIEC TRANSKRYPTU ===\n"
+    
+    def iter_html(self) -> Iterator[str]:
+        ticket = self.ticket
+        time_format = self.TIME_FORMAT
+        e = html.escape
+        
+        yield (f"<!DOCTYPE html><html lang=\"pl\"><head><meta charset=\"utf-8\">"
+               f"<title>Transkrypt {e(ticket.id)}</title><style>{self.HTML_STYLE}</style></head><body>\n")
+        yield f"<h1>🎫 {e(ticket.id)} - {e(ticket.title)}</h1>\n<table>\n"
+        
+        header = [
+            ("Twórca", self._name(ticket.user_id)),
+            ("Typ", ticket.template.name),
+            ("Priorytet", ticket.priority.value),
+            ("Status końcowy", ticket.current_status.value),
+            ("Utworzony", ticket.created_at.strftime(time_format)),
+            ("Ostatnia aktywność", ticket.updated_at.strftime(time_format))
+        ]
+        if ticket.assigned_to:
+            header.append(("Przypisany do", self._name(ticket.assigned_to)))
+        header.extend((str(key), str(value)) for key, value in ticket.answers.items())
+        for label, value in header:
+            yield f"<tr><td>{e(label)}</td><td class=\"content\">{e(value)}</td></tr>\n"
+        
+        yield "</table>\n<h2>Historia statusów</h2>\n<table>\n"
+        for change in ticket.status_history:
+            reason = f" - {e(change.reason)}" if change.reason else ""
+            yield (f"<tr><td class=\"time\">{change.timestamp.strftime(time_format)}</td>"
+                   f"<td>{e(change.from_status.value)} → {e(change.to_status.value)} przez {e(self._name(change.user_id))}{reason}</td></tr>\n")
+        
+        yield f"</table>\n<h2>Wiadomości ({ticket.message_count})</h2>\n<table>\n"
+        for msg in ticket.iter_messages():
+            if msg.message_id == 0:
+                author = "<span class=\"system\">SYSTEM</span>"
+            else:
+                author = f"<span class=\"author\">{e(self._name(msg.user_id))}</span>"
+            links = "".join(
+                f"<br>📎 <a href=\"{e(url)}\">{e(url.rsplit('/', 1)[-1].split('?', 1)[0])}</a>" for url in msg.attachments
+            )
+            yield (f"<tr><td class=\"time\">{msg.timestamp.strftime(time_format)}</td><td>{author}</td>"
+                   f"<td class=\"content\">{e(msg.content)}{links}</td></tr>\n")
+        
+        yield f"</table>\n<h2>Przypisania ({len(ticket.assignments_history)})</h2>\n<table>\n"
+        for assignment in ticket.assignments_history:
+            reason = f" - {e(assignment['reason'])}" if assignment['reason'] else ""
+            yield (f"<tr><td class=\"time\">{assignment['timestamp'].strftime(time_format)}</td>"
+                   f"<td>{e(self._name(assignment['staff_id']))} przez {e(self._name(assignment['assigned_by']))}{reason}</td></tr>\n")
+        
+        yield "</table>\n</body></html>\n"
+    
+    def write(self, fmt: str = "txt") -> tempfile.SpooledTemporaryFile:
+        chunks = self.iter_html() if fmt == "html" else self.iter_text()
+        buffer = tempfile.SpooledTemporaryFile(max_size=self.SPOOL_SIZE)
+        for chunk in chunks:
+            buffer.write(chunk.encode('utf-8'))
+        buffer.seek(0)
+        return buffer
 
-bot = commands.Bot(command_prefix=CONFIG["prefix"], intents=intents, help_command=None)
+class PanelRenderer:
+    def __init__(self, system: "TicketSystem", delay: float):
+        self.system = system
+        self.delay = delay
+        self.messages: Dict[str, Union[discord.Message, discord.PartialMessage]] = {}
+        self.views: Dict[str, discord.ui.View] = {}
+        self.hashes: Dict[str, int] = {}
+        self.pending: Dict[str, asyncio.Task] = {}
+    
+    def build_embed(self, ticket: Ticket, initial: bool = False) -> discord.Embed:
+        bot = self.system.bot
+        embed = discord.Embed(
+            title=f"🎫 PANEL TICKETU - {ticket.id}",
+            description=f"**Status:** `{ticket.current_status.value}`\n**Priorytet:** `{ticket.priority.value.upper()}`",
+            color=ticket.template.color,
+            timestamp=ticket.created_at if initial else ticket.updated_at
+        )
+        
+        user = bot.get_user(ticket.user_id)
+        embed.add_field(name="👤 Twórca", value=user.mention if user else f"<@{ticket.user_id}>", inline=True)
+        
+        if ticket.assigned_to:
+            staff = bot.get_user(ticket.assigned_to)
+            embed.add_field(name="🛠️ Przypisany do", value=staff.mention if staff else f"<@{ticket.assigned_to}>", inline=True)
+        else:
+            embed.add_field(name="🛠️ Przypisany do", value="❌ Nieprzypisany", inline=True)
+        
+        embed.add_field(name="📅 Utworzony", value=f"<t:{int(ticket.created_at.timestamp())}:R>", inline=True)
+        embed.add_field(name="⏰ Termin SLA", value=f"<t:{int(ticket.sla_deadline.timestamp())}:R>", inline=True)
+        
+        if ticket.answers:
+            answers_text = "\n".join([f"• **{k}:** {v[:100]}{'...' if len(str(v)) > 100 else ''}" for k, v in ticket.answers.items()])
+            embed.add_field(name="📝 Informacje", value=answers_text[:500], inline=False)
+        
+        embed.add_field(
+            name="⚡ Akcje",
+            value="• **👥 Przypisz** - Przypisz ticket\n"
+                  "• **📋 Status** - Zmień status\n"
+                  "• **📄 Transkrypt** - Pobierz transkrypt\n"
+                  "• **🔒 Zamknij** - Zamknij ticket\n"
+                  "• **ℹ️ Info** - Informacje o tickecie",
+            inline=False
+        )
+        
+        if initial:
+            embed.set_footer(text=f"Typ: {ticket.template.name}")
+        else:
+            embed.set_footer(text=f"Typ: {ticket.template.name} | Ostatnia aktualizacja")
+        return embed
+    
+    @staticmethod
+    def _digest(embed: discord.Embed) -> int:
+        data = embed.to_dict()
+        data.pop("timestamp", None)
+        return hash(json.dumps(data, sort_keys=True, ensure_ascii=False))
+    
+    def remember(self, ticket: Ticket, message: Union[discord.Message, discord.PartialMessage],
+                 embed: discord.Embed, view: discord.ui.View):
+        self.messages[ticket.id] = message
+        self.views[ticket.id] = view
+        self.hashes[ticket.id] = self._digest(embed)
+    
+    def forget(self, ticket_id: str):
+        task = self.pending.pop(ticket_id, None)
+        if task and task is not asyncio.current_task():
+            task.cancel()
+        self.messages.pop(ticket_id, None)
+        self.views.pop(ticket_id, None)
+        self.hashes.pop(ticket_id, None)
+    
+    def schedule(self, ticket: Ticket):
+        if ticket.id not in self.pending:
+            self.pending[ticket.id] = asyncio.create_task(self._refresh_later(ticket))
+    
+    async def _refresh_later(self, ticket: Ticket):
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            if self.pending.get(ticket.id) is asyncio.current_task():
+                del self.pending[ticket.id]
+        await self.refresh(ticket)
+    
+    async def refresh(self, ticket: Ticket):
+        task = self.pending.pop(ticket.id, None)
+        if task and task is not asyncio.current_task():
+            task.cancel()
+        
+        channel = self.system.bot.get_channel(ticket.channel_id)
+        if not channel or not ticket.panel_message_id:
+            return
+        
+        embed = self.build_embed(ticket)
+        digest = self._digest(embed)
+        if self.hashes.get(ticket.id) == digest:
+            return
+        
+        message = self.messages.get(ticket.id)
+        if message is None or message.id != ticket.panel_message_id:
+            message = channel.get_partial_message(ticket.panel_message_id)
+        view = self.views.get(ticket.id)
+        if view is None:
+            view = TicketPanelView(ticket)
+        
+        try:
+            message = await message.edit(embed=embed, view=view)
+            self.remember(ticket, message, embed, view)
+        except discord.NotFound:
+            self.forget(ticket.id)
+            await self.system.send_ticket_panel(channel, ticket)
+        except Exception as e:
+            print(f"Błąd aktualizacji panelu: {e}")
+
+class AssignmentScheduler:
+    PRIORITY_WEIGHTS = {Priority.LOW: 1, Priority.MEDIUM: 2, Priority.HIGH: 3, Priority.CRITICAL: 5}
+    STATUS_RANKS = {discord.Status.online: 0, discord.Status.idle: 1, discord.Status.dnd: 2}
+    
+    def __init__(self, templates: Dict[str, Template]):
+        self.templates = templates
+        self.load: Dict[int, int] = {}
+        self.status: Dict[int, int] = {}
+        self.assignments: Dict[str, tuple] = {}
+        self.pools: Dict[tuple, Set[int]] = {}
+        self.heaps: Dict[tuple, List[tuple]] = {}
+        self.member_pools: Dict[int, Set[tuple]] = {}
+    
+    def _rank(self, member: discord.Member) -> int:
+        return self.STATUS_RANKS.get(member.status, 3)
+    
+    def _key(self, staff_id: int) -> tuple:
+        return (self.status.get(staff_id, 3), self.load.get(staff_id, 0), staff_id)
+    
+    def _push(self, staff_id: int):
+        entry = self._key(staff_id)
+        for pool_key in self.member_pools.get(staff_id, ()):
+            heapq.heappush(self.heaps[pool_key], entry)
+    
+    def _build(self, guild: discord.Guild, template: Template) -> tuple:
+        pool_key = (guild.id, template.id)
+        if pool_key in self.pools:
+            return pool_key
+        
+        members = {}
+        for role_id in template.support_roles:
+            role = guild.get_role(role_id)
+            if role:
+                members.update((member.id, member) for member in role.members if not member.bot)
+        
+        self.pools[pool_key] = set(members)
+        for member in members.values():
+            self.status[member.id] = self._rank(member)
+            self.member_pools.setdefault(member.id, set()).add(pool_key)
+        self.heaps[pool_key] = [self._key(staff_id) for staff_id in members]
+        heapq.heapify(self.heaps[pool_key])
+        return pool_key
+    
+    def pick(self, guild: discord.Guild, template: Template) -> Optional[int]:
+        pool_key = self._build(guild, template)
+        heap = self.heaps[pool_key]
+        pool = self.pools[pool_key]
+        
+        while heap:
+            entry = heap[0]
+            if entry[2] in pool and entry == self._key(entry[2]):
+                return entry[2]
+            heapq.heappop(heap)
+        return None
+    
+    def assign(self, ticket: Ticket, staff_id: int):
+        self.release(ticket)
+        weight = self.PRIORITY_WEIGHTS.get(ticket.priority, 1)
+        self.assignments[ticket.id] = (staff_id, weight)
+        self.load[staff_id] = self.load.get(staff_id, 0) + weight
+        self._push(staff_id)
+    
+    def release(self, ticket: Ticket):
+        assignment = self.assignments.pop(ticket.id, None)
+        if assignment:
+            staff_id, weight = assignment
+            self.load[staff_id] -= weight
+            self._push(staff_id)
+    
+    def update_member(self, member: discord.Member):
+        role_ids = {role.id for role in member.roles}
+        for pool_key, pool in self.pools.items():
+            guild_id, template_id = pool_key
+            template = self.templates.get(template_id)
+            if guild_id != member.guild.id or template is None:
+                continue
+            
+            if not member.bot and role_ids.intersection(template.support_roles):
+                if member.id not in pool:
+                    pool.add(member.id)
+                    self.member_pools.setdefault(member.id, set()).add(pool_key)
+                    self.status[member.id] = self._rank(member)
+                    heapq.heappush(self.heaps[pool_key], self._key(member.id))
+            elif member.id in pool:
+                pool.discard(member.id)
+                self.member_pools.get(member.id, set()).discard(pool_key)
+    
+    def remove_member(self, member: discord.Member):
+        pool_keys = self.member_pools.get(member.id, set())
+        for pool_key in [pool_key for pool_key in pool_keys if pool_key[0] == member.guild.id]:
+            pool = self.pools[pool_key]
+            pool.discard(member.id)
+            pool_keys.discard(pool_key)
+            self.heaps[pool_key] = list({entry for entry in self.heaps[pool_key] if entry[2] in pool and entry == self._key(entry[2])})
+            heapq.heapify(self.heaps[pool_key])
+        
+        if not pool_keys:
+            self.member_pools.pop(member.id, None)
+            self.status.pop(member.id, None)
+    
+    def update_presence(self, member: discord.Member):
+        rank = self._rank(member)
+        if member.id in self.member_pools and self.status.get(member.id) != rank:
+            self.status[member.id] = rank
+            self._push(member.id)
+
+class DeadlineScheduler:
+    SLA_STAGES = [("warning", 0.8), ("breach", 1.0), ("escalation", 1.5)]
+    AUTO_CLOSE = "auto_close"
+    
+    def __init__(self, system: "TicketSystem"):
+        self.system = system
+        self.heap: List[tuple] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+    
+    def due_at(self, ticket: Ticket, stage: str) -> datetime.datetime:
+        if stage == self.AUTO_CLOSE:
+            return ticket.updated_at + timedelta(days=CONFIG["auto_close_days"])
+        fraction = dict(self.SLA_STAGES)[stage]
+        return ticket.created_at + (ticket.sla_deadline - ticket.created_at) * fraction
+    
+    def _push(self, due: datetime.datetime, ticket_id: str, stage: str):
+        heapq.heappush(self.heap, (due, ticket_id, stage))
+        if self._wake and self.heap[0][2] == stage and self.heap[0][1] == ticket_id:
+            self._wake.set()
+    
+    def schedule(self, ticket: Ticket):
+        if ticket.current_status in [TicketStatus.CLOSED, TicketStatus.ARCHIVED]:
+            return
+        for stage, _ in self.SLA_STAGES:
+            if stage not in ticket.sla_stages:
+                self._push(self.due_at(ticket, stage), ticket.id, stage)
+        if ticket.current_status == TicketStatus.RESOLVED:
+            self._push(self.due_at(ticket, self.AUTO_CLOSE), ticket.id, self.AUTO_CLOSE)
+    
+    async def _run(self):
+        await self.system.bot.wait_until_ready()
+        
+        while True:
+            self._wake.clear()
+            if not self.heap:
+                await self._wake.wait()
+                continue
+            
+            delay = (self.heap[0][0] - datetime.datetime.now()).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            due, ticket_id, stage = heapq.heappop(self.heap)
+            try:
+                await self._fire(due, ticket_id, stage)
+            except Exception as e:
+                print(f"Błąd harmonogramu SLA: {e}")
+    
+    async def _fire(self, due: datetime.datetime, ticket_id: str, stage: str):
+        ticket = self.system.tickets.get(ticket_id)
+        if not ticket or ticket.current_status in [TicketStatus.CLOSED, TicketStatus.ARCHIVED]:
+            return
+        
+        if stage == self.AUTO_CLOSE:
+            if ticket.current_status != TicketStatus.RESOLVED:
+                return
+            current_due = self.due_at(ticket, stage)
+            if current_due > datetime.datetime.now():
+                if current_due != due:
+                    self._push(current_due, ticket_id, stage)
+                return
+            await self.system.close_ticket(ticket.id, self.system.bot.user.id, "Automatycznie zamknięty po okresie rozwiązywania")
+            return
+        
+        if stage in ticket.sla_stages:
+            return
+        current_due = self.due_at(ticket, stage)
+        if current_due > datetime.datetime.now():
+            if current_due != due:
+                self._push(current_due, ticket_id, stage)
+            return
+        
+        ticket.sla_stages.add(stage)
+        if ticket.store:
+            ticket.store.add_sla_event(ticket.id, stage)
+        await self._notify(ticket, stage)
+    
+    async def _notify(self, ticket: Ticket, stage: str):
+        channel = self.system.bot.get_channel(ticket.channel_id)
+        if not channel:
+            return
+        
+        deadline = f"<t:{int(ticket.sla_deadline.timestamp())}:R>"
+        support_mentions = " ".join([f"<@&{role_id}>" for role_id in ticket.template.support_roles])
+        
+        if stage == "warning":
+            embed = discord.Embed(
+                title="⏳ ZBLIŻA SIĘ TERMIN SLA",
+                description=f"Ticket {ticket.id} wykorzystał 80% czasu odpowiedzi SLA.",
+                color=0xf39c12
+            )
+            embed.add_field(name="Termin SLA", value=deadline, inline=True)
+            await channel.send(embed=embed)
+        elif stage == "breach":
+            embed = discord.Embed(
+                title="⚠️ OSTRZEŻENIE SLA",
+                description=f"Ticket {ticket.id} przekroczył czas odpowiedzi SLA!",
+                color=0xe74c3c
+            )
+            embed.add_field(name="Termin SLA", value=deadline, inline=True)
+            embed.add_field(name="Bieżący czas", value=f"<t:{int(datetime.datetime.now().timestamp())}:R>", inline=True)
+            await channel.send(f"{support_mentions}\n**UWAGA: PRZEKROCZENIE SLA!**", embed=embed)
+        else:
+            embed = discord.Embed(
+                title="🚨 ESKALACJA SLA",
+                description=f"Ticket {ticket.id} przekroczył 150% czasu odpowiedzi SLA i wymaga interwencji administracji!",
+                color=0x992d22
+            )
+            embed.add_field(name="Termin SLA", value=deadline, inline=True)
+            if ticket.assigned_to:
+                embed.add_field(name="🛠️ Przypisany do", value=f"<@{ticket.assigned_to}>", inline=True)
+            admin_mentions = " ".join([f"<@&{role_id}>" for role_id in CONFIG["admin_role_ids"]])
+            await channel.send(f"{admin_mentions} {support_mentions}\n**ESKALACJA SLA!**", embed=embed)
+            await self.system.send_log(f"🚨 Eskalacja SLA ticketu `{ticket.id}`")
+
+class TicketAnalytics:
+    BUCKET_HOURS = [1, 4, 12, 24, 72]
+    BUCKET_LABELS = ["<1h", "<4h", "<12h", "<24h", "<72h", "72h+"]
+    CLOSED_STATUSES = [TicketStatus.CLOSED, TicketStatus.ARCHIVED]
+    
+    def __init__(self, recent_size: int, retention_days: int):
+        self.retention_days = retention_days
+        self.status_counts: Counter = Counter()
+        self.template_counts: Counter = Counter()
+        self.first_response: Dict[str, Dict[Any, List[int]]] = {"template": {}, "staff": {}}
+        self.resolution: Dict[str, Dict[Any, List[int]]] = {"template": {}, "staff": {}}
+        self.daily: Dict[datetime.date, Counter] = {}
+        self.recent: deque = deque(maxlen=recent_size)
+    
+    def load(self, store: TicketStore):
+        self.status_counts = Counter(store.count_by("status"))
+        self.template_counts = Counter(store.count_by("template_id"))
+        
+        for histograms, end_column, owner_column in [
+            (self.first_response, "first_response_at", "first_responder_id"),
+            (self.resolution, "closed_at", "assigned_to")
+        ]:
+            for row in store.duration_histogram(end_column, owner_column, self.BUCKET_HOURS):
+                self._histogram(histograms["template"], row["template_id"])[row["bucket"]] += row["count"]
+                if row["owner_id"]:
+                    self._histogram(histograms["staff"], row["owner_id"])[row["bucket"]] += row["count"]
+        
+        since = (datetime.date.today() - timedelta(days=self.retention_days - 1)).isoformat()
+        for metric, column in [("created", "created_at"), ("closed", "closed_at"), ("responded", "first_response_at")]:
+            for day, count in store.daily_counts(column, since).items():
+                self._day(datetime.date.fromisoformat(day))[metric] += count
+        
+        for row in reversed(store.recent_headers(self.recent.maxlen)):
+            self.recent.appendleft((row["id"], row["user_id"], row["template_id"], datetime.datetime.fromisoformat(row["created_at"])))
+    
+    def _histogram(self, histograms: Dict[Any, List[int]], key: Any) -> List[int]:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = [0] * len(self.BUCKET_LABELS)
+        return histogram
+    
+    def _bucket(self, start: datetime.datetime, end: datetime.datetime) -> int:
+        hours = (end - start).total_seconds() / 3600
+        for i, bound in enumerate(self.BUCKET_HOURS):
+            if hours < bound:
+                return i
+        return len(self.BUCKET_HOURS)
+    
+    def _day(self, day: datetime.date) -> Counter:
+        bucket = self.daily.get(day)
+        if bucket is None:
+            bucket = self.daily[day] = Counter()
+            cutoff = day - timedelta(days=self.retention_days)
+            for old_day in [d for d in self.daily if d <= cutoff]:
+                del self.daily[old_day]
+        return bucket
+    
+    def ticket_created(self, ticket: Ticket):
+        self.status_counts[ticket.current_status.value] += 1
+        self.template_counts[ticket.template.id] += 1
+        self._day(ticket.created_at.date())["created"] += 1
+        self.recent.appendleft((ticket.id, ticket.user_id, ticket.template.id, ticket.created_at))
+    
+    def status_changed(self, ticket: Ticket, old_status: TicketStatus, old_closed_at: Optional[datetime.datetime] = None):
+        new_status = ticket.current_status
+        if old_status == new_status:
+            return
+        
+        self.status_counts[old_status.value] -= 1
+        self.status_counts[new_status.value] += 1
+        
+        if new_status in self.CLOSED_STATUSES and old_status not in self.CLOSED_STATUSES and ticket.closed_at:
+            self._resolved(ticket, ticket.closed_at, 1)
+        elif old_status in self.CLOSED_STATUSES and new_status not in self.CLOSED_STATUSES and old_closed_at:
+            self._resolved(ticket, old_closed_at, -1)
+    
+    def _resolved(self, ticket: Ticket, closed_at: datetime.datetime, delta: int):
+        bucket = self._bucket(ticket.created_at, closed_at)
+        self._histogram(self.resolution["template"], ticket.template.id)[bucket] += delta
+        if ticket.assigned_to:
+            self._histogram(self.resolution["staff"], ticket.assigned_to)[bucket] += delta
+        if delta > 0:
+            self._day(closed_at.date())["closed"] += delta
+        elif closed_at.date() in self.daily:
+            self.daily[closed_at.date()]["closed"] += delta
+    
+    def first_responded(self, ticket: Ticket):
+        bucket = self._bucket(ticket.created_at, ticket.first_response_at)
+        self._histogram(self.first_response["template"], ticket.template.id)[bucket] += 1
+        self._histogram(self.first_response["staff"], ticket.first_responder_id)[bucket] += 1
+        self._day(ticket.first_response_at.date())["responded"] += 1
+    
+    def range_totals(self, days: int) -> Counter:
+        totals = Counter()
+        today = datetime.date.today()
+        for offset in range(days):
+            totals.update(self.daily.get(today - timedelta(days=offset), {}))
+        return totals
+    
+    def format_histogram(self, histogram: List[int]) -> str:
+        return " | ".join(f"{label} {count}" for label, count in zip(self.BUCKET_LABELS, histogram) if count) or "brak"
+
+class TicketArchiver:
+    RECYCLED_PREFIX = "wolny-"
+    
+    def __init__(self, system: "TicketSystem", directory: str):
+        self.system = system
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._taken: Set[int] = set()
+        os.makedirs(directory, exist_ok=True)
+    
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def _run(self):
+        await self.system.bot.wait_until_ready()
+        
+        while True:
+            try:
+                archived = await self.run_once()
+                if archived:
+                    await self.system.send_log(f"📦 Zarchiwizowano {archived} ticketów")
+            except Exception as e:
+                print(f"Błąd archiwizacji ticketów: {e}")
+            await asyncio.sleep(CONFIG["archive_interval_minutes"] * 60)
+    
+    def _near_channel_limit(self) -> bool:
+        return any(len(guild.channels) >= CONFIG["channel_soft_limit"] for guild in self.system.bot.guilds)
+    
+    async def run_once(self) -> int:
+        cutoff = datetime.datetime.now()
+        if not self._near_channel_limit():
+            cutoff -= timedelta(hours=CONFIG["archive_after_hours"])
+        
+        archived = 0
+        ticket_ids = await run_blocking(self.system.store.archivable_ticket_ids, cutoff, CONFIG["archive_batch_size"])
+        for ticket_id in ticket_ids:
+            ticket = await self.system.fetch_ticket(ticket_id)
+            if ticket and await self.archive(ticket):
+                archived += 1
+        return archived
+    
+    def _append(self, ticket: Ticket) -> tuple:
+        path = os.path.join(self.directory, f"{(ticket.closed_at or ticket.updated_at).strftime('%Y-%m')}.gz")
+        writer = TranscriptWriter(self.system.bot, ticket)
+        
+        with self._lock, open(path, "ab") as file:
+            offset = file.tell()
+            with gzip.GzipFile(filename=f"{ticket.id}.txt", mode="wb", fileobj=file) as archive:
+                for chunk in writer.iter_text():
+                    archive.write(chunk.encode('utf-8'))
+            file.flush()
+            os.fsync(file.fileno())
+            return path, offset, file.tell() - offset
+    
+    async def archive(self, ticket: Ticket) -> bool:
+        path, offset, length = await run_blocking(self._append, ticket)
+        if ticket.current_status != TicketStatus.CLOSED:
+            return False
+        
+        self.system.store.add_archive(ticket.id, path, offset, length)
+        self.system.change_status(ticket, TicketStatus.ARCHIVED, self.system.bot.user.id, "Automatyczna archiwizacja")
+        self.system._evict(ticket)
+        
+        channel = self.system.bot.get_channel(ticket.channel_id) if ticket.channel_id else None
+        if channel is None and ticket.channel_id and ticket.template.thread_parent_id:
+            try:
+                channel = await self.system.bot.fetch_channel(ticket.channel_id)
+            except discord.HTTPException:
+                channel = None
+        
+        if channel:
+            try:
+                recyclable = CONFIG["recycle_channels"] and isinstance(channel, discord.TextChannel)
+                if not (recyclable and await self._recycle(channel, ticket)):
+                    await channel.delete(reason=f"Archiwizacja ticketu {ticket.id}")
+            except discord.NotFound:
+                pass
+            except Exception as e:
+                await self.system.send_log(f"❌ Błąd archiwizacji kanału ticketu {ticket.id}: {e}")
+            await asyncio.sleep(CONFIG["archive_channel_delay"])
+        return True
+    
+    def read(self, ticket_id: str) -> Optional[bytes]:
+        location = self.system.store.archive_location(ticket_id)
+        if location is None:
+            return None
+        with open(location["path"], "rb") as file:
+            file.seek(location["offset"])
+            return gzip.decompress(file.read(location["length"]))
+    
+    def _recycled_channels(self, category: discord.CategoryChannel) -> List[discord.TextChannel]:
+        return [channel for channel in category.text_channels if channel.name.startswith(self.RECYCLED_PREFIX)]
+    
+    async def _recycle(self, channel: discord.TextChannel, ticket: Ticket) -> bool:
+        category = channel.guild.get_channel(CONFIG["ticket_category_id"])
+        if not category or len(self._recycled_channels(category)) >= CONFIG["recycle_pool_size"]:
+            return False
+        if ticket.message_count >= CONFIG["recycle_purge_limit"]:
+            return False
+        
+        await channel.purge(limit=CONFIG["recycle_purge_limit"])
+        if [message async for message in channel.history(limit=1)]:
+            return False
+        await channel.edit(
+            name=f"{self.RECYCLED_PREFIX}{channel.id % 10000:04d}",
+            topic=None,
+            category=category,
+            overwrites={
+                channel.guild.default_role: discord.PermissionOverwrite(read_messages=False),
+                channel.guild.me: discord.PermissionOverwrite(read_messages=True, manage_channels=True, manage_messages=True)
+            }
+        )
+        self._taken.discard(channel.id)
+        return True
+    
+    def take_recycled(self, category: discord.CategoryChannel) -> Optional[discord.TextChannel]:
+        for channel in self._recycled_channels(category):
+            if channel.id not in self._taken:
+                self._taken.add(channel.id)
+                return channel
+        return None
+    
+    def return_recycled(self, channel: discord.TextChannel):
+        self._taken.discard(channel.id)
+
+class LogQueue:
+    MAX_LENGTH = 2000
+    
+    def __init__(self, system: "TicketSystem", delay: float):
+        self.system = system
+        self.delay = delay
+        self.pending: List[str] = []
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+    
+    def put(self, message: str):
+        if not CONFIG["log_channel_id"]:
+            return
+        self.pending.append(message[:self.MAX_LENGTH])
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._flush_later())
+    
+    async def _flush_later(self):
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=self.delay)
+        except asyncio.TimeoutError:
+            pass
+        
+        log_channel = self.system.bot.get_channel(CONFIG["log_channel_id"])
+        while self.pending:
+            lines, self.pending = self.pending, []
+            if not log_channel:
+                return
+            
+            chunk = ""
+            for line in lines:
+                if chunk and len(chunk) + len(line) + 1 > self.MAX_LENGTH:
+                    await self._send(log_channel, chunk)
+                    chunk = ""
+                chunk = f"{chunk}\n{line}" if chunk else line
+            if chunk:
+                await self._send(log_channel, chunk)
+    
+    async def drain(self):
+        if self._task and not self._task.done():
+            self._wake.set()
+            await self._task
+    
+    async def _send(self, log_channel: discord.abc.Messageable, content: str):
+        try:
+            await log_channel.send(content)
+        except:
+            pass
+
+class MacroTrie:
+    class Node:
+        __slots__ = ("children", "count")
+        
+        def __init__(self):
+            self.children: Dict[str, "MacroTrie.Node"] = {}
+            self.count = 0
+    
+    def __init__(self):
+        self.root = self.Node()
+    
+    def insert(self, name: str):
+        node = self.root
+        for char in name:
+            node = node.children.setdefault(char, self.Node())
+        node.count += 1
+    
+    def remove(self, name: str):
+        path = [(None, self.root)]
+        for char in name:
+            node = path[-1][1].children.get(char)
+            if node is None:
+                return
+            path.append((char, node))
+        
+        path[-1][1].count = max(0, path[-1][1].count - 1)
+        for i in range(len(path) - 1, 0, -1):
+            char, node = path[i]
+            if node.count or node.children:
+                break
+            del path[i - 1][1].children[char]
+    
+    def complete(self, prefix: str, limit: int) -> List[str]:
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        
+        results = []
+        stack = [(prefix, node)]
+        while stack and len(results) < limit:
+            name, node = stack.pop()
+            if node.count:
+                results.append(name)
+            stack.extend((name + char, child) for char, child in sorted(node.children.items(), reverse=True))
+        return results
+
+class MacroEngine:
+    GLOBAL = "*"
+    MAX_LENGTH = 2000
+    CLOSED_STATUSES = [TicketStatus.CLOSED, TicketStatus.ARCHIVED]
+    PLACEHOLDERS = {"ticket_id", "user", "user_id", "staff", "title", "template", "priority", "status", "sla", "channel"}
+    
+    def __init__(self, store: "TicketStore"):
+        self.store = store
+        self.macros: Dict[tuple, Macro] = {}
+        self.tries: Dict[int, Dict[str, MacroTrie]] = {}
+    
+    def load(self):
+        for row in self.store.load_macros():
+            status = TicketStatus(row["status"]) if row["status"] else None
+            self._add(self.compile(row["guild_id"], row["template_id"], row["name"], row["body"], status))
+    
+    @classmethod
+    def compile(cls, guild_id: int, template_id: str, name: str, body: str,
+                status: Optional[TicketStatus] = None) -> Macro:
+        parts = []
+        position = 0
+        for match in string.Template.pattern.finditer(body):
+            literal = body[position:match.start()]
+            key = match.group("named") or match.group("braced")
+            if match.group("escaped") is not None:
+                literal += "$"
+            elif key is None:
+                raise ValueError("Nieprawidłowy placeholder! Użyj `$nazwa` lub `${nazwa}`, a `$$` dla znaku $.")
+            elif key not in cls.PLACEHOLDERS and not key.startswith("answer_"):
+                raise ValueError(f"Nieznany placeholder `${key}`!")
+            parts.append((literal, key))
+            position = match.end()
+        parts.append((body[position:], None))
+        
+        return Macro(guild_id=guild_id, template_id=template_id, name=name, body=body, status=status, parts=parts)
+    
+    def _add(self, macro: Macro):
+        key = (macro.guild_id, macro.template_id, macro.name)
+        if key not in self.macros:
+            self.tries.setdefault(macro.guild_id, {}).setdefault(macro.template_id, MacroTrie()).insert(macro.name)
+        self.macros[key] = macro
+    
+    def save(self, guild_id: int, template_id: str, name: str, body: str,
+             status: Optional[TicketStatus], created_by: int) -> Macro:
+        if status in self.CLOSED_STATUSES:
+            raise ValueError("Makro nie może zamykać ticketu!")
+        
+        macro = self.compile(guild_id, template_id, name.lower(), body, status)
+        self._add(macro)
+        self.store.save_macro(macro, created_by)
+        return macro
+    
+    def delete(self, guild_id: int, template_id: str, name: str) -> bool:
+        if self.macros.pop((guild_id, template_id, name), None) is None:
+            return False
+        
+        self.tries[guild_id][template_id].remove(name)
+        self.store.delete_macro(guild_id, template_id, name)
+        return True
+    
+    def get(self, guild_id: int, template_id: Optional[str], name: str) -> Optional[Macro]:
+        name = name.lower()
+        return self.macros.get((guild_id, template_id, name)) or self.macros.get((guild_id, self.GLOBAL, name))
+    
+    def complete(self, guild_id: int, template_id: Optional[str], prefix: str, limit: int = 25) -> List[str]:
+        tries = self.tries.get(guild_id, {})
+        if template_id:
+            tries = {key: tries[key] for key in [template_id, self.GLOBAL] if key in tries}
+        
+        names = set()
+        for trie in tries.values():
+            names.update(trie.complete(prefix.lower(), limit))
+        return sorted(names)[:limit]
+    
+    def render(self, macro: Macro, ticket: Ticket) -> str:
+        values = {
+            "ticket_id": ticket.id,
+            "user": f"<@{ticket.user_id}>",
+            "user_id": str(ticket.user_id),
+            "staff": f"<@{ticket.assigned_to}>" if ticket.assigned_to else "brak",
+            "title": ticket.title,
+            "template": ticket.template.name,
+            "priority": ticket.priority.value.upper(),
+            "status": ticket.current_status.value,
+            "sla": f"<t:{int(ticket.sla_deadline.timestamp())}:R>",
+            "channel": f"<#{ticket.channel_id}>" if ticket.channel_id else "brak"
+        }
+        for field_name, answer in ticket.answers.items():
+            values[f"answer_{field_name}"] = str(answer)
+        
+        return "".join(literal + (values.get(key, "brak") if key else "") for literal, key in macro.parts)[:self.MAX_LENGTH]
+
+class CreationMetrics:
+    def __init__(self, size: int):
+        self.samples: Dict[str, deque] = {}
+        self.size = size
+    
+    def record(self, step: str, seconds: float):
+        samples = self.samples.get(step)
+        if samples is None:
+            samples = self.samples[step] = deque(maxlen=self.size)
+        samples.append(seconds)
+    
+    def percentile(self, step: str, fraction: float = 0.95) -> Optional[float]:
+        samples = sorted(self.samples.get(step, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+    
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            step: {"count": len(samples), "p50": self.percentile(step, 0.5), "p95": self.percentile(step)}
+            for step, samples in self.samples.items()
+        }
 
 class TicketSystem:
     def __init__(self, bot):
         self.bot = bot
         self.tickets: Dict[str, Ticket] = {}
-        self.user_tickets: Dict[int, List[str]] = {}
         self.staff_tickets: Dict[int, List[str]] = {}
         self.templates: Dict[str, Template] = {}
+        self.index = TicketIndex()
+        self.panels = PanelRenderer(self, CONFIG["panel_refresh_delay"])
+        self.scheduler = AssignmentScheduler(self.templates)
+        self.deadlines = DeadlineScheduler(self)
+        self.analytics = TicketAnalytics(CONFIG["stats_recent_size"], CONFIG["stats_retention_days"])
+        self.archiver = TicketArchiver(self, CONFIG["archive_dir"])
+        self.logs = LogQueue(self, CONFIG["log_batch_delay"])
+        self.creation_metrics = CreationMetrics(CONFIG["creation_metrics_size"])
+        self.store = TicketStore(CONFIG["ticket_db_file"], CONFIG["store_batch_size"])
+        self.store.on_error = self._store_error
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.macros = MacroEngine(self.store)
         self._load_templates()
+        self._load_open_tickets()
+        self.analytics.load(self.store)
+        self.macros.load()
+    
+    def _load_open_tickets(self):
+        for ticket in self.store.load_open_tickets(self.templates):
+            self.tickets[ticket.id] = ticket
+            if ticket.assigned_to:
+                self.staff_tickets.setdefault(ticket.assigned_to, []).append(ticket.id)
+                self.scheduler.assign(ticket, ticket.assigned_to)
+            self.deadlines.schedule(ticket)
+        
+        self.index.rebuild(list(self.tickets.values()))
     
     def _load_templates(self):
         templates = [
@@ -252,17 +1862,23 @@ class TicketSystem:
         ]
         
         for template in templates:
+            template.thread_parent_id = CONFIG["ticket_thread_parents"].get(template.id, template.thread_parent_id)
             self.templates[template.id] = template
     
+    def _store_error(self, message: str):
+        if self._loop and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self.logs.put, message)
+        else:
+            print(message)
+    
     async def start_tasks(self):
-        if not self._cleanup_task.is_running():
-            self._cleanup_task.start()
-        if not self._sla_check_task.is_running():
-            self._sla_check_task.start()
+        self._loop = asyncio.get_running_loop()
+        self.deadlines.start()
+        self.archiver.start()
     
     async def create_ticket(self, user_id: int, template_id: str, title: str, 
                            description: str, priority: Priority, answers: Dict[str, Any]) -> Optional[Ticket]:
-        if len(self.user_tickets.get(user_id, [])) >= CONFIG["max_tickets_per_user"]:
+        if self.index.open_count(user_id) >= CONFIG["max_tickets_per_user"]:
             return None
         
         template = self.templates.get(template_id)
@@ -278,14 +1894,156 @@ class TicketSystem:
             answers=answers
         )
         
+        self.store.insert_ticket(ticket)
         self.tickets[ticket.id] = ticket
-        if user_id not in self.user_tickets:
-            self.user_tickets[user_id] = []
-        self.user_tickets[user_id].append(ticket.id)
+        self.index.add_open(ticket.id, user_id)
+        self.deadlines.schedule(ticket)
+        self.analytics.ticket_created(ticket)
         
         return ticket
     
-    async def create_ticket_channel(self, guild: discord.Guild, ticket: Ticket) -> Optional[discord.TextChannel]:
+    def get_ticket(self, ticket_id: str) -> Optional[Ticket]:
+        return self.tickets.get(ticket_id)
+    
+    async def fetch_ticket(self, ticket_id: str) -> Optional[Ticket]:
+        ticket = self.tickets.get(ticket_id)
+        if ticket is None:
+            ticket = await run_blocking(self.store.load_ticket, ticket_id, self.templates)
+        return ticket
+    
+    def get_ticket_by_channel(self, channel_id: int) -> Optional[Ticket]:
+        ticket_id = self.index.ticket_for_channel(channel_id)
+        return self.tickets.get(ticket_id) if ticket_id else None
+    
+    async def fetch_ticket_by_channel(self, channel_id: int) -> Optional[Ticket]:
+        ticket = self.get_ticket_by_channel(channel_id)
+        if ticket is None:
+            ticket_id = await run_blocking(self.store.ticket_id_for_channel, channel_id)
+            ticket = await self.fetch_ticket(ticket_id) if ticket_id else None
+        return ticket
+    
+    def _evict(self, ticket: Ticket):
+        self.tickets.pop(ticket.id, None)
+        self.panels.forget(ticket.id)
+        if ticket.id in self.staff_tickets.get(ticket.assigned_to, []):
+            self.staff_tickets[ticket.assigned_to].remove(ticket.id)
+        if ticket.channel_id:
+            self.index.remove_channel(ticket.channel_id)
+    
+    def route_message(self, message: discord.Message) -> Optional[Ticket]:
+        ticket = self.get_ticket_by_channel(message.channel.id)
+        if ticket:
+            attachments = [att.url for att in message.attachments]
+            ticket.add_message(message.id, message.author.id, message.content, attachments)
+            if ticket.first_response_at is None and message.author.id != ticket.user_id:
+                self.record_first_response(ticket, message.author.id)
+            
+            self.panels.schedule(ticket)
+        return ticket
+    
+    def discard_ticket(self, ticket: Ticket, reason: str):
+        self.change_status(ticket, TicketStatus.CLOSED, self.bot.user.id, reason)
+        self._evict(ticket)
+    
+    def channel_deleted(self, channel_id: int):
+        ticket = self.get_ticket_by_channel(channel_id)
+        if ticket and ticket.current_status not in [TicketStatus.CLOSED, TicketStatus.ARCHIVED]:
+            self.discard_ticket(ticket, "Kanał ticketu został usunięty")
+        self.index.remove_channel(channel_id)
+    
+    def assign(self, ticket: Ticket, staff_id: int, assigned_by: int, reason: Optional[str] = None, record: bool = True):
+        if ticket.assigned_to and ticket.id in self.staff_tickets.get(ticket.assigned_to, []):
+            self.staff_tickets[ticket.assigned_to].remove(ticket.id)
+        
+        ticket.assign(staff_id, assigned_by, reason, record)
+        self.staff_tickets.setdefault(staff_id, []).append(ticket.id)
+        if ticket.current_status not in [TicketStatus.CLOSED, TicketStatus.ARCHIVED]:
+            self.scheduler.assign(ticket, staff_id)
+    
+    def record_first_response(self, ticket: Ticket, user_id: int):
+        ticket.first_response_at = datetime.datetime.now()
+        ticket.first_responder_id = user_id
+        ticket._persist()
+        self.analytics.first_responded(ticket)
+    
+    def change_status(self, ticket: Ticket, new_status: TicketStatus, user_id: int, reason: Optional[str] = None):
+        old_status = ticket.current_status
+        old_closed_at = ticket.closed_at
+        ticket.change_status(new_status, user_id, reason)
+        self.analytics.status_changed(ticket, old_status, old_closed_at)
+        
+        if new_status in [TicketStatus.CLOSED, TicketStatus.ARCHIVED]:
+            self.index.mark_closed(ticket.id)
+            self.scheduler.release(ticket)
+        elif ticket.id not in self.index.open_tickets:
+            self.index.add_open(ticket.id, ticket.user_id)
+        
+        if new_status == TicketStatus.RESOLVED:
+            self.deadlines.schedule(ticket)
+    
+    def _ticket_overwrites(self, guild: discord.Guild, ticket: Ticket,
+                           assignee: Optional[discord.Member] = None) -> Dict[Any, discord.PermissionOverwrite]:
+        overwrites = {guild.default_role: discord.PermissionOverwrite(read_messages=False)}
+        
+        for member in [guild.get_member(ticket.user_id), assignee]:
+            if member:
+                overwrites[member] = discord.PermissionOverwrite(read_messages=True, send_messages=True,
+                                                                 embed_links=True, attach_files=True)
+        
+        for role_id in ticket.template.support_roles:
+            role = guild.get_role(role_id)
+            if role:
+                overwrites[role] = discord.PermissionOverwrite(read_messages=True, send_messages=True,
+                                                               manage_messages=True, embed_links=True,
+                                                               attach_files=True)
+        
+        overwrites[guild.me] = discord.PermissionOverwrite(read_messages=True, send_messages=True,
+                                                           manage_channels=True, manage_messages=True,
+                                                           embed_links=True, attach_files=True)
+        return overwrites
+    
+    async def grant_access(self, channel: Union[discord.TextChannel, discord.Thread], member: discord.Member):
+        if isinstance(channel, discord.Thread):
+            await channel.add_user(member)
+        else:
+            await channel.set_permissions(member, read_messages=True, send_messages=True,
+                                          embed_links=True, attach_files=True)
+    
+    async def create_ticket_thread(self, guild: discord.Guild, ticket: Ticket) -> Optional[discord.Thread]:
+        parent = guild.get_channel(ticket.template.thread_parent_id)
+        if not isinstance(parent, discord.TextChannel):
+            await self.send_log(f"❌ Nie znaleziono kanału wątków dla {ticket.template.name} (ID: {ticket.template.thread_parent_id})")
+            return None
+        
+        try:
+            thread = await parent.create_thread(
+                name=f"{ticket.template.channel_name}-{ticket.id.lower()}",
+                type=discord.ChannelType.private_thread,
+                invitable=False,
+                auto_archive_duration=10080
+            )
+        except discord.Forbidden as e:
+            await self.send_log(f"❌ Brak uprawnień do tworzenia wątków: {e}")
+            return None
+        except Exception as e:
+            await self.send_log(f"❌ Błąd tworzenia wątku: {e}")
+            return None
+        
+        try:
+            await thread.add_user(discord.Object(id=ticket.user_id))
+        except discord.HTTPException as e:
+            await self.send_log(f"⚠️ Nie udało się dodać autora do wątku {ticket.id}: {e}")
+        
+        ticket.channel_id = thread.id
+        ticket._persist()
+        self.index.set_channel(ticket.id, thread.id)
+        return thread
+    
+    async def create_ticket_channel(self, guild: discord.Guild, ticket: Ticket,
+                                    assignee: Optional[discord.Member] = None) -> Optional[Union[discord.TextChannel, discord.Thread]]:
+        if ticket.template.thread_parent_id:
+            return await self.create_ticket_thread(guild, ticket)
+        
         category = None
         if CONFIG["ticket_category_id"]:
             category = guild.get_channel(CONFIG["ticket_category_id"])
@@ -295,31 +2053,32 @@ class TicketSystem:
             return None
         
         channel_name = f"{ticket.template.channel_name}-{ticket.id.lower()}"
+        recycled = self.archiver.take_recycled(category) if CONFIG["recycle_channels"] else None
+        if recycled:
+            try:
+                await recycled.edit(
+                    name=channel_name,
+                    topic=f"Ticket {ticket.id} - {ticket.title}",
+                    overwrites=self._ticket_overwrites(guild, ticket, assignee)
+                )
+                ticket.channel_id = recycled.id
+                ticket._persist()
+                self.index.set_channel(ticket.id, recycled.id)
+                return recycled
+            except Exception as e:
+                self.archiver.return_recycled(recycled)
+                await self.send_log(f"⚠️ Nie udało się użyć kanału z puli: {e}")
+        
         try:
             channel = await category.create_text_channel(
                 name=channel_name,
-                topic=f"Ticket {ticket.id} - {ticket.title}"
+                topic=f"Ticket {ticket.id} - {ticket.title}",
+                overwrites=self._ticket_overwrites(guild, ticket, assignee)
             )
             
-            await channel.set_permissions(guild.default_role, read_messages=False)
-            
-            user = guild.get_member(ticket.user_id)
-            if user:
-                await channel.set_permissions(user, read_messages=True, send_messages=True, 
-                                             embed_links=True, attach_files=True)
-            
-            for role_id in ticket.template.support_roles:
-                role = guild.get_role(role_id)
-                if role:
-                    await channel.set_permissions(role, read_messages=True, send_messages=True, 
-                                                 manage_messages=True, embed_links=True, 
-                                                 attach_files=True)
-            
-            await channel.set_permissions(guild.me, read_messages=True, send_messages=True, 
-                                         manage_channels=True, manage_messages=True,
-                                         embed_links=True, attach_files=True)
-            
             ticket.channel_id = channel.id
+            ticket._persist()
+            self.index.set_channel(ticket.id, channel.id)
             return channel
             
         except discord.Forbidden as e:
@@ -329,116 +2088,59 @@ class TicketSystem:
             await self.send_log(f"❌ Błąd tworzenia kanału: {e}")
             return None
     
-    async def send_ticket_panel(self, channel: discord.TextChannel, ticket: Ticket):
-        embed = discord.Embed(
-            title=f"🎫 PANEL TICKETU - {ticket.id}",
-            description=f"**Status:** `{ticket.current_status.value}`\n**Priorytet:** `{ticket.priority.value.upper()}`",
-            color=ticket.template.color,
-            timestamp=ticket.created_at
-        )
-        
-        user = self.bot.get_user(ticket.user_id)
-        embed.add_field(name="👤 Twórca", value=user.mention if user else f"<@{ticket.user_id}>", inline=True)
-        
-        if ticket.assigned_to:
-            staff = self.bot.get_user(ticket.assigned_to)
-            embed.add_field(name="🛠️ Przypisany do", value=staff.mention if staff else f"<@{ticket.assigned_to}>", inline=True)
-        else:
-            embed.add_field(name="🛠️ Przypisany do", value="❌ Nieprzypisany", inline=True)
-        
-        embed.add_field(name="📅 Utworzony", value=f"<t:{int(ticket.created_at.timestamp())}:R>", inline=True)
-        embed.add_field(name="⏰ Termin SLA", value=f"<t:{int(ticket.sla_deadline.timestamp())}:R>", inline=True)
-        
-        if ticket.answers:
-            answers_text = "\n".join([f"• **{k}:** {v[:100]}{'...' if len(str(v)) > 100 else ''}" for k, v in ticket.answers.items()])
-            embed.add_field(name="📝 Informacje", value=answers_text[:500], inline=False)
-        
-        embed.add_field(
-            name="⚡ Akcje",
-            value="• **👥 Przypisz** - Przypisz ticket\n"
-                  "• **📋 Status** - Zmień status\n"
-                  "• **📄 Transkrypt** - Pobierz transkrypt\n"
-                  "• **🔒 Zamknij** - Zamknij ticket\n"
-                  "• **ℹ️ Info** - Informacje o tickecie",
-            inline=False
-        )
-        
-        embed.set_footer(text=f"Typ: {ticket.template.name}")
-        
+    async def send_ticket_panel(self, channel: Union[discord.TextChannel, discord.Thread], ticket: Ticket):
+        embed = self.panels.build_embed(ticket, initial=True)
         view = TicketPanelView(ticket)
-        message = await channel.send(embed=embed, view=view)
+        content = None
+        if isinstance(channel, discord.Thread):
+            content = " ".join([f"<@{ticket.user_id}>"] + [f"<@&{role_id}>" for role_id in ticket.template.support_roles])
+        message = await channel.send(content, embed=embed, view=view)
         ticket.panel_message_id = message.id
+        ticket._persist()
+        self.panels.remember(ticket, message, embed, view)
         
-        await message.add_reaction("👥")
-        await message.add_reaction("📋")
-        await message.add_reaction("📄")
-        await message.add_reaction("🔒")
-        await message.add_reaction("ℹ️")
+        await asyncio.gather(*[message.add_reaction(emoji) for emoji in ["👥", "📋", "📄", "🔒", "ℹ️"]])
     
-    async def auto_assign_ticket(self, ticket: Ticket, guild: discord.Guild):
-        support_members = []
-        for role_id in ticket.template.support_roles:
-            role = guild.get_role(role_id)
-            if role:
-                support_members.extend([member for member in role.members if not member.bot])
-        
-        if not support_members:
-            await self.send_log(f"⚠️ Brak członków supportu dla ticketu {ticket.id}")
-            return
-        
-        unique_members = []
-        seen_ids = set()
-        for member in support_members:
-            if member.id not in seen_ids:
-                unique_members.append(member)
-                seen_ids.add(member.id)
-        
-        if not unique_members:
-            return
-        
-        member_load = {}
-        for member in unique_members:
-            member_load[member.id] = len(self.staff_tickets.get(member.id, []))
+    def reserve_assignee(self, ticket: Ticket, guild: discord.Guild) -> Optional[discord.Member]:
+        member_id = self.scheduler.pick(guild, ticket.template)
+        if member_id is None:
+            self.logs.put(f"⚠️ Brak członków supportu dla ticketu {ticket.id}")
+            return None
         
-        min_member_id = min(member_load, key=member_load.get)
-        ticket.assigned_to = min_member_id
+        self.assign(ticket, member_id, self.bot.user.id, "Automatyczne przypisanie", record=False)
+        return guild.get_member(member_id)
+    
+    async def announce_assignment(self, ticket: Ticket, channel: Union[discord.TextChannel, discord.Thread],
+                                  member: discord.Member, grant: bool = True):
+        if grant:
+            await self.grant_access(channel, member)
         
-        if min_member_id not in self.staff_tickets:
-            self.staff_tickets[min_member_id] = []
-        self.staff_tickets[min_member_id].append(ticket.id)
+        embed = discord.Embed(
+            description=f"✅ Ticket automatycznie przypisany do {member.mention}",
+            color=0x2ecc71
+        )
+        await channel.send(embed=embed)
         
+        await self.send_log(f"✅ Ticket {ticket.id} przypisany do {member.name}")
+    
+    async def auto_assign_ticket(self, ticket: Ticket, guild: discord.Guild):
+        member = self.reserve_assignee(ticket, guild)
         channel = self.bot.get_channel(ticket.channel_id)
-        if channel:
-            member = guild.get_member(min_member_id)
-            if member:
-                await channel.set_permissions(member, read_messages=True, send_messages=True, 
-                                             embed_links=True, attach_files=True)
-                
-                embed = discord.Embed(
-                    description=f"✅ Ticket automatycznie przypisany do {member.mention}",
-                    color=0x2ecc71
-                )
-                await channel.send(embed=embed)
-                
-                await self.send_log(f"✅ Ticket {ticket.id} przypisany do {member.name}")
+        if channel and member:
+            await self.announce_assignment(ticket, channel, member)
     
     async def close_ticket(self, ticket_id: str, closer_id: int, reason: Optional[str] = None) -> bool:
-        ticket = self.tickets.get(ticket_id)
+        ticket = await self.fetch_ticket(ticket_id)
         if not ticket:
             return False
         
-        ticket.change_status(TicketStatus.CLOSED, closer_id, reason or "Ręcznie zamknięty")
+        self.change_status(ticket, TicketStatus.CLOSED, closer_id, reason or "Ręcznie zamknięty")
 
-        transcript = await self.generate_transcript(ticket)
-        
         if CONFIG["transcript_channel_id"]:
             log_channel = self.bot.get_channel(CONFIG["transcript_channel_id"])
             if log_channel:
                 try:
-                    file = discord.File(
-                        io.BytesIO(transcript.encode('utf-8')),
-                        filename=f"transcript-{ticket.id}.txt"
-                    )
+                    file = await self.transcript_file(ticket)
                     embed = discord.Embed(
                         title=f"📄 Transkrypt Ticketu {ticket.id}",
                         description=f"**Tytuł:** {ticket.title}\n**Twórca:** <@{ticket.user_id}>\n**Zamknięty przez:** <@{closer_id}>",
@@ -455,19 +2157,20 @@ class TicketSystem:
         channel = self.bot.get_channel(ticket.channel_id)
         if channel:
             try:
-                await channel.edit(name=f"closed-{ticket.id.lower()}")
+                if not isinstance(channel, discord.Thread):
+                    await channel.edit(name=f"closed-{ticket.id.lower()}")
 
-                if CONFIG["archive_category_id"]:
-                    archive_category = self.bot.get_channel(CONFIG["archive_category_id"])
-                    if archive_category:
-                        await channel.edit(category=archive_category)
+                    if CONFIG["archive_category_id"]:
+                        archive_category = self.bot.get_channel(CONFIG["archive_category_id"])
+                        if archive_category:
+                            await channel.edit(category=archive_category)
 
-                await channel.set_permissions(channel.guild.default_role, read_messages=False, send_messages=False)
-                
-                for role_id in ticket.template.support_roles + CONFIG["admin_role_ids"]:
-                    role = channel.guild.get_role(role_id)
-                    if role:
-                        await channel.set_permissions(role, read_messages=True, send_messages=False)
+                    await channel.set_permissions(channel.guild.default_role, read_messages=False, send_messages=False)
+                    
+                    for role_id in ticket.template.support_roles + CONFIG["admin_role_ids"]:
+                        role = channel.guild.get_role(role_id)
+                        if role:
+                            await channel.set_permissions(role, read_messages=True, send_messages=False)
                 
                 closer = self.bot.get_user(closer_id)
                 embed = discord.Embed(
@@ -489,7 +2192,7 @@ class TicketSystem:
                 minutes, _ = divmod(remainder, 60)
                 
                 embed.add_field(name="⏱️ Czas trwania", value=f"{duration.days}d {hours}h {minutes}m", inline=True)
-                embed.add_field(name="💬 Wiadomości", value=str(len(ticket.messages)), inline=True)
+                embed.add_field(name="💬 Wiadomości", value=str(ticket.message_count), inline=True)
                 embed.add_field(name="🔄 Zmiany statusu", value=str(len(ticket.status_history)), inline=True)
                 
                 if reason:
@@ -497,109 +2200,37 @@ class TicketSystem:
                 
                 await channel.send(embed=embed)
                 
+                if isinstance(channel, discord.Thread):
+                    await channel.edit(name=f"closed-{ticket.id.lower()}", archived=True, locked=True)
+                
             except Exception as e:
                 await self.send_log(f"❌ Błąd zamykania kanału: {e}")
         
         await self.send_log(f"🔒 Ticket {ticket.id} zamknięty przez <@{closer_id}>")
+        self._evict(ticket)
         return True
     
-    async def generate_transcript(self, ticket: Ticket) -> str:
-        transcript = f"=== TRANSKRYPT TICKETU ===\n"
-        transcript += f"ID: {ticket.id}\n"
-        transcript += f"Tytuł: {ticket.title}\n"
-        transcript += f"Twórca: {ticket.user_id}\n"
-        transcript += f"Typ: {ticket.template.name}\n"
-        transcript += f"Priorytet: {ticket.priority.value}\n"
-        transcript += f"Status końcowy: {ticket.current_status.value}\n"
-        transcript += f"Utworzony: {ticket.created_at.strftime('%Y-%m-%d %H:%M:%S')}\n"
-        transcript += f"Ostatnia aktywność: {ticket.updated_at.strftime('%Y-%m-%d %H:%M:%S')}\n"
-        
-        if ticket.assigned_to:
-            transcript += f"Przypisany do: {ticket.assigned_to}\n"
-        
-        if ticket.answers:
-            transcript += f"\n=== ODPOWIEDZI ===\n"
-            for key, value in ticket.answers.items():
-                transcript += f"{key}: {value}\n"
-        
-        transcript += f"\n=== HISTORIA STATUSÓW ===\n"
-        for change in ticket.status_history:
-            user = self.bot.get_user(change.user_id)
-            user_name = user.name if user else f"User_{change.user_id}"
-            transcript += f"[{change.timestamp.strftime('%Y-%m-%d %H:%M:%S')}] {change.from_status} → {change.to_status} przez {user_name}"
-            if change.reason:
-                transcript += f" - {change.reason}"
-            transcript += "\n"
-        
-        transcript += f"\n=== WIADOMOŚCI ({len(ticket.messages)}) ===\n"
-        for msg in ticket.messages:
-            if msg.message_id == 0:
-                transcript += f"[{msg.timestamp.strftime('%Y-%m-%d %H:%M:%S')}] SYSTEM: Ticket utworzony z wiadomością: {msg.content}\n"
-                continue
-                
-            user = self.bot.get_user(msg.user_id)
-            user_name = user.name if user else f"User_{msg.user_id}"
-            transcript += f"[{msg.timestamp.strftime('%Y-%m-%d %H:%M:%S')}] {user_name}: {msg.content}\n"
-            if msg.attachments:
-                transcript += f"  Załączniki: {', '.join(msg.attachments)}\n"
-        
-        transcript += f"\n=== PRZYPISANIA ({len(ticket.assignments_history)}) ===\n"
-        for assignment in ticket.assignments_history:
-            staff = self.bot.get_user(assignment['staff_id'])
-            staff_name = staff.name if staff else f"User_{assignment['staff_id']}"
-            by = self.bot.get_user(assignment['assigned_by'])
-            by_name = by.name if by else f"User_{assignment['assigned_by']}"
-            transcript += f"[{assignment['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}] Przypisany do {staff_name} przez {by_name}"
-            if assignment['reason']:
-                transcript += f" - {assignment['reason']}"
-            transcript += "\n"
+    async def apply_macro(self, macro: Macro, ticket: Ticket,
+                          channel: Union[discord.TextChannel, discord.Thread], user_id: int):
+        await channel.send(self.macros.render(macro, ticket))
         
-        transcript += f"\n=== KONIEC TRANSKRYPTU ===\n"
-        return transcript
-    
-    async def send_log(self, message: str):
-        if CONFIG["log_channel_id"]:
-            log_channel = self.bot.get_channel(CONFIG["log_channel_id"])
-            if log_channel:
-                try:
-                    await log_channel.send(message)
-                except:
-                    pass
+        if macro.status and macro.status != ticket.current_status:
+            self.change_status(ticket, macro.status, user_id, f"Makro {macro.name}")
+            await self.panels.refresh(ticket)
     
-    @tasks.loop(hours=1)
-    async def _cleanup_task(self):
-        await self.bot.wait_until_ready()
-        
-        cutoff = datetime.datetime.now() - timedelta(days=CONFIG["auto_close_days"])
-        
-        tickets_to_close = []
-        for ticket_id, ticket in self.tickets.items():
-            if (ticket.current_status == TicketStatus.RESOLVED and 
-                ticket.updated_at < cutoff):
-                tickets_to_close.append(ticket_id)
+    async def transcript_file(self, ticket: Ticket, fmt: Optional[str] = None) -> discord.File:
+        if ticket.current_status == TicketStatus.ARCHIVED:
+            data = await run_blocking(self.archiver.read, ticket.id)
+            if data is not None:
+                return discord.File(io.BytesIO(data), filename=f"transcript-{ticket.id}.txt")
         
-        for ticket_id in tickets_to_close:
-            await self.close_ticket(ticket_id, self.bot.user.id, "Automatycznie zamknięty po okresie rozwiązywania")
+        fmt = fmt or CONFIG["transcript_format"]
+        writer = TranscriptWriter(self.bot, ticket)
+        buffer = await run_blocking(writer.write, fmt)
+        return discord.File(buffer, filename=f"transcript-{ticket.id}.{fmt}")
     
-    @tasks.loop(minutes=30)
-    async def _sla_check_task(self):
-        await self.bot.wait_until_ready()
-        
-        for ticket_id, ticket in self.tickets.items():
-            if ticket.current_status not in [TicketStatus.CLOSED, TicketStatus.ARCHIVED]:
-                if datetime.datetime.now() > ticket.sla_deadline:
-                    channel = self.bot.get_channel(ticket.channel_id)
-                    if channel:
-                        embed = discord.Embed(
-                            title="⚠️ OSTRZEŻENIE SLA",
-                            description=f"Ticket {ticket.id} przekroczył czas odpowiedzi SLA!",
-                            color=0xe74c3c
-                        )
-                        embed.add_field(name="Termin SLA", value=f"<t:{int(ticket.sla_deadline.timestamp())}:R>", inline=True)
-                        embed.add_field(name="Bieżący czas", value=f"<t:{int(datetime.datetime.now().timestamp())}:R>", inline=True)
-                        
-                        role_mentions = " ".join([f"<@&{role_id}>" for role_id in ticket.template.support_roles])
-                        await channel.send(f"{role_mentions}\n**UWAGA: PRZEKROCZENIE SLA!**", embed=embed)
+    async def send_log(self, message: str):
+        self.logs.put(message)
 
 class MainPanelView(discord.ui.View):
     def __init__(self):
@@ -674,6 +2305,7 @@ class TicketCreationModal(discord.ui.Modal):
             self.answer_inputs[question["field"]] = input_field
     
     async def on_submit(self, interaction: discord.Interaction):
+        submitted_at = time.perf_counter()
         await interaction.response.defer(thinking=True, ephemeral=True)
 
         priority_text = self.priority_select.value.lower() if self.priority_select.value else "średni"
@@ -711,11 +2343,17 @@ class TicketCreationModal(discord.ui.Modal):
             )
             return
         
-        channel = await ticket_system.create_ticket_channel(interaction.guild, ticket)
+        metrics = ticket_system.creation_metrics
+        step_start = time.perf_counter()
+        metrics.record("create_ticket", step_start - submitted_at)
+        
+        assignee = ticket_system.reserve_assignee(ticket, interaction.guild)
+        channel = await ticket_system.create_ticket_channel(interaction.guild, ticket, assignee)
+        channel_ready = time.perf_counter()
+        metrics.record("create_channel", channel_ready - step_start)
+        metrics.record("submit_to_channel", channel_ready - submitted_at)
         
         if channel:
-            await ticket_system.send_ticket_panel(channel, ticket)
-            
             embed = discord.Embed(
                 title="✅ TICKET UTWORZONY POMYŚLNIE!",
                 description=f"**ID Ticketu:** `{ticket.id}`",
@@ -730,10 +2368,28 @@ class TicketCreationModal(discord.ui.Modal):
             
             embed.set_footer(text="Nasz zespół skontaktuje się z Tobą najszybciej jak to możliwe!")
             
-            await interaction.followup.send(embed=embed, ephemeral=True)
-            await ticket_system.auto_assign_ticket(ticket, interaction.guild)
+            async def timed(step: str, coroutine):
+                started = time.perf_counter()
+                await coroutine
+                metrics.record(step, time.perf_counter() - started)
+            
+            steps = [
+                timed("send_panel", ticket_system.send_ticket_panel(channel, ticket)),
+                timed("followup", interaction.followup.send(embed=embed, ephemeral=True))
+            ]
+            if assignee:
+                steps.append(timed("announce_assignment", ticket_system.announce_assignment(
+                    ticket, channel, assignee, grant=isinstance(channel, discord.Thread)
+                )))
+            
+            for result in await asyncio.gather(*steps, return_exceptions=True):
+                if isinstance(result, Exception):
+                    ticket_system.logs.put(f"❌ Błąd tworzenia ticketu {ticket.id}: {result}")
+            
+            metrics.record("total", time.perf_counter() - submitted_at)
             await ticket_system.send_log(f"🎫 Nowy ticket `{ticket.id}` utworzony przez <@{interaction.user.id}>")
         else:
+            ticket_system.discard_ticket(ticket, "Nie udało się utworzyć kanału ticketu")
             await interaction.followup.send(
                 "❌ Nie udało się utworzyć kanału ticketu! Sprawdź:\n"
                 "1. Czy bot ma uprawnienia do tworzenia kanałów\n"
@@ -742,13 +2398,29 @@ class TicketCreationModal(discord.ui.Modal):
                 ephemeral=True
             )
 
-class TicketPanelView(discord.ui.View):
-    def __init__(self, ticket: Ticket):
-        super().__init__(timeout=None)
-        self.ticket = ticket
-    
-    def _check_permissions(self, interaction: discord.Interaction) -> bool:
-        if interaction.user.id == self.ticket.user_id:
+class TicketPanelButton(discord.ui.DynamicItem[discord.ui.Button],
+                        template=r"ticket:(?P<action>assign|status|transcript|close|info):(?P<ticket_id>TICKET-[0-9A-F]+)"):
+    ACTIONS = {
+        "assign": ("Przypisz", "👥", discord.ButtonStyle.primary, "❌ Nie masz uprawnień do zarządzania tym ticketem!"),
+        "status": ("Status", "📋", discord.ButtonStyle.secondary, "❌ Nie masz uprawnień do zmiany statusu!"),
+        "transcript": ("Transkrypt", "📄", discord.ButtonStyle.secondary, "❌ Nie masz uprawnień do pobierania transkryptu!"),
+        "close": ("Zamknij", "🔒", discord.ButtonStyle.danger, "❌ Nie masz uprawnień do zamykania ticketu!"),
+        "info": ("Info", "ℹ️", discord.ButtonStyle.success, None)
+    }
+    
+    def __init__(self, action: str, ticket_id: str):
+        label, emoji, style, _ = self.ACTIONS[action]
+        super().__init__(discord.ui.Button(label=label, emoji=emoji, style=style, custom_id=f"ticket:{action}:{ticket_id}"))
+        self.action = action
+        self.ticket_id = ticket_id
+    
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(match["action"], match["ticket_id"])
+    
+    @staticmethod
+    def _check_permissions(interaction: discord.Interaction, ticket: Ticket) -> bool:
+        if interaction.user.id == ticket.user_id:
             return True
         
         member = interaction.guild.get_member(interaction.user.id)
@@ -756,26 +2428,29 @@ class TicketPanelView(discord.ui.View):
             return False
         
         for role in member.roles:
-            if role.id in self.ticket.template.support_roles or role.id in CONFIG["admin_role_ids"]:
+            if role.id in ticket.template.support_roles or role.id in CONFIG["admin_role_ids"]:
                 return True
         
         return False
     
-    @discord.ui.button(label="Przypisz", emoji="👥", style=discord.ButtonStyle.primary, custom_id="assign_btn")
-    async def assign_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if not self._check_permissions(interaction):
-            await interaction.response.send_message("❌ Nie masz uprawnień do zarządzania tym ticketem!", ephemeral=True)
+    async def callback(self, interaction: discord.Interaction):
+        ticket = await ticket_system.fetch_ticket(self.ticket_id)
+        if not ticket:
+            await interaction.response.send_message("❌ Ticket nie znaleziony!", ephemeral=True)
             return
         
-        await interaction.response.send_modal(AssignModal(self.ticket))
-    
-    @discord.ui.button(label="Status", emoji="📋", style=discord.ButtonStyle.secondary, custom_id="status_btn")
-    async def status_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if not self._check_permissions(interaction):
-            await interaction.response.send_message("❌ Nie masz uprawnień do zmiany statusu!", ephemeral=True)
+        denied = self.ACTIONS[self.action][3]
+        if denied and not self._check_permissions(interaction, ticket):
+            await interaction.response.send_message(denied, ephemeral=True)
             return
         
-        view = StatusSelectView(self.ticket)
+        await getattr(self, f"_{self.action}")(interaction, ticket)
+    
+    async def _assign(self, interaction: discord.Interaction, ticket: Ticket):
+        await interaction.response.send_modal(AssignModal(ticket))
+    
+    async def _status(self, interaction: discord.Interaction, ticket: Ticket):
+        view = StatusSelectView(ticket)
         embed = discord.Embed(
             title="📋 Zmień Status Ticketu",
             description="Wybierz nowy status z listy poniżej:",
@@ -783,22 +2458,13 @@ class TicketPanelView(discord.ui.View):
         )
         await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
     
-    @discord.ui.button(label="Transkrypt", emoji="📄", style=discord.ButtonStyle.secondary, custom_id="transcript_btn")
-    async def transcript_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if not self._check_permissions(interaction):
-            await interaction.response.send_message("❌ Nie masz uprawnień do pobierania transkryptu!", ephemeral=True)
-            return
-        
+    async def _transcript(self, interaction: discord.Interaction, ticket: Ticket):
         await interaction.response.defer(ephemeral=True)
         
-        transcript = await ticket_system.generate_transcript(self.ticket)
-        file = discord.File(
-            io.BytesIO(transcript.encode('utf-8')),
-            filename=f"transcript-{self.ticket.id}.txt"
-        )
+        file = await ticket_system.transcript_file(ticket)
         
         embed = discord.Embed(
-            title=f"📄 Transkrypt Ticketu {self.ticket.id}",
+            title=f"📄 Transkrypt Ticketu {ticket.id}",
             description=f"Pobrano: <t:{int(datetime.datetime.now().timestamp())}:R>",
             color=0x3498db
         )
@@ -806,60 +2472,60 @@ class TicketPanelView(discord.ui.View):
         
         await interaction.followup.send(embed=embed, file=file, ephemeral=True)
     
-    @discord.ui.button(label="Zamknij", emoji="🔒", style=discord.ButtonStyle.danger, custom_id="close_btn")
-    async def close_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if not self._check_permissions(interaction):
-            await interaction.response.send_message("❌ Nie masz uprawnień do zamykania ticketu!", ephemeral=True)
-            return
-        
-        await interaction.response.send_modal(CloseModal(self.ticket))
+    async def _close(self, interaction: discord.Interaction, ticket: Ticket):
+        await interaction.response.send_modal(CloseModal(ticket))
     
-    @discord.ui.button(label="Info", emoji="ℹ️", style=discord.ButtonStyle.success, custom_id="info_btn")
-    async def info_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        embed = await self.create_info_embed()
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-    
-    async def create_info_embed(self) -> discord.Embed:
-        """Tworzy embed z informacjami o tickecie"""
-        embed = discord.Embed(
-            title=f"ℹ️ SZCZEGÓŁY TICKETU - {self.ticket.id}",
-            color=self.ticket.template.color,
-            timestamp=self.ticket.created_at
-        )
+    async def _info(self, interaction: discord.Interaction, ticket: Ticket):
+        await interaction.response.send_message(embed=build_ticket_info_embed(ticket), ephemeral=True)
 
-        user = ticket_system.bot.get_user(self.ticket.user_id)
-        embed.add_field(name="👤 Twórca", value=user.mention if user else f"<@{self.ticket.user_id}>", inline=True)
-        
-        if self.ticket.assigned_to:
-            staff = ticket_system.bot.get_user(self.ticket.assigned_to)
-            embed.add_field(name="🛠️ Przypisany do", value=staff.mention if staff else f"<@{self.ticket.assigned_to}>", inline=True)
-        else:
-            embed.add_field(name="🛠️ Przypisany do", value="❌ Nieprzypisany", inline=True)
-        
-        embed.add_field(name="📊 Status", value=f"`{self.ticket.current_status.value}`", inline=True)
-        embed.add_field(name="⚡ Priorytet", value=f"`{self.ticket.priority.value.upper()}`", inline=True)
-        embed.add_field(name="📝 Typ", value=self.ticket.template.name, inline=True)
-        embed.add_field(name="📅 Utworzony", value=f"<t:{int(self.ticket.created_at.timestamp())}:R>", inline=True)
-        embed.add_field(name="🔄 Ostatnia aktywność", value=f"<t:{int(self.ticket.updated_at.timestamp())}:R>", inline=True)
-        embed.add_field(name="⏰ Termin SLA", value=f"<t:{int(self.ticket.sla_deadline.timestamp())}:R>", inline=True)
-        embed.add_field(name="💬 Wiadomości", value=str(len(self.ticket.messages)), inline=True)
-        embed.add_field(name="🔄 Zmiany statusu", value=str(len(self.ticket.status_history)), inline=True)
-        
-        if self.ticket.status_history:
-            recent_changes = self.ticket.status_history[-3:]
-            changes_text = ""
-            for change in reversed(recent_changes):
-                user = ticket_system.bot.get_user(change.user_id)
-                user_name = user.name if user else f"User_{change.user_id}"
-                time_ago = f"<t:{int(change.timestamp.timestamp())}:R>"
-                changes_text += f"• `{change.from_status}` → `{change.to_status}` przez **{user_name}** {time_ago}\n"
-                if change.reason:
-                    changes_text += f"  *Powód: {change.reason}*\n"
-            
-            embed.add_field(name="📈 Ostatnie zmiany", value=changes_text[:500] + ("..." if len(changes_text) > 500 else ""), inline=False)
+class TicketPanelView(discord.ui.View):
+    def __init__(self, ticket: Ticket):
+        super().__init__(timeout=None)
+        self.ticket = ticket
+        for action in TicketPanelButton.ACTIONS:
+            self.add_item(TicketPanelButton(action, ticket.id))
+
+def build_ticket_info_embed(ticket: Ticket) -> discord.Embed:
+    """Tworzy embed z informacjami o tickecie"""
+    embed = discord.Embed(
+        title=f"ℹ️ SZCZEGÓŁY TICKETU - {ticket.id}",
+        color=ticket.template.color,
+        timestamp=ticket.created_at
+    )
+
+    user = ticket_system.bot.get_user(ticket.user_id)
+    embed.add_field(name="👤 Twórca", value=user.mention if user else f"<@{ticket.user_id}>", inline=True)
+    
+    if ticket.assigned_to:
+        staff = ticket_system.bot.get_user(ticket.assigned_to)
+        embed.add_field(name="🛠️ Przypisany do", value=staff.mention if staff else f"<@{ticket.assigned_to}>", inline=True)
+    else:
+        embed.add_field(name="🛠️ Przypisany do", value="❌ Nieprzypisany", inline=True)
+    
+    embed.add_field(name="📊 Status", value=f"`{ticket.current_status.value}`", inline=True)
+    embed.add_field(name="⚡ Priorytet", value=f"`{ticket.priority.value.upper()}`", inline=True)
+    embed.add_field(name="📝 Typ", value=ticket.template.name, inline=True)
+    embed.add_field(name="📅 Utworzony", value=f"<t:{int(ticket.created_at.timestamp())}:R>", inline=True)
+    embed.add_field(name="🔄 Ostatnia aktywność", value=f"<t:{int(ticket.updated_at.timestamp())}:R>", inline=True)
+    embed.add_field(name="⏰ Termin SLA", value=f"<t:{int(ticket.sla_deadline.timestamp())}:R>", inline=True)
+    embed.add_field(name="💬 Wiadomości", value=str(ticket.message_count), inline=True)
+    embed.add_field(name="🔄 Zmiany statusu", value=str(len(ticket.status_history)), inline=True)
+    
+    if ticket.status_history:
+        recent_changes = ticket.status_history[-3:]
+        changes_text = ""
+        for change in reversed(recent_changes):
+            user = ticket_system.bot.get_user(change.user_id)
+            user_name = user.name if user else f"User_{change.user_id}"
+            time_ago = f"<t:{int(change.timestamp.timestamp())}:R>"
+            changes_text += f"• `{change.from_status}` → `{change.to_status}` przez **{user_name}** {time_ago}\n"
+            if change.reason:
+                changes_text += f"  *Powód: {change.reason}*\n"
         
-        embed.set_footer(text=f"ID: {self.ticket.id}")
-        return embed
+        embed.add_field(name="📈 Ostatnie zmiany", value=changes_text[:500] + ("..." if len(changes_text) > 500 else ""), inline=False)
+    
+    embed.set_footer(text=f"ID: {ticket.id}")
+    return embed
 
 class StatusSelectView(discord.ui.View):
     def __init__(self, ticket: Ticket):
@@ -880,7 +2546,7 @@ class StatusSelectView(discord.ui.View):
     )
     async def status_select(self, interaction: discord.Interaction, select: discord.ui.Select):
         new_status = TicketStatus(select.values[0])
-        self.ticket.change_status(new_status, interaction.user.id, f"Zmieniony przez {interaction.user.name}")
+        ticket_system.change_status(self.ticket, new_status, interaction.user.id, f"Zmieniony przez {interaction.user.name}")
         
         await update_ticket_panel(self.ticket)
         
@@ -956,18 +2622,11 @@ class AssignModal(discord.ui.Modal):
             )
             return
         
-        self.ticket.assigned_to = user_id
-        self.ticket.assignments_history.append({
-            "timestamp": datetime.datetime.now(),
-            "staff_id": user_id,
-            "assigned_by": interaction.user.id,
-            "reason": self.reason_input.value
-        })
+        ticket_system.assign(self.ticket, user_id, interaction.user.id, self.reason_input.value)
 
         channel = ticket_system.bot.get_channel(self.ticket.channel_id)
         if channel:
-            await channel.set_permissions(member, read_messages=True, send_messages=True, 
-                                         embed_links=True, attach_files=True)
+            await ticket_system.grant_access(channel, member)
         
         await update_ticket_panel(self.ticket)
         
@@ -1016,55 +2675,11 @@ class CloseModal(discord.ui.Modal):
         
         await interaction.followup.send(embed=embed, ephemeral=True)
 
-async def update_ticket_panel(ticket: Ticket):
-    channel = ticket_system.bot.get_channel(ticket.channel_id)
-    if not channel or not ticket.panel_message_id:
-        return
-    
-    try:
-        message = await channel.fetch_message(ticket.panel_message_id)
-        
-        embed = discord.Embed(
-            title=f"🎫 PANEL TICKETU - {ticket.id}",
-            description=f"**Status:** `{ticket.current_status.value}`\n**Priorytet:** `{ticket.priority.value.upper()}`",
-            color=ticket.template.color,
-            timestamp=ticket.updated_at
-        )
-        
-        user = ticket_system.bot.get_user(ticket.user_id)
-        embed.add_field(name="👤 Twórca", value=user.mention if user else f"<@{ticket.user_id}>", inline=True)
-        
-        if ticket.assigned_to:
-            staff = ticket_system.bot.get_user(ticket.assigned_to)
-            embed.add_field(name="🛠️ Przypisany do", value=staff.mention if staff else f"<@{ticket.assigned_to}>", inline=True)
-        else:
-            embed.add_field(name="🛠️ Przypisany do", value="❌ Nieprzypisany", inline=True)
-        
-        embed.add_field(name="📅 Utworzony", value=f"<t:{int(ticket.created_at.timestamp())}:R>", inline=True)
-        embed.add_field(name="⏰ Termin SLA", value=f"<t:{int(ticket.sla_deadline.timestamp())}:R>", inline=True)
-        
-        if ticket.answers:
-            answers_text = "\n".join([f"• **{k}:** {v[:100]}{'...' if len(str(v)) > 100 else ''}" for k, v in ticket.answers.items()])
-            embed.add_field(name="📝 Informacje", value=answers_text[:500], inline=False)
-        
-        embed.add_field(
-            name="⚡ Akcje",
-            value="• **👥 Przypisz** - Przypisz ticket\n"
-                  "• **📋 Status** - Zmień status\n"
-                  "• **📄 Transkrypt** - Pobierz transkrypt\n"
-                  "• **🔒 Zamknij** - Zamknij ticket\n"
-                  "• **ℹ️ Info** - Informacje o tickecie",
-            inline=False
-        )
-        
-        embed.set_footer(text=f"Typ: {ticket.template.name} | Ostatnia aktualizacja")
-        
-        view = TicketPanelView(ticket)
-        await message.edit(embed=embed, view=view)
-    except discord.NotFound:
-        await ticket_system.send_ticket_panel(channel, ticket)
-    except Exception as e:
-        print(f"Błąd aktualizacji panelu: {e}")
+async def update_ticket_panel(ticket: Ticket, immediate: bool = True):
+    if immediate:
+        await ticket_system.panels.refresh(ticket)
+    else:
+        ticket_system.panels.schedule(ticket)
 
 ticket_system = TicketSystem(bot)
 
@@ -1082,6 +2697,13 @@ async def on_ready():
     await ticket_system.start_tasks()
 
     bot.add_view(MainPanelView())
+    bot.add_dynamic_items(TicketPanelButton)
+    
+    try:
+        await bot.tree.sync()
+        print("✅ Komendy slash zsynchronizowane")
+    except Exception as e:
+        print(f"❌ Błąd synchronizacji komend: {e}")
 
     for guild in bot.guilds:
         await create_or_update_panel(guild)
@@ -1122,14 +2744,6 @@ async def create_or_update_panel(guild: discord.Guild):
             print(f"❌ Nie udało się utworzyć kanału panelu: {e}")
             return
     
-    try:
-        def is_bot_message(m):
-            return m.author == bot.user or (m.author.bot and m.content)
-        
-        await panel_channel.purge(limit=100, check=is_bot_message)
-    except:
-        pass
-    
     embed = discord.Embed(
         title="🎫 SYSTEM TICKETÓW",
         description="**Wybierz typ ticketu z menu poniżej:**\n\n"
@@ -1158,7 +2772,28 @@ async def create_or_update_panel(guild: discord.Guild):
     embed.set_footer(text="System zarządzania ticketami v3.0 | Wsparcie dostępne 24/7")
     
     view = MainPanelView()
-    await panel_channel.send(embed=embed, view=view)
+    
+    location = await run_blocking(ticket_system.store.panel_location, guild.id)
+    if location and location["channel_id"] == panel_channel.id:
+        try:
+            await panel_channel.get_partial_message(location["message_id"]).edit(embed=embed, view=view)
+            return
+        except discord.NotFound:
+            pass
+        except Exception as e:
+            print(f"❌ Nie udało się zaktualizować panelu: {e}")
+            return
+    else:
+        try:
+            def is_bot_message(m):
+                return m.author == bot.user or (m.author.bot and m.content)
+            
+            await panel_channel.purge(limit=100, check=is_bot_message)
+        except:
+            pass
+    
+    message = await panel_channel.send(embed=embed, view=view)
+    ticket_system.store.save_panel_location(guild.id, panel_channel.id, message.id)
 
 @bot.event
 async def on_message(message: discord.Message):
@@ -1167,14 +2802,29 @@ async def on_message(message: discord.Message):
     
     await bot.process_commands(message)
     
+    ticket_system.route_message(message)
 
-    for ticket in ticket_system.tickets.values():
-        if ticket.channel_id == message.channel.id:
-            attachments = [att.url for att in message.attachments]
-            ticket.add_message(message.id, message.author.id, message.content, attachments)
-            
-            await update_ticket_panel(ticket)
-            break
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member):
+    if before.roles != after.roles:
+        ticket_system.scheduler.update_member(after)
+
+@bot.event
+async def on_member_remove(member: discord.Member):
+    ticket_system.scheduler.remove_member(member)
+
+@bot.event
+async def on_presence_update(before: discord.Member, after: discord.Member):
+    if before.status != after.status:
+        ticket_system.scheduler.update_presence(after)
+
+@bot.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    ticket_system.channel_deleted(channel.id)
+
+@bot.event
+async def on_thread_delete(thread: discord.Thread):
+    ticket_system.channel_deleted(thread.id)
 
 @bot.command(name="ticketsetup")
 @commands.has_permissions(administrator=True)
@@ -1276,13 +2926,9 @@ async def ticketsetup_command(ctx):
 @bot.command(name="ticket")
 async def ticket_info(ctx, ticket_id: str = None):
     if ticket_id:
-        ticket = ticket_system.tickets.get(ticket_id)
+        ticket = await ticket_system.fetch_ticket(ticket_id)
     else:
-        ticket = None
-        for t in ticket_system.tickets.values():
-            if t.channel_id == ctx.channel.id:
-                ticket = t
-                break
+        ticket = await ticket_system.fetch_ticket_by_channel(ctx.channel.id)
     
     if not ticket:
         await ctx.send("❌ Ticket nie znaleziony!", delete_after=10)
@@ -1306,7 +2952,7 @@ async def ticket_info(ctx, ticket_id: str = None):
     embed.add_field(name="🔄 Ostatnia aktywność", value=f"<t:{int(ticket.updated_at.timestamp())}:R>", inline=True)
     
     embed.add_field(name="📝 Typ", value=ticket.template.name, inline=True)
-    embed.add_field(name="💬 Wiadomości", value=str(len(ticket.messages)), inline=True)
+    embed.add_field(name="💬 Wiadomości", value=str(ticket.message_count), inline=True)
     embed.add_field(name="🔄 Zmiany statusu", value=str(len(ticket.status_history)), inline=True)
     
     if ticket.sla_deadline:
@@ -1314,64 +2960,282 @@ async def ticket_info(ctx, ticket_id: str = None):
     
     await ctx.send(embed=embed, delete_after=30)
 
+class TicketHistoryView(discord.ui.View):
+    STATUS_EMOJIS = {
+        "NEW": "🆕", "OPEN": "📂", "IN_PROGRESS": "🔄",
+        "WAITING_USER": "⏳", "WAITING_SUPPORT": "⏳",
+        "RESOLVED": "✅", "CLOSED": "🔒", "ARCHIVED": "📁"
+    }
+    
+    def __init__(self, user_id: int):
+        super().__init__(timeout=60)
+        self.user_id = user_id
+        self.cursors: List[Optional[tuple]] = [None]
+        self.next_cursor: Optional[tuple] = None
+        self.closed_count = 0
+    
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.user_id
+    
+    async def build_embed(self) -> discord.Embed:
+        open_tickets = sorted(
+            filter(None, map(ticket_system.tickets.get, ticket_system.index.open_for_user(self.user_id))),
+            key=lambda ticket: ticket.created_at, reverse=True
+        )
+        
+        page_size = CONFIG["ticket_history_page_size"]
+        rows = await run_blocking(ticket_system.store.closed_tickets_page, self.user_id, page_size + 1, self.cursors[-1])
+        self.closed_count = len(rows)
+        self.next_cursor = (rows[page_size - 1]["closed_at"], rows[page_size - 1]["id"]) if len(rows) > page_size else None
+        self.newer_button.disabled = len(self.cursors) == 1
+        self.older_button.disabled = self.next_cursor is None
+        
+        embed = discord.Embed(
+            title=f"📋 Twoje Tickety ({len(open_tickets)}/{CONFIG['max_tickets_per_user']} otwartych)",
+            color=0x3498db
+        )
+        
+        for i, ticket in enumerate(open_tickets, 1):
+            channel_mention = f"<#{ticket.channel_id}>" if ticket.channel_id else "Brak kanału"
+            status_emoji = self.STATUS_EMOJIS.get(ticket.current_status.value, "❓")
+            
+            embed.add_field(
+                name=f"{i}. {status_emoji} {ticket.id}",
+                value=f"**{ticket.title}**\n"
+                      f"Status: `{ticket.current_status.value}`\n"
+                      f"Kanał: {channel_mention}\n"
+                      f"Typ: {ticket.template.name}",
+                inline=False
+            )
+        
+        if rows:
+            lines = []
+            for row in rows[:page_size]:
+                closed_at = datetime.datetime.fromisoformat(row["closed_at"])
+                status_emoji = self.STATUS_EMOJIS.get(row["status"], "❓")
+                lines.append(f"{status_emoji} `{row['id']}` **{row['title'][:40]}** • <t:{int(closed_at.timestamp())}:d>")
+            embed.add_field(name="🗂️ Zamknięte tickety", value="\n".join(lines), inline=False)
+            embed.set_footer(text=f"Historia: strona {len(self.cursors)}")
+        
+        return embed
+    
+    @discord.ui.button(label="◀ Nowsze", style=discord.ButtonStyle.secondary)
+    async def newer_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if len(self.cursors) > 1:
+            self.cursors.pop()
+        await interaction.response.edit_message(embed=await self.build_embed(), view=self)
+    
+    @discord.ui.button(label="Starsze ▶", style=discord.ButtonStyle.secondary)
+    async def older_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.next_cursor:
+            self.cursors.append(self.next_cursor)
+        await interaction.response.edit_message(embed=await self.build_embed(), view=self)
+
 @bot.command(name="tickets")
 async def list_tickets(ctx):
-    user_tickets = ticket_system.user_tickets.get(ctx.author.id, [])
+    view = TicketHistoryView(ctx.author.id)
+    embed = await view.build_embed()
     
-    if not user_tickets:
+    if not embed.fields:
         embed = discord.Embed(
             title="📭 Twoje Tickety",
-            description="Nie masz żadnych otwartych ticketów.",
+            description="Nie masz żadnych ticketów.",
             color=0x95a5a6
         )
         await ctx.send(embed=embed, delete_after=30)
         return
     
+    await ctx.send(embed=embed, view=view if view.closed_count else None, delete_after=60)
+
+@bot.command(name="ticketsearch")
+@commands.has_permissions(manage_messages=True)
+async def ticket_search(ctx, *, query: str):
+    filters: Dict[str, Any] = {}
+    terms = []
+    
+    try:
+        for token in query.split():
+            key, _, value = token.partition(":")
+            key = key.lower()
+            if not value or key not in ["szablon", "status", "user", "od", "do"]:
+                terms.append(token)
+            elif key == "szablon":
+                filters["template_id"] = value.upper()
+            elif key == "status":
+                filters["status"] = value.upper()
+            elif key == "user":
+                filters["user_id"] = int(value.strip("<@!>"))
+            elif key == "od":
+                filters["since"] = datetime.datetime.fromisoformat(value)
+            else:
+                filters["until"] = datetime.datetime.fromisoformat(value) + timedelta(days=1)
+    except ValueError:
+        await ctx.send("❌ Nieprawidłowy filtr! Użyj `user:@wzmianka`, `od:RRRR-MM-DD`, `do:RRRR-MM-DD`.", delete_after=10)
+        return
+    
+    start = datetime.datetime.now()
+    results = await run_blocking(ticket_system.store.search, " ".join(terms), **filters)
+    elapsed = (datetime.datetime.now() - start).total_seconds() * 1000
+    
+    if not results:
+        await ctx.send("🔍 Brak wyników dla podanego zapytania.")
+        return
+    
     embed = discord.Embed(
-        title=f"📋 Twoje Tickety ({len(user_tickets)})",
+        title=f"🔍 Wyniki wyszukiwania ({len(results)})",
+        description=f"Zapytanie: `{' '.join(terms)}`",
         color=0x3498db
     )
     
-    for i, ticket_id in enumerate(user_tickets[:10], 1):
-        ticket = ticket_system.tickets.get(ticket_id)
-        if ticket:
-            channel_mention = f"<{ticket.channel_id}>" if ticket.channel_id else "Brak kanału"
-            status_emoji = {
-                "NEW": "🆕", "OPEN": "📂", "IN_PROGRESS": "🔄",
-                "WAITING_USER": "⏳", "WAITING_SUPPORT": "⏳",
-                "RESOLVED": "✅", "CLOSED": "🔒", "ARCHIVED": "📁"
-            }.get(ticket.current_status.value, "❓")
-            
-            embed.add_field(
-                name=f"{i}. {status_emoji} {ticket.id}",
-                value=f"**{ticket.title}**\n"
-                      f"Status: `{ticket.current_status.value}`\n"
-                      f"Kanał: {channel_mention}\n"
-                      f"Typ: {ticket.template.name}",
-                inline=False
-            )
+    for row in results:
+        template = ticket_system.templates.get(row["template_id"])
+        created_at = datetime.datetime.fromisoformat(row["created_at"])
+        embed.add_field(
+            name=f"{row['id']} - {row['title'][:80]}",
+            value=f"`{row['status']}` • {template.name if template else row['template_id']} • <@{row['user_id']}> • "
+                  f"<t:{int(created_at.timestamp())}:d>\n{row['excerpt'][:300]}",
+            inline=False
+        )
+    
+    embed.set_footer(text=f"Filtry: szablon:, status:, user:, od:, do: | {elapsed:.0f} ms")
+    await ctx.send(embed=embed)
+
+@bot.command(name="ticketarchive")
+@commands.has_permissions(administrator=True)
+async def ticket_archive(ctx, ticket_id: str):
+    ticket_id = ticket_id.upper()
+    data = await run_blocking(ticket_system.archiver.read, ticket_id)
+    if data is None:
+        await ctx.send(f"❌ Nie znaleziono archiwum ticketu `{ticket_id}`!")
+        return
+    
+    await ctx.send(
+        f"📦 Archiwalny transkrypt ticketu `{ticket_id}`",
+        file=discord.File(io.BytesIO(data), filename=f"transcript-{ticket_id}.txt")
+    )
+
+@bot.command(name="macro")
+@commands.has_permissions(manage_messages=True)
+async def macro_command(ctx, name: str):
+    ticket = ticket_system.get_ticket_by_channel(ctx.channel.id)
+    if not ticket:
+        await ctx.send("❌ Ta komenda działa tylko w kanale ticketu!", delete_after=10)
+        return
+    
+    macro = ticket_system.macros.get(ctx.guild.id, ticket.template.id, name)
+    if not macro:
+        await ctx.send(f"❌ Nie znaleziono makra `{name}`!", delete_after=10)
+        return
+    
+    try:
+        await ctx.message.delete()
+    except:
+        pass
+    await ticket_system.apply_macro(macro, ticket, ctx.channel, ctx.author.id)
+
+@bot.tree.command(name="macro", description="Wyślij gotową odpowiedź w kanale ticketu")
+@app_commands.describe(nazwa="Nazwa makra")
+@app_commands.default_permissions(manage_messages=True)
+async def macro_slash(interaction: discord.Interaction, nazwa: str):
+    ticket = ticket_system.get_ticket_by_channel(interaction.channel_id)
+    if not ticket:
+        await interaction.response.send_message("❌ Ta komenda działa tylko w kanale ticketu!", ephemeral=True)
+        return
+    
+    macro = ticket_system.macros.get(interaction.guild_id, ticket.template.id, nazwa)
+    if not macro:
+        await interaction.response.send_message(f"❌ Nie znaleziono makra `{nazwa}`!", ephemeral=True)
+        return
+    
+    await interaction.response.send_message(f"✅ Użyto makra `{macro.name}`", ephemeral=True)
+    await ticket_system.apply_macro(macro, ticket, interaction.channel, interaction.user.id)
+
+@macro_slash.autocomplete("nazwa")
+async def macro_autocomplete(interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    ticket = ticket_system.get_ticket_by_channel(interaction.channel_id)
+    names = ticket_system.macros.complete(interaction.guild_id, ticket.template.id if ticket else None, current)
+    return [app_commands.Choice(name=name, value=name) for name in names]
+
+@bot.command(name="macroset")
+@commands.has_permissions(manage_messages=True)
+async def macro_set(ctx, name: str, *, content: str):
+    template_id = MacroEngine.GLOBAL
+    status = None
+    tokens = content.split(" ")
+    
+    while tokens:
+        key, _, value = tokens[0].partition(":")
+        if key.lower() == "szablon" and value:
+            template_id = value.upper()
+        elif key.lower() == "status" and value:
+            try:
+                status = TicketStatus(value.upper())
+            except ValueError:
+                await ctx.send(f"❌ Nieznany status `{value}`!", delete_after=10)
+                return
+        else:
+            break
+        tokens.pop(0)
+    
+    body = " ".join(tokens).strip()
+    if template_id != MacroEngine.GLOBAL and template_id not in ticket_system.templates:
+        await ctx.send(f"❌ Nieznany szablon `{template_id}`!", delete_after=10)
+        return
+    if not body or len(name) > 32:
+        await ctx.send("❌ Użycie: `!macroset <nazwa> [szablon:ID] [status:STATUS] <treść>`", delete_after=10)
+        return
     
-    if len(user_tickets) > 10:
-        embed.set_footer(text=f"Pokazano 10 z {len(user_tickets)} ticketów")
+    try:
+        macro = ticket_system.macros.save(ctx.guild.id, template_id, name, body, status, ctx.author.id)
+    except ValueError as e:
+        await ctx.send(f"❌ {e}", delete_after=10)
+        return
+    
+    embed = discord.Embed(title=f"✅ Zapisano makro `{macro.name}`", description=macro.body[:1000], color=0x2ecc71)
+    embed.add_field(name="📝 Szablon", value="wszystkie" if template_id == MacroEngine.GLOBAL else template_id, inline=True)
+    embed.add_field(name="📊 Status", value=f"`{status.value}`" if status else "bez zmiany", inline=True)
+    embed.set_footer(text="Placeholdery: $ticket_id $user $staff $title $template $priority $status $sla $channel $answer_<pole>")
+    await ctx.send(embed=embed)
+
+@bot.command(name="macros")
+@commands.has_permissions(manage_messages=True)
+async def macro_list(ctx, prefix: str = ""):
+    ticket = ticket_system.get_ticket_by_channel(ctx.channel.id)
+    names = ticket_system.macros.complete(ctx.guild.id, ticket.template.id if ticket else None, prefix, limit=50)
+    if not names:
+        await ctx.send("📭 Brak makr.", delete_after=10)
+        return
     
-    await ctx.send(embed=embed, delete_after=60)
+    embed = discord.Embed(
+        title=f"📑 Makra ({len(names)})",
+        description=", ".join(f"`{name}`" for name in names),
+        color=0x3498db
+    )
+    embed.set_footer(text="Użycie: !macro <nazwa> lub /macro")
+    await ctx.send(embed=embed)
+
+@bot.command(name="macrodel")
+@commands.has_permissions(manage_messages=True)
+async def macro_delete(ctx, name: str, template_id: str = MacroEngine.GLOBAL):
+    if ticket_system.macros.delete(ctx.guild.id, template_id.upper(), name.lower()):
+        await ctx.send(f"🗑️ Usunięto makro `{name.lower()}`")
+    else:
+        await ctx.send(f"❌ Nie znaleziono makra `{name}`!", delete_after=10)
 
 @bot.command(name="ticketstats")
 @commands.has_permissions(administrator=True)
-async def ticket_stats(ctx):
-    total_tickets = len(ticket_system.tickets)
-    open_tickets = len([t for t in ticket_system.tickets.values() if t.current_status not in [TicketStatus.CLOSED, TicketStatus.ARCHIVED]])
-    closed_tickets = len([t for t in ticket_system.tickets.values() if t.current_status in [TicketStatus.CLOSED, TicketStatus.ARCHIVED]])
-    
-    status_counts = {}
-    for ticket in ticket_system.tickets.values():
-        status = ticket.current_status.value
-        status_counts[status] = status_counts.get(status, 0) + 1
+async def ticket_stats(ctx, staff: Optional[discord.Member] = None):
+    analytics = ticket_system.analytics
+    status_counts = analytics.status_counts
+    total_tickets = sum(status_counts.values())
+    closed_tickets = sum(status_counts[status.value] for status in [TicketStatus.CLOSED, TicketStatus.ARCHIVED])
+    open_tickets = total_tickets - closed_tickets
     
     type_counts = {}
-    for ticket in ticket_system.tickets.values():
-        ticket_type = ticket.template.name
-        type_counts[ticket_type] = type_counts.get(ticket_type, 0) + 1
+    for template_id, count in analytics.template_counts.items():
+        template = ticket_system.templates.get(template_id)
+        ticket_type = template.name if template else template_id
+        type_counts[ticket_type] = type_counts.get(ticket_type, 0) + count
     
     embed = discord.Embed(
         title="📊 STATYSTYKI SYSTEMU TICKETÓW",
@@ -1383,22 +3247,52 @@ async def ticket_stats(ctx):
     embed.add_field(name="📂 Otwarte", value=str(open_tickets), inline=True)
     embed.add_field(name="🔒 Zamknięte", value=str(closed_tickets), inline=True)
     
-    status_text = "\n".join([f"• **{status}:** {count}" for status, count in sorted(status_counts.items())])
+    status_text = "\n".join([f"• **{status}:** {count}" for status, count in sorted(status_counts.items()) if count])
     embed.add_field(name="📈 Statusy", value=status_text if status_text else "Brak danych", inline=False)
     
     type_text = "\n".join([f"• **{ttype}:** {count}" for ttype, count in sorted(type_counts.items())])
     embed.add_field(name="📋 Typy", value=type_text if type_text else "Brak danych", inline=False)
-
-    recent_tickets = sorted(ticket_system.tickets.values(), key=lambda x: x.created_at, reverse=True)[:5]
-    if recent_tickets:
+    
+    for days in [7, 30]:
+        totals = analytics.range_totals(days)
+        embed.add_field(
+            name=f"📅 Ostatnie {days} dni",
+            value=f"Utworzone: **{totals['created']}**\nZamknięte: **{totals['closed']}**\nPierwsze odpowiedzi: **{totals['responded']}**",
+            inline=True
+        )
+    
+    if staff:
+        embed.add_field(name=f"⏱️ Pierwsza odpowiedź - {staff.name}", value=analytics.format_histogram(
+            analytics.first_response["staff"].get(staff.id, [])), inline=False)
+        embed.add_field(name=f"✅ Rozwiązanie - {staff.name}", value=analytics.format_histogram(
+            analytics.resolution["staff"].get(staff.id, [])), inline=False)
+    else:
+        for title, histograms in [("⏱️ Pierwsza odpowiedź", analytics.first_response), ("✅ Czas rozwiązania", analytics.resolution)]:
+            lines = []
+            for template_id, histogram in histograms["template"].items():
+                template = ticket_system.templates.get(template_id)
+                lines.append(f"• **{template.name if template else template_id}:** {analytics.format_histogram(histogram)}")
+            embed.add_field(name=title, value="\n".join(lines)[:1024] if lines else "Brak danych", inline=False)
+    
+    if analytics.recent:
         recent_text = ""
-        for ticket in recent_tickets:
-            user = bot.get_user(ticket.user_id)
-            user_name = user.name if user else f"User_{ticket.user_id}"
-            time_ago = f"<t:{int(ticket.created_at.timestamp())}:R>"
-            recent_text += f"• `{ticket.id}` - **{user_name}** - {ticket.template.name} {time_ago}\n"
+        for ticket_id, user_id, template_id, created_at in analytics.recent:
+            user = bot.get_user(user_id)
+            user_name = user.name if user else f"User_{user_id}"
+            template = ticket_system.templates.get(template_id)
+            time_ago = f"<t:{int(created_at.timestamp())}:R>"
+            recent_text += f"• `{ticket_id}` - **{user_name}** - {template.name if template else template_id} {time_ago}\n"
         embed.add_field(name="🕒 Ostatnie tickety", value=recent_text, inline=False)
     
+    channel_p95 = ticket_system.creation_metrics.percentile("submit_to_channel")
+    if channel_p95 is not None:
+        total_p95 = ticket_system.creation_metrics.percentile("total")
+        embed.add_field(
+            name="⚡ Tworzenie ticketu (p95)",
+            value=f"Kanał gotowy: **{channel_p95 * 1000:.0f} ms**\nCałość: **{total_p95 * 1000:.0f} ms**",
+            inline=False
+        )
+    
     embed.set_footer(text=f"System zarządzania ticketami v3.0")
     
     await ctx.send(embed=embed)
@@ -1429,4 +3323,7 @@ if __name__ == "__main__":
         print("\nUżyj komendy `!ticketsetup` na serwerze Discord aby skonfigurować system.")
     
     print("🚀 Uruchamianie bota...")
-    bot.run(CONFIG["token"])
\ No newline at end of file
+    try:
+        bot.run(CONFIG["token"])
+    finally:
+        ticket_system.store.close()
\ No newline at end of file
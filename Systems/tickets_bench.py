@@ -0,0 +1,451 @@
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+import discord
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+tickets = None
+snowflakes = itertools.count(1_000_000_000_000_000_000)
+
+class FakeHTTP:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.timeline: List[tuple] = []
+    
+    async def request(self, route: str):
+        self.calls[route] += 1
+        self.timeline.append((route, time.perf_counter()))
+        await asyncio.sleep(self.latency)
+    
+    def count_since(self, route: str, since: float) -> int:
+        return sum(1 for name, at in self.timeline if name == route and at >= since)
+
+class FakeRole:
+    def __init__(self, role_id: int):
+        self.id = role_id
+        self.members: List["FakeMember"] = []
+        self.mention = f"<@&{role_id}>"
+
+class FakeMember:
+    def __init__(self, guild: "FakeGuild", member_id: int, name: str, roles: List[FakeRole] = (), bot: bool = False):
+        self.guild = guild
+        self.id = member_id
+        self.name = name
+        self.display_name = name
+        self.roles = list(roles)
+        self.bot = bot
+        self.status = discord.Status.online
+        self.mention = f"<@{member_id}>"
+        for role in self.roles:
+            role.members.append(self)
+
+class FakeMessage:
+    def __init__(self, channel: "FakeTextChannel", message_id: int, author: Optional[FakeMember] = None, content: str = ""):
+        self.channel = channel
+        self.id = message_id
+        self.author = author
+        self.content = content
+        self.attachments = []
+    
+    async def add_reaction(self, emoji: str):
+        await self.channel.http.request("add_reaction")
+    
+    async def edit(self, **kwargs) -> "FakeMessage":
+        await self.channel.http.request("edit_message")
+        return self
+
+class FakeTextChannel:
+    def __init__(self, http: FakeHTTP, guild: "FakeGuild", channel_id: int, name: str):
+        self.http = http
+        self.guild = guild
+        self.id = channel_id
+        self.name = name
+    
+    @property
+    def mention(self) -> str:
+        return f"<#{self.id}>"
+    
+    async def send(self, content: Optional[str] = None, **kwargs) -> FakeMessage:
+        await self.http.request("send_message")
+        return FakeMessage(self, next(snowflakes), self.guild.me, content or "")
+    
+    def get_partial_message(self, message_id: int) -> FakeMessage:
+        return FakeMessage(self, message_id)
+    
+    async def edit(self, **kwargs):
+        await self.http.request("edit_channel")
+    
+    async def set_permissions(self, target, **kwargs):
+        await self.http.request("edit_channel_permissions")
+    
+    async def delete(self, **kwargs):
+        await self.http.request("delete_channel")
+        self.guild.bot.channels.pop(self.id, None)
+
+class FakeThread(FakeTextChannel, discord.Thread):
+    async def add_user(self, user):
+        await self.http.request("add_thread_member")
+
+class FakeThreadParent(FakeTextChannel, discord.TextChannel):
+    async def create_thread(self, name: str, **kwargs) -> FakeThread:
+        await self.http.request("create_thread")
+        thread = FakeThread(self.http, self.guild, next(snowflakes), name)
+        self.guild.bot.channels[thread.id] = thread
+        return thread
+
+class FakeCategory:
+    def __init__(self, http: FakeHTTP, guild: "FakeGuild", channel_id: int):
+        self.http = http
+        self.guild = guild
+        self.id = channel_id
+        self.text_channels: List[FakeTextChannel] = []
+    
+    async def create_text_channel(self, name: str, **kwargs) -> FakeTextChannel:
+        await self.http.request("create_channel")
+        channel = FakeTextChannel(self.http, self.guild, next(snowflakes), name)
+        self.guild.bot.channels[channel.id] = channel
+        return channel
+
+class FakeGuild:
+    def __init__(self, bot: "FakeBot", staff: int):
+        self.bot = bot
+        self.id = next(snowflakes)
+        self.default_role = FakeRole(self.id)
+        self.me = FakeMember(self, bot.user.id, "bench-bot", bot=True)
+        self.support_role = FakeRole(next(snowflakes))
+        self.roles = {role.id: role for role in [self.default_role, self.support_role]}
+        self.members: Dict[int, FakeMember] = {}
+        for i in range(staff):
+            self.add_member(f"staff-{i}", [self.support_role])
+    
+    def add_member(self, name: str, roles: List[FakeRole] = ()) -> FakeMember:
+        member = FakeMember(self, next(snowflakes), name, roles)
+        self.members[member.id] = member
+        return member
+    
+    def get_member(self, member_id: int) -> Optional[FakeMember]:
+        return self.members.get(member_id)
+    
+    def get_role(self, role_id: int) -> Optional[FakeRole]:
+        return self.roles.get(role_id)
+    
+    def get_channel(self, channel_id: int):
+        return self.bot.get_channel(channel_id)
+
+class FakeBot:
+    def __init__(self, http: FakeHTTP):
+        self.http = http
+        self.user = type("BotUser", (), {"id": next(snowflakes), "name": "bench-bot"})()
+        self.channels: Dict[int, object] = {}
+        self.guilds: List[FakeGuild] = []
+    
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
+    
+    def get_user(self, user_id: int) -> Optional[FakeMember]:
+        for guild in self.guilds:
+            member = guild.get_member(user_id)
+            if member:
+                return member
+        return None
+    
+    async def wait_until_ready(self):
+        pass
+
+class FakeResponse:
+    def __init__(self, http: FakeHTTP):
+        self.http = http
+    
+    async def defer(self, **kwargs):
+        await self.http.request("interaction_callback")
+
+class FakeFollowup:
+    def __init__(self, http: FakeHTTP):
+        self.http = http
+    
+    async def send(self, *args, **kwargs):
+        await self.http.request("followup_message")
+
+class FakeInteraction:
+    def __init__(self, http: FakeHTTP, guild: FakeGuild, user: FakeMember):
+        self.guild = guild
+        self.user = user
+        self.response = FakeResponse(http)
+        self.followup = FakeFollowup(http)
+
+class LoopLagMonitor:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+    
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+    
+    def take(self) -> Dict[str, float]:
+        samples, self.samples = self.samples, []
+        return summarize([sample * 1000 for sample in samples], "ms")
+    
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def summarize(values: List[float], unit: str) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        f"mean_{unit}": round(sum(values) / len(values), 3),
+        f"p50_{unit}": round(percentile(values, 0.50), 3),
+        f"p95_{unit}": round(percentile(values, 0.95), 3),
+        f"p99_{unit}": round(percentile(values, 0.99), 3),
+        f"max_{unit}": round(max(values), 3)
+    }
+
+class Simulation:
+    def __init__(self, args: argparse.Namespace, workdir: str):
+        self.args = args
+        self.workdir = workdir
+        self.random = random.Random(args.seed)
+        self.http = FakeHTTP(args.latency / 1000)
+        self.bot = FakeBot(self.http)
+        self.guild = FakeGuild(self.bot, args.staff)
+        self.bot.guilds.append(self.guild)
+        self.users = [self.guild.add_member(f"user-{i}") for i in range(args.users)]
+        self.staff = self.guild.support_role.members
+        self.lag = LoopLagMonitor(args.lag_interval / 1000)
+        self.results: Dict[str, object] = {}
+        
+        category = FakeCategory(self.http, self.guild, next(snowflakes))
+        log_channel = FakeTextChannel(self.http, self.guild, next(snowflakes), "logi")
+        transcript_channel = FakeTextChannel(self.http, self.guild, next(snowflakes), "transkrypty")
+        thread_parent = FakeThreadParent(self.http, self.guild, next(snowflakes), "tickety")
+        for channel in [category, log_channel, transcript_channel, thread_parent]:
+            self.bot.channels[channel.id] = channel
+        
+        tickets.ticket_system.store.close()
+        tickets.CONFIG.update({
+            "ticket_db_file": os.path.join(workdir, "bench.db"),
+            "ticket_thread_parents": {template_id: thread_parent.id for template_id in tickets.ticket_system.templates} if args.threads else {},
+            "ticket_category_id": category.id,
+            "log_channel_id": log_channel.id,
+            "transcript_channel_id": transcript_channel.id,
+            "support_role_ids": [self.guild.support_role.id],
+            "admin_role_ids": [self.guild.support_role.id],
+            "max_tickets_per_user": 10 ** 9,
+            "panel_refresh_delay": args.panel_delay,
+            "log_batch_delay": args.log_delay
+        })
+        self.system = tickets.ticket_system = tickets.TicketSystem(self.bot)
+        self.open_tickets: List[tickets.Ticket] = []
+    
+    def phase(self, name: str, started: float, **values):
+        elapsed = time.perf_counter() - started
+        self.results[name] = {"seconds": round(elapsed, 3), **values, "loop_lag": self.lag.take()}
+    
+    async def create_tickets(self):
+        templates = list(self.system.templates.values())
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        
+        async def submit(i: int):
+            async with semaphore:
+                modal = tickets.TicketCreationModal(self.random.choice(templates))
+                modal.title_input._value = f"Ticket testowy {i}"
+                modal.desc_input._value = "Opis problemu " * 20
+                for input_field in modal.answer_inputs.values():
+                    input_field._value = "odpowiedź"
+                await modal.on_submit(FakeInteraction(self.http, self.guild, self.random.choice(self.users)))
+        
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        await asyncio.gather(*[submit(i) for i in range(self.args.tickets)])
+        elapsed = time.perf_counter() - started
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+        
+        self.open_tickets = list(self.system.tickets.values())
+        self.phase(
+            "create", started,
+            tickets=len(self.open_tickets),
+            tickets_per_second=round(len(self.open_tickets) / elapsed, 1),
+            memory_per_ticket_bytes=used // max(1, len(self.open_tickets)),
+            steps=self.system.creation_metrics.summary()
+        )
+    
+    async def message_traffic(self):
+        tick = 0.01
+        per_tick = max(1, int(self.args.message_rate * tick))
+        routing: List[float] = []
+        started = time.perf_counter()
+        
+        sent = 0
+        while sent < self.args.messages:
+            tick_started = time.perf_counter()
+            for _ in range(min(per_tick, self.args.messages - sent)):
+                ticket = self.random.choice(self.open_tickets)
+                channel = self.bot.get_channel(ticket.channel_id)
+                if self.random.random() < self.args.staff_ratio:
+                    author = self.random.choice(self.staff)
+                else:
+                    author = self.guild.get_member(ticket.user_id)
+                message = FakeMessage(channel, next(snowflakes), author, "Wiadomość testowa " * 5)
+                
+                routed_at = time.perf_counter_ns()
+                self.system.route_message(message)
+                routing.append((time.perf_counter_ns() - routed_at) / 1000)
+                sent += 1
+            await asyncio.sleep(max(0.0, tick - (time.perf_counter() - tick_started)))
+        
+        traffic_seconds = time.perf_counter() - started
+        await asyncio.sleep(self.args.panel_delay + 0.5)
+        edits = self.http.count_since("edit_message", started)
+        minutes = (time.perf_counter() - started) / 60
+        self.phase(
+            "messages", started,
+            messages=sent,
+            messages_per_second=round(sent / traffic_seconds, 1),
+            routing=summarize(routing, "us"),
+            panel_edits=edits,
+            panel_edits_per_minute=round(edits / minutes, 1),
+            panel_edits_per_message=round(edits / max(1, sent), 4)
+        )
+    
+    async def status_changes(self):
+        statuses = [tickets.TicketStatus.IN_PROGRESS, tickets.TicketStatus.WAITING_USER, tickets.TicketStatus.WAITING_SUPPORT]
+        timings: List[float] = []
+        started = time.perf_counter()
+        
+        for i in range(self.args.status_changes):
+            ticket = self.random.choice(self.open_tickets)
+            changed_at = time.perf_counter_ns()
+            self.system.change_status(ticket, self.random.choice(statuses), self.random.choice(self.staff).id, "Symulacja")
+            self.system.panels.schedule(ticket)
+            timings.append((time.perf_counter_ns() - changed_at) / 1000)
+            if i % 100 == 0:
+                await asyncio.sleep(0)
+        
+        await asyncio.sleep(self.args.panel_delay + 0.5)
+        self.phase(
+            "status_changes", started,
+            changes=len(timings),
+            change_status=summarize(timings, "us"),
+            panel_edits=self.http.count_since("edit_message", started)
+        )
+    
+    async def close_tickets(self):
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        timings: List[float] = []
+        
+        async def close(ticket: tickets.Ticket):
+            async with semaphore:
+                closed_at = time.perf_counter()
+                await self.system.close_ticket(ticket.id, self.random.choice(self.staff).id, "Symulacja")
+                timings.append((time.perf_counter() - closed_at) * 1000)
+        
+        started = time.perf_counter()
+        await asyncio.gather(*[close(ticket) for ticket in self.open_tickets])
+        await asyncio.get_running_loop().run_in_executor(None, lambda: self.system.store.flush().result())
+        self.phase(
+            "close", started,
+            closed=len(timings),
+            close_ticket=summarize(timings, "ms"),
+            resident_tickets=len(self.system.tickets)
+        )
+    
+    async def run(self) -> Dict[str, object]:
+        self.lag.start()
+        try:
+            await self.create_tickets()
+            await self.message_traffic()
+            await self.status_changes()
+            await self.close_tickets()
+            await asyncio.sleep(self.args.log_delay + 0.1)
+        finally:
+            self.lag.stop()
+            self.system.store.close()
+        
+        return {
+            "config": vars(self.args),
+            "environment": {
+                "python": platform.python_version(),
+                "discord_py": discord.__version__,
+                "platform": platform.platform()
+            },
+            "phases": self.results,
+            "api_calls": dict(self.http.calls.most_common()),
+            "database_bytes": sum(
+                os.path.getsize(os.path.join(self.workdir, name)) for name in os.listdir(self.workdir) if name.startswith("bench.db")
+            )
+        }
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Symulator obciążenia systemu ticketów")
+    parser.add_argument("--tickets", type=int, default=2000, help="liczba tworzonych ticketów")
+    parser.add_argument("--users", type=int, default=500, help="liczba użytkowników tworzących tickety")
+    parser.add_argument("--staff", type=int, default=25, help="liczba członków supportu")
+    parser.add_argument("--messages", type=int, default=20000, help="liczba wiadomości w kanałach ticketów")
+    parser.add_argument("--message-rate", type=float, default=2000, help="wiadomości na sekundę")
+    parser.add_argument("--staff-ratio", type=float, default=0.3, help="udział wiadomości od supportu")
+    parser.add_argument("--status-changes", type=int, default=2000, help="liczba zmian statusu")
+    parser.add_argument("--concurrency", type=int, default=50, help="równoległe tworzenie/zamykanie ticketów")
+    parser.add_argument("--latency", type=float, default=5, help="opóźnienie pojedynczego wywołania API w ms")
+    parser.add_argument("--panel-delay", type=float, default=tickets.CONFIG["panel_refresh_delay"], help="opóźnienie odświeżania panelu w s")
+    parser.add_argument("--log-delay", type=float, default=tickets.CONFIG["log_batch_delay"], help="opóźnienie wysyłania logów w s")
+    parser.add_argument("--lag-interval", type=float, default=10, help="interwał pomiaru opóźnienia pętli w ms")
+    parser.add_argument("--threads", action="store_true", help="tworzy tickety jako prywatne wątki zamiast kanałów")
+    parser.add_argument("--seed", type=int, default=1, help="ziarno generatora losowego")
+    parser.add_argument("--output", help="plik wynikowy JSON (domyślnie stdout)")
+    return parser.parse_args()
+
+def main():
+    global tickets
+    startdir = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="tickets-bench-")
+    os.chdir(workdir)
+    
+    try:
+        import tickets
+        args = parse_args()
+        results = asyncio.run(Simulation(args, workdir).run())
+    finally:
+        os.chdir(startdir)
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    report = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+        print(f"✅ Wyniki zapisane do {args.output}")
+    else:
+        print(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import asyncio
+import copy
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Systems"))
+
+@pytest.fixture
+def level(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import level
+    
+    users = {
+        "1:10": {"xp": 500, "level": 3, "messages": 5, "total_xp": 500, "last_active": None, "created_at": "2024-01-01T00:00:00"},
+        "1:11": {"xp": 100, "level": 1, "messages": 1, "total_xp": 100, "last_active": None, "created_at": "2024-01-01T00:00:00"}
+    }
+    index = level.LeaderboardIndex()
+    index.rebuild(users)
+    monkeypatch.setattr(level.db, "data", {"users": users})
+    monkeypatch.setattr(level.db, "index", index)
+    monkeypatch.setattr(level.db, "dirty", set())
+    return level
+
+def run_import(level, monkeypatch, content: str, mode: str = "set") -> tuple:
+    async def download(attachment, target):
+        target.write(content.encode("utf-8"))
+    
+    saves = []
+    async def save_all_async():
+        saves.append(copy.deepcopy(level.db.data))
+    
+    monkeypatch.setattr(level.BulkTransfer, "download", staticmethod(download))
+    monkeypatch.setattr(level.db, "save_all_async", save_all_async)
+    monkeypatch.setattr(level.role_sync_queue, "enqueue_guild", lambda guild, reason: 0)
+    
+    sent = []
+    async def send(content=None, **kwargs):
+        sent.append(content if content is not None else kwargs.get("embed"))
+    async def defer(**kwargs):
+        pass
+    
+    interaction = types.SimpleNamespace(
+        guild=types.SimpleNamespace(id=1),
+        response=types.SimpleNamespace(defer=defer),
+        followup=types.SimpleNamespace(send=send)
+    )
+    attachment = types.SimpleNamespace(filename="import.csv")
+    asyncio.run(level.xp_import.callback(interaction, attachment, mode))
+    return sent, saves
+
+def test_import_with_failing_row_leaves_data_unchanged(level, monkeypatch):
+    before = copy.deepcopy(level.db.data)
+    
+    sent, saves = run_import(level, monkeypatch, "user_id,xp\n10,9000\n12,700\n11,-5\n")
+    
+    assert "żadne dane nie zostały zmienione" in sent[0]
+    assert level.db.data == before
+    assert level.db.dirty == set()
+    assert level.db.index.top(1, 0, 10) == [10, 11]
+    assert saves == []
+
+def test_import_applies_all_rows_in_one_step(level, monkeypatch):
+    sent, saves = run_import(level, monkeypatch, "user_id,xp\n10,50\n12,700\n", mode="add")
+    
+    users = level.db.data["users"]
+    assert users["1:10"]["xp"] == 550
+    assert users["1:12"]["xp"] == 700
+    assert level.db.index.top(1, 0, 10) == [12, 10, 11]
+    assert len(saves) == 1 and saves[0]["users"]["1:12"]["xp"] == 700
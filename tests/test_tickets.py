@@ -0,0 +1,63 @@
+import asyncio
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Systems"))
+
+@pytest.fixture
+def tickets(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import tickets
+    return tickets
+
+def test_reopened_ticket_counts_one_resolution(tickets):
+    analytics = tickets.TicketAnalytics(5, 30)
+    ticket = tickets.Ticket(1, tickets.ticket_system.templates["SUPPORT"], "Tytuł", "Opis")
+    ticket.assigned_to = 7
+    
+    def change(status):
+        old_status, old_closed_at = ticket.current_status, ticket.closed_at
+        ticket.change_status(status, 7)
+        analytics.status_changed(ticket, old_status, old_closed_at)
+    
+    change(tickets.TicketStatus.CLOSED)
+    change(tickets.TicketStatus.IN_PROGRESS)
+    assert ticket.closed_at is None
+    change(tickets.TicketStatus.CLOSED)
+    closed_at = ticket.closed_at
+    change(tickets.TicketStatus.ARCHIVED)
+    
+    assert ticket.closed_at == closed_at
+    assert sum(analytics.resolution["template"]["SUPPORT"]) == 1
+    assert sum(analytics.resolution["staff"][7]) == 1
+    assert analytics.range_totals(1)["closed"] == 1
+
+def test_archiver_archives_cached_closed_ticket(tickets, tmp_path, monkeypatch):
+    monkeypatch.setitem(tickets.CONFIG, "ticket_db_file", str(tmp_path / "archive.db"))
+    monkeypatch.setitem(tickets.CONFIG, "archive_dir", str(tmp_path / "archive"))
+    monkeypatch.setitem(tickets.CONFIG, "archive_after_hours", 0)
+    bot = types.SimpleNamespace(user=types.SimpleNamespace(id=99), guilds=[], get_channel=lambda channel_id: None, get_user=lambda user_id: None)
+    system = tickets.TicketSystem(bot)
+    
+    async def scenario():
+        ticket = await system.create_ticket(1, "SUPPORT", "Tytuł", "Opis", tickets.Priority.MEDIUM, {})
+        system.change_status(ticket, tickets.TicketStatus.CLOSED, 7)
+        assert system.tickets[ticket.id] is ticket
+        
+        assert await system.archiver.run_once() == 1
+        return ticket
+    
+    try:
+        ticket = asyncio.run(scenario())
+        
+        assert ticket.current_status == tickets.TicketStatus.ARCHIVED
+        assert ticket.id not in system.tickets
+        ticket._persist()
+        stored = system.store.load_ticket(ticket.id, system.templates)
+        assert stored.current_status == tickets.TicketStatus.ARCHIVED
+        assert system.archiver.read(ticket.id)
+    finally:
+        system.store.close()